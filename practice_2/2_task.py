@@ -1,10 +1,17 @@
 from config import *
+from bulletin_reader import parse_trade_summary
+from bulletin_cache import BulletinCache
 
 # Конфигурация
 BASE_URL = BASE_URL
 DB_URL = f"postgresql://{DB_USER}:{DB_PASS}@{DB_HOST}:{DB_PORT}/{DB_NAME2}"
 DOWNLOAD_DIR = "bulletins"
 START_DATE = date(2023, 1, 1)
+ON_CONFLICT_ACTIONS = ('nothing', 'update')
+UPDATE_COLUMNS = [
+    'exchange_product_name', 'oil_id', 'delivery_basis_id', 'delivery_basis_name',
+    'delivery_type_id', 'volume', 'total', 'count'
+]
 
 # Инициализация SQLAlchemy
 Base = declarative_base()
@@ -33,13 +40,30 @@ class TradingResult(Base):
 
 
 class BulletinParser:
-    def __init__(self):
+    def __init__(self, on_conflict: str = 'nothing', use_cache: bool = CACHE_ENABLED):
         self.base_url = "https://spimex.com"
         self.trade_section_url = "/markets/oil_products/trades/results/"
         self.start_date = date(2023, 1, 1)
         self.driver = None
         self.engine = None
         self.Session = None
+        if on_conflict not in ON_CONFLICT_ACTIONS:
+            raise ValueError(f"Неизвестное действие при конфликте: {on_conflict}")
+        self.on_conflict = on_conflict  # 'nothing' или 'update' для существующих записей
+        # Одна сессия с пулом keep-alive соединений на все файлы
+        self.http_session = requests.Session()
+        self.http_session.headers.update({'User-Agent': 'Mozilla/5.0'})
+        adapter = HTTPAdapter(pool_connections=HTTP_POOL_SIZE, pool_maxsize=HTTP_POOL_SIZE)
+        self.http_session.mount('https://', adapter)
+        self.http_session.mount('http://', adapter)
+        # Кэш скачанных файлов: условные запросы и пропуск уже разобранных бюллетеней.
+        # Отметки о разборе - для своей БД (DB_NAME2), каталог кэша можно делить с practice_4
+        self.cache = BulletinCache(
+            CACHE_DIR, CACHE_MAX_MB * 1024 * 1024, CACHE_MAX_AGE_DAYS,
+            target=f"{DB_HOST}:{DB_PORT}/{DB_NAME2}", parsed_max_age_days=CACHE_PARSED_MAX_AGE_DAYS
+        ) if use_cache else None
+        # Файлы в кэш пишет фоновый поток, пока основной разбирает бюллетень
+        self.cache_writer = ThreadPoolExecutor(max_workers=1) if self.cache else None
 
         # Настройка драйвера и БД
         self.setup_driver()
@@ -60,6 +84,14 @@ class BulletinParser:
         # Создаем таблицы, если они не существуют
         Base.metadata.create_all(self.engine)
 
+    def has_trade_date(self, trade_date: date) -> bool:
+        """Есть ли записи за дату: после очистки или восстановления таблицы отметки кэша устаревают"""
+        session = self.Session()
+        try:
+            return session.execute(select(exists().where(TradingResult.trade_date == trade_date))).scalar()
+        finally:
+            session.close()
+
     def get_bulletin_links(self, page_num: int) -> List[dict]:
         try:
             url = f"{self.base_url}{self.trade_section_url}?page=page-{page_num}"
@@ -130,171 +162,83 @@ class BulletinParser:
         print(f"Найдено {len(filtered_bulletins)} бюллетеней с {self.start_date}")
         return filtered_bulletins
 
-    def download_bulletin(self, bulletin_info: dict) -> Optional[str]:
+    def download_bulletin(self, bulletin_info: dict) -> Optional[bytes]:
+        url = bulletin_info['url']
         try:
-            # Используем requests для скачивания файла
-
-            session = requests.Session()
-            session.headers.update({'User-Agent': 'Mozilla/5.0'})
-
-            response = session.get(bulletin_info['url'], stream=True)
-            response.raise_for_status()
-
-            # Сохраняем файл
-            filename = f"oil_products_{bulletin_info['date'].strftime('%Y%m%d')}.xls"
-            with open(filename, 'wb') as f:
-                for chunk in response.iter_content(1024):
-                    f.write(chunk)
-
-            return filename
+            headers = self.cache.conditional_headers(url) if self.cache else {}
+            with self.http_session.get(url, headers=headers, stream=True, timeout=60) as response:
+                # Файл не изменился с прошлой загрузки - берем его из кэша
+                if response.status_code == 304 and self.cache:
+                    bulletin_info['sha256'] = self.cache.url_hash(url)
+                    return self.cache.hit(url)
+
+                response.raise_for_status()
+
+                # Читаем файл в память крупными блоками, попутно считая хэш содержимого
+                buffer = io.BytesIO()
+                digest = hashlib.sha256()
+                for chunk in response.iter_content(DOWNLOAD_CHUNK_SIZE):
+                    buffer.write(chunk)
+                    digest.update(chunk)
+
+                data = buffer.getvalue()
+                bulletin_info['sha256'] = digest.hexdigest()
+                if self.cache_writer:
+                    self.cache_writer.submit(
+                        self.cache.store, url, data, bulletin_info['sha256'],
+                        response.headers.get('ETag'), response.headers.get('Last-Modified')
+                    )
+                return data
 
         except Exception as e:
             print(f"Ошибка при скачивании бюллетеня за {bulletin_info['date']}: {str(e)}")
             return None
 
-    def parse_bulletin(self, filepath: str, trade_date: date) -> Optional[pd.DataFrame]:
+    def parse_bulletin(self, data: bytes, trade_date: date) -> Optional[pd.DataFrame]:
         try:
-            # Читаем Excel файл
-            xls = pd.ExcelFile(filepath)
-
-            # Проверяем наличие листа TRADE_SUMMARY
-            if 'TRADE_SUMMARY' not in xls.sheet_names:
-                print(f"Лист TRADE_SUMMARY не найден в файле {filepath}")
-                return None
-
-            # Читаем весь лист для поиска даты и данных
-            df_raw = pd.read_excel(filepath, sheet_name='TRADE_SUMMARY', header=None)
-
-            # Ищем дату торгов
-            trade_date = None
-            for i, row in df_raw.iterrows():
-                if "Дата торгов:" in str(row.values):
-                    date_match = re.search(r'\d{2}\.\d{2}\.\d{4}', str(row.values))
-                    if date_match:
-                        trade_date = datetime.strptime(date_match.group(), '%d.%m.%Y').date()
-                    break
-
-            if not trade_date:
-                print(f"Не удалось определить дату торгов в файле {filepath}")
-                return None
-
-            start_row = None
-            metric_ton_found = False
-            for i, row in df_raw.iterrows():
-                row_str = str(row.values)
-
-                if "Единица измерения: Метрическая тонна" in row_str:
-                    metric_ton_found = True
-                    continue
-
-                if metric_ton_found and "Цена (за единицу измерения), руб." in row_str:
-                    start_row = i
-                    break
-
-            if start_row is None:
-                print(f"Не найдена таблица с метрическими тоннами в файле {filepath}")
-                return None
-
-            # Читаем таблицу с данными
-            df = pd.read_excel(
-                filepath,
-                sheet_name='TRADE_SUMMARY',
-                header=start_row,
-                skipfooter=2  # Пропускаем итоговые строки
-            )
-            # Очищаем заголовки от лишних пробелов и символов
-            df.columns = [str(col).strip().replace('\n', ' ') for col in df.columns]
-
-            # Сопоставляем столбцы с нужными нам полями
-            column_mapping = {
-                'Код Инструмента': 'exchange_product_id',
-                'Наименование Инструмента': 'exchange_product_name',
-                'Базис поставки': 'delivery_basis_name',
-                'Объем Договоров в единицах измерения': 'volume',
-                'Объем Договоров, руб.': 'total',
-                'Обьем Договоров, руб.': 'total',
-                'Количество Договоров, шт.': 'count'
-            }
-
-            # Переименовываем столбцы по шаблону
-            renamed_columns = {}
-            for col in df.columns:
-                for pattern, new_name in column_mapping.items():
-                    if pattern in col:
-                        renamed_columns[col] = new_name
-                        break
-
-            # Проверяем, что нашли все нужные столбцы
-            if len(renamed_columns) + 1 < len(column_mapping):
-                missing = set(column_mapping.values()) - set(renamed_columns.values())
-                print(f"В файле {filepath} отсутствуют столбцы: {missing}")
-                return None
-
-            df = df.rename(columns=renamed_columns)
-
-            # Преобразуем числовые колонки и заменяем прочерки на NaN
-            numeric_cols = ['volume', 'total', 'count']
-            for col in numeric_cols:
-                if col in df.columns:
-                    # Заменяем прочерки и пустые строки на NaN
-                    df[col] = df[col].replace(['-', ''], pd.NA)
-                    df[col] = pd.to_numeric(df[col], errors='coerce')
-
-            # Фильтруем строки с count > 0 (не пустые и не нулевые)
-            if 'count' not in df.columns:
-                print(f"В файле {filepath} отсутствует столбец count")
-                return None
-
-            df = df[df['count'].notna() & (df['count'] > 0)].copy()
-
-            # Добавляем дополнительные поля
-            a = df.iloc[:, 1]
-            df['oil_id'] = a.str[:4]
-            df['delivery_basis_id'] = a.str[4:7]
-            df['delivery_type_id'] = a.str[-1]
-            df['trade_date'] = trade_date
-
-            # Выбираем только нужные колонки
-            result_cols = [
-                'exchange_product_id', 'exchange_product_name', 'oil_id',
-                'delivery_basis_id', 'delivery_basis_name', 'delivery_type_id',
-                'volume', 'total', 'count', 'trade_date'
-            ]
-
-            # Проверяем наличие всех колонок
-            available_cols = [col for col in result_cols if col in df.columns]
-            if len(available_cols) != len(result_cols):
-                missing = set(result_cols) - set(df.columns)
-                print(f"В данных отсутствуют колонки: {missing}")
-                return None
-
-            df = df[df['delivery_basis_name'].notna()]
-
-            return df[result_cols]
+            # Лист читается из памяти один раз, таблица вырезается из него там же
+            return parse_trade_summary(data)
 
         except Exception as e:
-            print(f"Ошибка при парсинге файла {filepath}: {str(e)}")
+            print(f"Ошибка при парсинге бюллетеня за {trade_date}: {str(e)}")
             return None
 
-    def save_to_db(self, df: pd.DataFrame):
+    def save_to_db(self, df: pd.DataFrame, sha256: Optional[str] = None):
         if df is None or df.empty:
             return
 
         session = self.Session()
         try:
-            records = df.to_dict('records')
+            skipped = 0
+            # DO UPDATE не может дважды изменить одну строку в одном запросе, оставляем последнюю
+            if self.on_conflict == 'update':
+                deduplicated = df.drop_duplicates(['exchange_product_id', 'trade_date'], keep='last')
+                skipped = len(df) - len(deduplicated)
+                df = deduplicated
+
+            # None вместо NaN, count - целое число
+            records = df.astype(object).where(df.notna(), None).to_dict('records')
             for record in records:
-                # Проверяем существование записи
-                exists = session.query(TradingResult).filter(
-                    TradingResult.exchange_product_id == record['exchange_product_id'],
-                    TradingResult.trade_date == record['trade_date']
-                ).first()
-
-                if not exists:
-                    session.add(TradingResult(**record))
-
+                if record['count'] is not None:
+                    record['count'] = int(record['count'])
+
+            # Один INSERT ... ON CONFLICT вместо SELECT на каждую запись
+            stmt = insert(TradingResult).values(records)
+            if self.on_conflict == 'update':
+                set_ = {col: stmt.excluded[col] for col in UPDATE_COLUMNS}
+                set_['updated_at'] = func.now()
+                stmt = stmt.on_conflict_do_update(constraint='unique_trade_record', set_=set_)
+            else:
+                stmt = stmt.on_conflict_do_nothing(constraint='unique_trade_record')
+            # xmax = 0 только у вставленных строк
+            rows = session.execute(stmt.returning(literal_column('(xmax = 0)').label('inserted'))).all()
             session.commit()
-            print(f"Добавлено {len(records)} записей за {records[0]['trade_date']}")
+            if self.cache:
+                self.cache.mark_parsed(sha256, len(df))
+
+            inserted = sum(1 for row in rows if row.inserted)
+            print(f"За {records[0]['trade_date']}: добавлено {inserted}, обновлено {len(rows) - inserted}, "
+                  f"пропущено {skipped + len(records) - len(rows)} записей")
 
         except Exception as e:
             session.rollback()
@@ -323,19 +267,20 @@ class BulletinParser:
                     stop_processing = True
                     break
 
-                filepath = self.download_bulletin(bulletin)
-                if not filepath:
+                data = self.download_bulletin(bulletin)
+                if not data:
+                    continue
+
+                # Файл с таким содержимым уже разобран и записан в эту БД, и записи за дату на месте - пропускаем
+                if self.cache and self.cache.is_parsed(bulletin.get('sha256')) and self.has_trade_date(bulletin['date']):
+                    print(f"Бюллетень за {bulletin['date']} не изменился, пропускаем")
                     continue
 
-                df = self.parse_bulletin(filepath, bulletin['date'])
+                df = self.parse_bulletin(data, bulletin['date'])
                 if df is not None and not df.empty:
-                    self.save_to_db(df)
+                    self.save_to_db(df, bulletin.get('sha256'))
                     processed_count += len(df)
 
-                # Удаляем временный файл
-                if os.path.exists(filepath):
-                    os.remove(filepath)
-
                 time.sleep(1)
 
             current_page += 1
@@ -344,7 +289,13 @@ class BulletinParser:
                 print("Достигнута последняя таблица (09.01.2023) - завершение обработки")
                 break
 
+        if self.cache:
+            # Дожидаемся записи файлов в кэш перед вытеснением
+            self.cache_writer.shutdown(wait=True)
+            self.cache.evict()
+
         self.driver.quit()
+        self.http_session.close()
         print(f"Обработка завершена. Всего обработано {processed_count} записей")
 
     def run(self):
@@ -0,0 +1,157 @@
+import json
+import os
+import threading
+import time
+from typing import Dict, Optional
+
+
+class BulletinCache:
+    """
+    Кэш бюллетеней на диске: файлы по sha256 содержимого, индекс по URL с ETag/Last-Modified
+    и отметки о хэшах, которые уже разобраны и записаны в БД.
+
+    Отметки ведутся отдельно для каждой БД (target): парсеры пишут в разные базы из одного каталога кэша.
+    """
+
+    def __init__(self, cache_dir: str, max_bytes: int, max_age_days: float,
+                 target: str = '', parsed_max_age_days: float = 180):
+        self.cache_dir = cache_dir
+        self.blob_dir = os.path.join(cache_dir, 'blobs')
+        self.index_path = os.path.join(cache_dir, 'index.json')
+        self.max_bytes = max_bytes
+        self.max_age = max_age_days * 24 * 3600
+        self.target = target
+        self.parsed_max_age = parsed_max_age_days * 24 * 3600
+        os.makedirs(self.blob_dir, exist_ok=True)
+        self.index = self.load_index()
+        # Файлы пишутся из фонового потока, индекс меняется под блокировкой
+        self._lock = threading.RLock()
+
+    def load_index(self) -> dict:
+        index = {'urls': {}, 'files': {}, 'parsed': {}}
+        if os.path.exists(self.index_path):
+            try:
+                with open(self.index_path, encoding='utf-8') as f:
+                    index.update(json.load(f))
+            except (OSError, ValueError) as e:
+                print(f"Индекс кэша поврежден, начинаем с пустого: {str(e)}")
+        # Прежние отметки без БД ({sha256: {...}}) непонятно к какой базе относятся - отбрасываем
+        index['parsed'] = {
+            target: entries for target, entries in index['parsed'].items()
+            if isinstance(entries, dict) and all(isinstance(entry, dict) for entry in entries.values())
+        }
+        return index
+
+    def save_index(self):
+        # Через временный файл, чтобы прерванная запись не испортила индекс
+        with self._lock:
+            tmp_path = self.index_path + '.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self.index, f, ensure_ascii=False)
+            os.replace(tmp_path, self.index_path)
+
+    def blob_path(self, sha256: str) -> str:
+        return os.path.join(self.blob_dir, f"{sha256}.xls")
+
+    def url_hash(self, url: str) -> Optional[str]:
+        """Хэш последней версии файла по URL, если сам файл еще в кэше"""
+        entry = self.index['urls'].get(url)
+        if entry and os.path.exists(self.blob_path(entry['sha256'])):
+            return entry['sha256']
+        return None
+
+    def conditional_headers(self, url: str) -> Dict[str, str]:
+        """If-None-Match / If-Modified-Since для файла, который уже есть в кэше"""
+        if not self.url_hash(url):
+            return {}
+        entry = self.index['urls'][url]
+        headers = {}
+        if entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    def touch(self, sha256: str):
+        if sha256 in self.index['files']:
+            self.index['files'][sha256]['last_used'] = time.time()
+
+    def hit(self, url: str) -> Optional[bytes]:
+        """Ответ 304: содержимое уже сохраненного файла"""
+        sha256 = self.url_hash(url)
+        if not sha256:
+            return None
+        with open(self.blob_path(sha256), 'rb') as f:
+            data = f.read()
+        with self._lock:
+            self.touch(sha256)
+            self.save_index()
+        return data
+
+    def store(self, url: str, data: bytes, sha256: str,
+              etag: Optional[str] = None, last_modified: Optional[str] = None):
+        """Сохраняет скачанное содержимое в кэш - вызывается из фонового потока"""
+        path = self.blob_path(sha256)
+        if not os.path.exists(path):
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+
+        now = time.time()
+        with self._lock:
+            self.index['urls'][url] = {
+                'sha256': sha256, 'etag': etag, 'last_modified': last_modified, 'fetched_at': now
+            }
+            self.index['files'][sha256] = {'size': len(data), 'last_used': now}
+            self.save_index()
+
+    def is_parsed(self, sha256: Optional[str]) -> bool:
+        return bool(sha256) and sha256 in self.index['parsed'].get(self.target, {})
+
+    def mark_parsed(self, sha256: Optional[str], rows: int):
+        """Запоминаем, что файл с таким содержимым уже разобран и записан в БД target"""
+        if not sha256:
+            return
+        with self._lock:
+            self.index['parsed'].setdefault(self.target, {})[sha256] = {'rows': rows, 'parsed_at': time.time()}
+            self.save_index()
+
+    def evict(self):
+        """Удаляем файлы старше max_age, затем самые давно используемые сверх max_bytes"""
+        with self._lock:
+            self._evict()
+
+    def _evict(self):
+        now = time.time()
+        files = self.index['files']
+        removed = [sha for sha, entry in files.items() if now - entry['last_used'] > self.max_age]
+
+        total = sum(entry['size'] for sha, entry in files.items() if sha not in removed)
+        for sha, entry in sorted(files.items(), key=lambda item: item[1]['last_used']):
+            if total <= self.max_bytes:
+                break
+            if sha not in removed:
+                removed.append(sha)
+                total -= entry['size']
+
+        for sha in removed:
+            files.pop(sha, None)
+            if os.path.exists(self.blob_path(sha)):
+                os.remove(self.blob_path(sha))
+
+        # Отметки о разборе живут дольше файлов: по ним неизменный файл пропустится и после повторного
+        # скачивания; старше parsed_max_age - удаляются, такой бюллетень просто разберется заново
+        self.index['urls'] = {
+            url: entry for url, entry in self.index['urls'].items() if entry['sha256'] in files
+        }
+        parsed = {}
+        for target, entries in self.index['parsed'].items():
+            entries = {sha: entry for sha, entry in entries.items() if now - entry['parsed_at'] <= self.parsed_max_age}
+            if entries:
+                parsed[target] = entries
+        self.index['parsed'] = parsed
+        self.save_index()
+        if removed:
+            print(f"Из кэша удалено {len(removed)} файлов, занято {total / 1024 / 1024:.1f} МБ")
+
@@ -8,4 +8,16 @@ DB_HOST = os.environ.get('DB_HOST')
 DB_PORT = os.environ.get('DB_PORT')
 DB_USER = os.environ.get('DB_USER')
 DB_PASS = os.environ.get('DB_PASS')
-BASE_URL = os.environ.get('BASE_URL')
\ No newline at end of file
+BASE_URL = os.environ.get('BASE_URL')
+
+# Локальный кэш скачанных бюллетеней
+CACHE_ENABLED = os.environ.get('BULLETIN_CACHE', '1').lower() in ('1', 'true', 'yes')
+CACHE_DIR = os.environ.get('BULLETIN_CACHE_DIR', 'bulletin_cache')
+CACHE_MAX_MB = int(os.environ.get('BULLETIN_CACHE_MAX_MB', 500))
+CACHE_MAX_AGE_DAYS = float(os.environ.get('BULLETIN_CACHE_MAX_AGE_DAYS', 30))
+# Отметки о разобранных бюллетенях: через столько дней бюллетень разбирается заново
+CACHE_PARSED_MAX_AGE_DAYS = float(os.environ.get('BULLETIN_CACHE_PARSED_MAX_AGE_DAYS', 180))
+
+# Скачивание в память: размер блока чтения и число соединений в пуле HTTP-сессии
+DOWNLOAD_CHUNK_SIZE = int(os.environ.get('DOWNLOAD_CHUNK_SIZE', 256 * 1024))
+HTTP_POOL_SIZE = int(os.environ.get('HTTP_POOL_SIZE', 10))
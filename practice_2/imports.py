@@ -4,8 +4,14 @@ from sqlalchemy import create_engine, Column, Integer, String, Numeric, Date, Fo
 from sqlalchemy.orm import declarative_base, sessionmaker, relationship
 from sqlalchemy import create_engine, Column, Integer, String, Numeric, Date, DateTime, UniqueConstraint
 from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy import exists, func, literal_column, select
+from sqlalchemy.dialects.postgresql import insert
 from urllib.parse import urljoin
+import hashlib
+import io
+from concurrent.futures import ThreadPoolExecutor
 import requests
+from requests.adapters import HTTPAdapter
 from bs4 import BeautifulSoup
 import pandas as pd
 from datetime import datetime, date
@@ -0,0 +1,125 @@
+import asyncio
+import random
+import sys
+import time
+from datetime import date, timedelta
+from typing import List
+
+import pandas as pd
+from sqlalchemy import delete, select, text
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from config import DB_HOST, DB_NAME, DB_PASS, DB_PORT, DB_USER, TRADING_RESULTS_PARTITION
+from db_writer import COPY_BATCH_ROWS, copy_dataframes, frame_dates, upsert_dataframe
+from models import Base, TradingResult
+from partitions import PartitionManager, partition_name
+
+DB_URL = f"postgresql+asyncpg://{DB_USER}:{DB_PASS}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+
+# Синтетические бюллетени датируются 1990 годом, чтобы не пересекаться с реальными данными
+BENCH_START = date(1990, 1, 1)
+
+
+def make_bulletins(days: int, rows: int) -> List[pd.DataFrame]:
+    rnd = random.Random(0)
+    bulletins = []
+    trade_date = BENCH_START
+    for _ in range(days):
+        codes = [f"A{i:03d}{rnd.choice(['ABS', 'UFM', 'NVY'])}{rnd.choice('FJK')}" for i in range(rows)]
+        bulletins.append(pd.DataFrame({
+            'exchange_product_id': codes,
+            'exchange_product_name': [f"Продукт {code}" for code in codes],
+            'oil_id': [code[:4] for code in codes],
+            'delivery_basis_id': [code[4:7] for code in codes],
+            'delivery_basis_name': [f"Базис {code[4:7]}" for code in codes],
+            'delivery_type_id': [code[-1] for code in codes],
+            'volume': [float(rnd.randint(60, 5000)) for _ in codes],
+            'total': [float(rnd.randint(100000, 90000000)) for _ in codes],
+            'count': [float(rnd.randint(1, 10)) for _ in codes],
+            'trade_date': trade_date,
+        }))
+        trade_date += timedelta(days=1)
+    return bulletins
+
+
+async def save_orm(async_session, bulletins: List[pd.DataFrame]):
+    """Прежний путь: SELECT на каждую запись и добавление ORM-объектов"""
+    for df in bulletins:
+        async with async_session() as session:
+            for record in df.to_dict('records'):
+                record['count'] = int(record['count'])
+                exists = await session.execute(
+                    select(TradingResult).where(
+                        TradingResult.exchange_product_id == record['exchange_product_id'],
+                        TradingResult.trade_date == record['trade_date']
+                    )
+                )
+                if not exists.scalar_one_or_none():
+                    session.add(TradingResult(**record))
+            await session.commit()
+
+
+async def save_upsert(async_session, bulletins: List[pd.DataFrame]):
+    for df in bulletins:
+        async with async_session() as session:
+            await upsert_dataframe(session, df)
+            await session.commit()
+
+
+async def save_copy(async_session, bulletins: List[pd.DataFrame]):
+    batch, batch_rows = [], 0
+    for df in bulletins + [None]:
+        if df is not None:
+            batch.append(df)
+            batch_rows += len(df)
+        if batch and (df is None or batch_rows >= COPY_BATCH_ROWS):
+            async with async_session() as session:
+                await copy_dataframes(session, batch)
+                await session.commit()
+            batch, batch_rows = [], 0
+
+
+async def main(days: int, rows: int, modes: List[str]):
+    engine = create_async_engine(DB_URL)
+    async_session = sessionmaker(engine, expire_on_commit=False, class_=AsyncSession)
+    partitions = PartitionManager(TRADING_RESULTS_PARTITION)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+        await conn.run_sync(partitions.load)
+
+    bulletins = make_bulletins(days, rows)
+    dates = frame_dates(bulletins)
+    # Секции за 1990 год создает сам замер - после него они удаляются
+    created = [partition_name(trade_date, partitions.period) for trade_date in partitions.missing(dates)]
+    await partitions.ensure(engine, dates)
+    total = days * rows
+    strategies = {'orm': save_orm, 'upsert': save_upsert, 'copy': save_copy}
+
+    try:
+        for mode in modes:
+            start = time.perf_counter()
+            await strategies[mode](async_session, bulletins)
+            elapsed = time.perf_counter() - start
+            print(f"{mode:>7}: {total} записей за {elapsed:.2f} сек, {total / elapsed:.0f} записей/сек")
+
+            async with engine.begin() as conn:
+                await conn.execute(delete(TradingResult).where(
+                    TradingResult.trade_date >= BENCH_START,
+                    TradingResult.trade_date < BENCH_START + timedelta(days=days)
+                ))
+    finally:
+        if created:
+            async with engine.begin() as conn:
+                for name in created:
+                    await conn.execute(text(f"DROP TABLE IF EXISTS {name}"))
+            print(f"Удалены секции замера: {created}")
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    # python benchmark_ingest.py [дней] [строк в бюллетене] [orm,upsert,copy]
+    days = int(sys.argv[1]) if len(sys.argv) > 1 else 250
+    rows = int(sys.argv[2]) if len(sys.argv) > 2 else 300
+    modes = sys.argv[3].split(',') if len(sys.argv) > 3 else ['orm', 'upsert', 'copy']
+    asyncio.run(main(days, rows, modes))
@@ -0,0 +1,108 @@
+import os
+import re
+import sys
+import time
+from datetime import datetime
+from typing import Optional
+
+import pandas as pd
+
+from bulletin_reader import COLUMN_MAPPING, RESULT_COLUMNS, parse_trade_summary
+
+
+def legacy_parse(filepath: str) -> Optional[pd.DataFrame]:
+    """Прежний разбор: три чтения файла и поиск якорей через iterrows"""
+    xls = pd.ExcelFile(filepath)
+    if 'TRADE_SUMMARY' not in xls.sheet_names:
+        return None
+
+    df_raw = pd.read_excel(filepath, sheet_name='TRADE_SUMMARY', header=None)
+
+    trade_date = None
+    for i, row in df_raw.iterrows():
+        if "Дата торгов:" in str(row.values):
+            date_match = re.search(r'\d{2}\.\d{2}\.\d{4}', str(row.values))
+            if date_match:
+                trade_date = datetime.strptime(date_match.group(), '%d.%m.%Y').date()
+            break
+    if not trade_date:
+        return None
+
+    start_row = None
+    metric_ton_found = False
+    for i, row in df_raw.iterrows():
+        row_str = str(row.values)
+        if "Единица измерения: Метрическая тонна" in row_str:
+            metric_ton_found = True
+            continue
+        if metric_ton_found and "Цена (за единицу измерения), руб." in row_str:
+            start_row = i
+            break
+    if start_row is None:
+        return None
+
+    df = pd.read_excel(filepath, sheet_name='TRADE_SUMMARY', header=start_row, skipfooter=2)
+    df.columns = [str(col).strip().replace('\n', ' ') for col in df.columns]
+
+    renamed_columns = {}
+    for col in df.columns:
+        for pattern, new_name in COLUMN_MAPPING.items():
+            if pattern in col:
+                renamed_columns[col] = new_name
+                break
+    df = df.rename(columns=renamed_columns)
+
+    for col in ['volume', 'total', 'count']:
+        if col in df.columns:
+            df[col] = df[col].replace(['-', ''], pd.NA)
+            df[col] = pd.to_numeric(df[col], errors='coerce')
+
+    df = df[df['count'].notna() & (df['count'] > 0)].copy()
+    a = df.iloc[:, 1]
+    df['oil_id'] = a.str[:4]
+    df['delivery_basis_id'] = a.str[4:7]
+    df['delivery_type_id'] = a.str[-1]
+    df['trade_date'] = trade_date
+    df = df[df['delivery_basis_name'].notna()]
+    return df[RESULT_COLUMNS]
+
+
+def run(name: str, parse, files: list, rounds: int) -> list:
+    results = []
+    start = time.perf_counter()
+    for _ in range(rounds):
+        results = [parse(f) for f in files]
+    elapsed = time.perf_counter() - start
+    total = len(files) * rounds
+    print(f"{name:>8}: {total} файлов за {elapsed:.2f} сек, {total / elapsed:.1f} файлов/сек")
+    return results
+
+
+def main(folder: str, rounds: int = 3):
+    files = sorted(
+        os.path.join(folder, name) for name in os.listdir(folder) if name.endswith('.xls')
+    )
+    if not files:
+        print(f"В папке {folder} нет .xls файлов")
+        return
+
+    before = run('before', legacy_parse, files, rounds)
+    after = run('after', parse_trade_summary, files, rounds)
+
+    # Проверяем, что новый парсер дает те же записи
+    for filepath, old, new in zip(files, before, after):
+        if old is None or new is None:
+            if (old is None) != (new is None):
+                print(f"Расхождение в файле {filepath}: один из парсеров не вернул данных")
+            continue
+        old = old.reset_index(drop=True).astype(object)
+        new = new.reset_index(drop=True).astype(object)
+        if not old.equals(new):
+            print(f"Расхождение в файле {filepath}")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Использование: python benchmark_parse.py <папка с бюллетенями> [повторы]")
+        sys.exit(1)
+    main(sys.argv[1], int(sys.argv[2]) if len(sys.argv) > 2 else 3)
@@ -0,0 +1,214 @@
+import io
+import re
+from datetime import date, datetime
+from typing import Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+SHEET_NAME = 'TRADE_SUMMARY'
+TRADE_DATE_MARKER = 'Дата торгов:'
+METRIC_TON_MARKER = 'Единица измерения: Метрическая тонна'
+HEADER_MARKER = 'Цена (за единицу измерения), руб.'
+FOOTER_ROWS = 2  # Итоговые строки в конце листа
+XLS_SIGNATURE = b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1'  # Старый формат .xls (OLE2), его читает xlrd
+
+# Сопоставляем столбцы с нужными нам полями
+COLUMN_MAPPING = {
+    'Код Инструмента': 'exchange_product_id',
+    'Наименование Инструмента': 'exchange_product_name',
+    'Базис поставки': 'delivery_basis_name',
+    'Объем Договоров в единицах измерения': 'volume',
+    'Объем Договоров, руб.': 'total',
+    'Обьем Договоров, руб.': 'total',
+    'Количество Договоров, шт.': 'count'
+}
+
+RESULT_COLUMNS = [
+    'exchange_product_id', 'exchange_product_name', 'oil_id',
+    'delivery_basis_id', 'delivery_basis_name', 'delivery_type_id',
+    'volume', 'total', 'count', 'trade_date'
+]
+
+
+def source_name(source) -> str:
+    """Имя источника для сообщений: путь к файлу или имя буфера"""
+    if isinstance(source, str):
+        return source
+    if isinstance(source, (bytes, bytearray)):
+        return 'buffer'
+    return getattr(source, 'name', None) or type(source).__name__
+
+
+def is_xls(source) -> bool:
+    """Книга в формате .xls, а не .xlsx: определяем по первым байтам файла"""
+    if isinstance(source, str):
+        with open(source, 'rb') as f:
+            return f.read(len(XLS_SIGNATURE)) == XLS_SIGNATURE
+    position = source.tell()
+    head = source.read(len(XLS_SIGNATURE))
+    source.seek(position)
+    return head == XLS_SIGNATURE
+
+
+def load_sheet(source) -> Optional[pd.DataFrame]:
+    """Единственное чтение листа TRADE_SUMMARY в память"""
+    # Скачанный файл приходит байтами - читаем его без записи на диск
+    if isinstance(source, (bytes, bytearray)):
+        source = io.BytesIO(source)
+    # on_demand: xlrd разбирает только нужный лист, а не всю книгу; openpyxl (.xlsx) такого параметра не знает
+    engine_kwargs = {'on_demand': True} if is_xls(source) else {}
+    with pd.ExcelFile(source, engine_kwargs=engine_kwargs) as xls:
+        if SHEET_NAME not in xls.sheet_names:
+            return None
+        return xls.parse(SHEET_NAME, header=None)
+
+
+def sheet_text(df_raw: pd.DataFrame) -> np.ndarray:
+    """Текст ячеек листа в виде строкового массива numpy для векторного поиска"""
+    # Текст может быть только в object-колонках, числовые пропускаем
+    return df_raw.select_dtypes(include='object').fillna('').to_numpy(dtype=str)
+
+
+def find_rows(cells: np.ndarray, marker: str) -> np.ndarray:
+    """Номера строк, в ячейках которых встречается marker"""
+    if not cells.size:
+        return np.empty(0, dtype=int)
+    return np.flatnonzero((np.char.find(cells, marker) >= 0).any(axis=1))
+
+
+def find_trade_date(cells: np.ndarray) -> Optional[date]:
+    rows = find_rows(cells, TRADE_DATE_MARKER)
+    if not len(rows):
+        return None
+
+    row_text = ' '.join(cells[rows[0]])
+    date_match = re.search(r'\d{2}\.\d{2}\.\d{4}', row_text)
+    if not date_match:
+        return None
+    return datetime.strptime(date_match.group(), '%d.%m.%Y').date()
+
+
+def find_header_row(cells: np.ndarray) -> Optional[int]:
+    """Строка заголовков первой таблицы после отметки о метрических тоннах"""
+    metric_rows = find_rows(cells, METRIC_TON_MARKER)
+    if not len(metric_rows):
+        return None
+
+    header_rows = find_rows(cells, HEADER_MARKER)
+    header_rows = header_rows[header_rows > metric_rows[0]]
+    if not len(header_rows):
+        return None
+    return int(header_rows[0])
+
+
+def make_columns(header: pd.Series) -> list:
+    """Заголовки как у pd.read_excel(header=...): без переносов, пустые - Unnamed, дубли с суффиксом"""
+    columns = []
+    seen = {}
+    for i, value in enumerate(header):
+        name = str(value).strip().replace('\n', ' ') if pd.notna(value) else f'Unnamed: {i}'
+        if name in seen:
+            seen[name] += 1
+            name = f'{name}.{seen[name]}'
+        else:
+            seen[name] = 0
+        columns.append(name)
+    return columns
+
+
+def slice_table(df_raw: pd.DataFrame, header_row: int) -> pd.DataFrame:
+    """Вырезаем таблицу из уже прочитанного листа без повторного чтения файла"""
+    df = df_raw.iloc[header_row + 1:len(df_raw) - FOOTER_ROWS].copy()
+    df.columns = make_columns(df_raw.iloc[header_row])
+    return df.reset_index(drop=True)
+
+
+def parse_trade_summary(source, trade_date: Optional[date] = None) -> Optional[pd.DataFrame]:
+    """
+    Разбор бюллетеня за один проход по файлу.
+
+    source - путь к .xls или файловый объект (BytesIO).
+    trade_date - дата торгов для записей; по умолчанию берется из самого бюллетеня.
+    """
+    name = source_name(source)
+
+    df_raw = load_sheet(source)
+    if df_raw is None:
+        print(f"Лист TRADE_SUMMARY не найден в файле {name}")
+        return None
+
+    cells = sheet_text(df_raw)
+
+    found_trade_date = find_trade_date(cells)
+    if not found_trade_date:
+        print(f"Не удалось определить дату торгов в файле {name}")
+        return None
+
+    start_row = find_header_row(cells)
+    if start_row is None:
+        print(f"Не найдена таблица с метрическими тоннами в файле {name}")
+        return None
+
+    df = slice_table(df_raw, start_row)
+
+    # Переименовываем столбцы по шаблону
+    renamed_columns = {}
+    for col in df.columns:
+        for pattern, new_name in COLUMN_MAPPING.items():
+            if pattern in col:
+                renamed_columns[col] = new_name
+                break
+
+    # Проверяем, что нашли все нужные столбцы
+    if len(renamed_columns) + 1 < len(COLUMN_MAPPING):
+        missing = set(COLUMN_MAPPING.values()) - set(renamed_columns.values())
+        print(f"В файле {name} отсутствуют столбцы: {missing}")
+        return None
+
+    df = df.rename(columns=renamed_columns)
+
+    # Преобразуем числовые колонки и заменяем прочерки на NaN
+    for col in ['volume', 'total', 'count']:
+        if col in df.columns:
+            df[col] = pd.to_numeric(df[col].replace(['-', ''], pd.NA), errors='coerce')
+
+    # Фильтруем строки с count > 0 (не пустые и не нулевые)
+    if 'count' not in df.columns:
+        print(f"В файле {name} отсутствует столбец count")
+        return None
+
+    df = df[df['count'].notna() & (df['count'] > 0)].copy()
+
+    # Добавляем дополнительные поля
+    a = df.iloc[:, 1]
+    df['oil_id'] = a.str[:4]
+    df['delivery_basis_id'] = a.str[4:7]
+    df['delivery_type_id'] = a.str[-1]
+    df['trade_date'] = trade_date or found_trade_date
+
+    missing = set(RESULT_COLUMNS) - set(df.columns)
+    if missing:
+        print(f"В данных отсутствуют колонки: {missing}")
+        return None
+
+    df = df[df['delivery_basis_name'].notna()]
+
+    return df[RESULT_COLUMNS]
+
+
+def parse_trade_summary_columns(source, trade_date: Optional[date] = None) -> Optional[Dict[str, np.ndarray]]:
+    """
+    Вариант parse_trade_summary для пула процессов.
+
+    Возвращает словарь колонка -> массив numpy: он сериализуется между процессами
+    заметно компактнее и быстрее, чем DataFrame целиком.
+    """
+    df = parse_trade_summary(source, trade_date)
+    if df is None:
+        return None
+    return {col: df[col].to_numpy() for col in RESULT_COLUMNS}
+
+
+def columns_to_dataframe(columns: Dict[str, np.ndarray]) -> pd.DataFrame:
+    return pd.DataFrame(columns, columns=RESULT_COLUMNS)
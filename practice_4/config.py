@@ -9,3 +9,35 @@ DB_PORT = os.environ.get('DB_PORT')
 DB_USER = os.environ.get('DB_USER')
 DB_PASS = os.environ.get('DB_PASS')
 BASE_URL = os.environ.get('BASE_URL')
+
+# Инкрементальный режим: загружать только бюллетени новее последней даты в БД
+INCREMENTAL = os.environ.get('INCREMENTAL', '').lower() in ('1', 'true', 'yes')
+
+# Локальный кэш скачанных бюллетеней
+CACHE_ENABLED = os.environ.get('BULLETIN_CACHE', '1').lower() in ('1', 'true', 'yes')
+CACHE_DIR = os.environ.get('BULLETIN_CACHE_DIR', 'bulletin_cache')
+CACHE_MAX_MB = int(os.environ.get('BULLETIN_CACHE_MAX_MB', 500))
+CACHE_MAX_AGE_DAYS = float(os.environ.get('BULLETIN_CACHE_MAX_AGE_DAYS', 30))
+# Отметки о разобранных бюллетенях: через столько дней бюллетень разбирается заново
+CACHE_PARSED_MAX_AGE_DAYS = float(os.environ.get('BULLETIN_CACHE_PARSED_MAX_AGE_DAYS', 180))
+
+# Скачивание в память: размер блока чтения и число соединений в пуле синхронного клиента
+DOWNLOAD_CHUNK_SIZE = int(os.environ.get('DOWNLOAD_CHUNK_SIZE', 256 * 1024))
+HTTP_POOL_SIZE = int(os.environ.get('HTTP_POOL_SIZE', 10))
+
+# Поиск ссылок на бюллетени: 'http' - обычные запросы (Selenium как запасной вариант), 'selenium' - браузер
+LINKS_BACKEND = os.environ.get('LINKS_BACKEND', 'http')
+LISTING_CONCURRENCY = int(os.environ.get('LISTING_CONCURRENCY', 4))
+
+# Конвейер скачивание -> разбор -> запись: число обработчиков на этапе и размер очередей между ними
+DOWNLOAD_WORKERS = int(os.environ.get('DOWNLOAD_WORKERS', 5))
+PARSE_WORKERS = int(os.environ.get('PARSE_WORKERS', os.cpu_count() or 1))
+SAVE_WORKERS = int(os.environ.get('SAVE_WORKERS', 2))
+QUEUE_SIZE = int(os.environ.get('QUEUE_SIZE', 10))
+PIPELINE_REPORT_INTERVAL = float(os.environ.get('PIPELINE_REPORT_INTERVAL', 10))
+
+# Событие о завершении загрузки для API (practice_6): по нему заранее пересчитываются популярные ключи кэша
+REDIS_URL = os.environ.get('REDIS_URL')
+
+# Секционирование trading_results по trade_date при создании схемы: '' - без секций, 'month' или 'year'
+TRADING_RESULTS_PARTITION = os.environ.get('TRADING_RESULTS_PARTITION', '').lower()
@@ -0,0 +1,222 @@
+import io
+from datetime import date
+from typing import Dict, Iterable, Iterator, List, Optional
+
+import pandas as pd
+from sqlalchemy import func, select, text
+from sqlalchemy.dialects.postgresql import insert
+
+from models import TradingDailyAggregate, TradingDate, TradingResult
+
+UPSERT_BATCH_SIZE = 1000  # 10 колонок * 1000 строк укладываются в лимит параметров asyncpg
+ON_CONFLICT_ACTIONS = ('nothing', 'update')
+CONFLICT_CONSTRAINT = 'unique_trade_record'
+UPDATE_COLUMNS = [
+    'exchange_product_name', 'oil_id', 'delivery_basis_id', 'delivery_basis_name',
+    'delivery_type_id', 'volume', 'total', 'count'
+]
+
+
+def dataframe_to_records(df: pd.DataFrame) -> List[dict]:
+    """Записи для вставки: None вместо NaN, count - целое число"""
+    records = df.astype(object).where(df.notna(), None).to_dict('records')
+    for record in records:
+        if record['count'] is not None:
+            record['count'] = int(record['count'])
+    return records
+
+
+def batches(records: List[dict], size: int = UPSERT_BATCH_SIZE) -> Iterator[List[dict]]:
+    for i in range(0, len(records), size):
+        yield records[i:i + size]
+
+
+def build_upsert(on_conflict: str = 'nothing'):
+    """INSERT ... ON CONFLICT ON CONSTRAINT unique_trade_record DO NOTHING/DO UPDATE"""
+    if on_conflict not in ON_CONFLICT_ACTIONS:
+        raise ValueError(f"Неизвестное действие при конфликте: {on_conflict}")
+
+    # created_at задается явно: по нему RETURNING отличает вставленные строки от обновленных
+    stmt = insert(TradingResult).values(created_at=func.now())
+    if on_conflict == 'update':
+        set_ = {col: stmt.excluded[col] for col in UPDATE_COLUMNS}
+        set_['updated_at'] = func.now()
+        stmt = stmt.on_conflict_do_update(constraint=CONFLICT_CONSTRAINT, set_=set_)
+    else:
+        stmt = stmt.on_conflict_do_nothing(constraint=CONFLICT_CONSTRAINT)
+
+    # now() - время начала транзакции; xmax = 0 не подходит, у секционированной таблицы
+    # системные колонки в RETURNING недоступны
+    return stmt.returning((TradingResult.created_at == func.now()).label('inserted'))
+
+
+def count_rows(stats: Dict[str, int], rows: list, batch_size: int):
+    inserted = sum(1 for row in rows if row.inserted)
+    stats['inserted'] += inserted
+    stats['updated'] += len(rows) - inserted
+    stats['skipped'] += batch_size - len(rows)
+
+
+def empty_stats() -> Dict[str, int]:
+    return {'inserted': 0, 'updated': 0, 'skipped': 0}
+
+
+def prepare_records(df: pd.DataFrame, on_conflict: str, stats: Dict[str, int]) -> List[dict]:
+    # DO UPDATE не может дважды изменить одну строку в одном запросе, оставляем последнюю
+    if on_conflict == 'update':
+        deduplicated = df.drop_duplicates(['exchange_product_id', 'trade_date'], keep='last')
+        stats['skipped'] += len(df) - len(deduplicated)
+        df = deduplicated
+    return dataframe_to_records(df)
+
+
+async def upsert_dataframe(session, df: pd.DataFrame, on_conflict: str = 'nothing') -> Dict[str, int]:
+    """Пакетная запись DataFrame через AsyncSession, коммит остается за вызывающим"""
+    stats = empty_stats()
+    for batch in batches(prepare_records(df, on_conflict, stats)):
+        result = await session.execute(build_upsert(on_conflict), batch)
+        count_rows(stats, result.all(), len(batch))
+    return stats
+
+
+def upsert_dataframe_sync(session, df: pd.DataFrame, on_conflict: str = 'nothing') -> Dict[str, int]:
+    """Пакетная запись DataFrame через синхронную Session, коммит остается за вызывающим"""
+    stats = empty_stats()
+    for batch in batches(prepare_records(df, on_conflict, stats)):
+        result = session.execute(build_upsert(on_conflict), batch)
+        count_rows(stats, result.all(), len(batch))
+    return stats
+
+
+# Режим бэкфилла: COPY во временную таблицу и один INSERT ... SELECT на пачку
+STAGING_TABLE = 'trading_results_staging'
+COPY_BATCH_ROWS = 50000
+COPY_COLUMNS = [
+    'exchange_product_id', 'exchange_product_name', 'oil_id',
+    'delivery_basis_id', 'delivery_basis_name', 'delivery_type_id',
+    'volume', 'total', 'count', 'trade_date'
+]
+# Порядковый номер строки в пачке: из дублей ключа остается последняя, как в prepare_records
+STAGING_COLUMNS = COPY_COLUMNS + ['ordinal']
+
+CREATE_STAGING_SQL = (
+    f"CREATE TEMP TABLE IF NOT EXISTS {STAGING_TABLE} ON COMMIT DELETE ROWS AS "
+    f"SELECT {', '.join(COPY_COLUMNS)}, 0::bigint AS ordinal FROM trading_results WITH NO DATA"
+)
+
+
+def build_merge_sql(on_conflict: str = 'nothing') -> str:
+    """Перенос временной таблицы в trading_results одним запросом"""
+    if on_conflict not in ON_CONFLICT_ACTIONS:
+        raise ValueError(f"Неизвестное действие при конфликте: {on_conflict}")
+
+    if on_conflict == 'update':
+        set_ = ', '.join(f"{col} = EXCLUDED.{col}" for col in UPDATE_COLUMNS)
+        action = f"DO UPDATE SET {set_}, updated_at = now()"
+    else:
+        action = "DO NOTHING"
+
+    columns = ', '.join(COPY_COLUMNS)
+    # DISTINCT ON: DO UPDATE не может дважды изменить одну строку в одном запросе
+    return (
+        f"WITH merged AS ("
+        f"INSERT INTO trading_results ({columns}, created_at) "
+        f"SELECT DISTINCT ON (exchange_product_id, trade_date) {columns}, now() FROM {STAGING_TABLE} "
+        f"ORDER BY exchange_product_id, trade_date, ordinal DESC "
+        f"ON CONFLICT ON CONSTRAINT {CONFLICT_CONSTRAINT} {action} "
+        f"RETURNING (created_at = now()) AS inserted) "
+        f"SELECT count(*) FILTER (WHERE inserted), count(*) FROM merged"
+    )
+
+
+def merge_stats(staged: int, inserted: int, merged: int) -> Dict[str, int]:
+    return {'inserted': inserted, 'updated': merged - inserted, 'skipped': staged - merged}
+
+
+async def copy_dataframes(session, frames: List[pd.DataFrame], on_conflict: str = 'nothing') -> Dict[str, int]:
+    """COPY пачки бюллетеней через asyncpg и слияние в trading_results, коммит за вызывающим"""
+    df = pd.concat(frames, ignore_index=True)
+    records = [
+        (*(record[col] for col in COPY_COLUMNS), ordinal)
+        for ordinal, record in enumerate(dataframe_to_records(df))
+    ]
+
+    await session.execute(text(CREATE_STAGING_SQL))
+    connection = await session.connection()
+    raw_connection = await connection.get_raw_connection()
+    await raw_connection.driver_connection.copy_records_to_table(
+        STAGING_TABLE, records=records, columns=STAGING_COLUMNS
+    )
+
+    inserted, merged = (await session.execute(text(build_merge_sql(on_conflict)))).one()
+    return merge_stats(len(records), inserted, merged)
+
+
+def copy_dataframes_sync(session, frames: List[pd.DataFrame], on_conflict: str = 'nothing') -> Dict[str, int]:
+    """COPY пачки бюллетеней через psycopg2 и слияние в trading_results, коммит за вызывающим"""
+    df = pd.concat(frames, ignore_index=True)
+    df = df.astype({'count': 'Int64'})  # В CSV count должен быть целым
+    df['ordinal'] = range(len(df))
+    buffer = io.StringIO()
+    df[STAGING_COLUMNS].to_csv(buffer, index=False, header=False)
+    buffer.seek(0)
+
+    session.execute(text(CREATE_STAGING_SQL))
+    cursor = session.connection().connection.cursor()
+    cursor.copy_expert(
+        f"COPY {STAGING_TABLE} ({', '.join(STAGING_COLUMNS)}) FROM STDIN WITH (FORMAT csv)", buffer
+    )
+
+    inserted, merged = session.execute(text(build_merge_sql(on_conflict))).one()
+    return merge_stats(len(df), inserted, merged)
+
+
+# Дневные агрегаты: пересчитываются для дат, которые затронула очередная запись
+AGGREGATE_KEYS = ['trade_date', 'oil_id', 'delivery_basis_id', 'delivery_type_id']
+AGGREGATE_VALUES = ['volume', 'total', 'count']
+
+
+def build_aggregate_refresh(dates: Optional[Iterable[date]] = None):
+    """INSERT ... SELECT ... GROUP BY из trading_results с обновлением уже посчитанных строк"""
+    keys = [getattr(TradingResult, col) for col in AGGREGATE_KEYS]
+    source = select(
+        *keys, *(func.sum(getattr(TradingResult, col)) for col in AGGREGATE_VALUES)
+    ).group_by(*keys)
+    if dates is not None:
+        source = source.where(TradingResult.trade_date.in_(sorted(set(dates))))
+
+    stmt = insert(TradingDailyAggregate).from_select(AGGREGATE_KEYS + AGGREGATE_VALUES, source)
+    set_ = {col: stmt.excluded[col] for col in AGGREGATE_VALUES}
+    set_['updated_at'] = func.now()
+    return stmt.on_conflict_do_update(index_elements=AGGREGATE_KEYS, set_=set_)
+
+
+def build_trading_dates_refresh(dates: Optional[Iterable[date]] = None):
+    """Новые даты торгов из trading_results; уже известные даты не трогаем"""
+    source = select(TradingResult.trade_date).distinct()
+    if dates is not None:
+        source = source.where(TradingResult.trade_date.in_(sorted(set(dates))))
+    stmt = insert(TradingDate).from_select(['trade_date'], source)
+    return stmt.on_conflict_do_nothing(index_elements=['trade_date'])
+
+
+def frame_dates(frames: List[pd.DataFrame]) -> List[date]:
+    return sorted({trade_date for df in frames for trade_date in df['trade_date'].unique()})
+
+
+async def refresh_derived_tables(session, dates: Iterable[date]):
+    """
+    Производные таблицы за затронутые даты, в той же транзакции, что и запись бюллетеней:
+    trading_daily_aggregates пересчитывается, в trading_dates добавляются новые даты.
+    """
+    dates = list(dates)
+    if dates:
+        await session.execute(build_aggregate_refresh(dates))
+        await session.execute(build_trading_dates_refresh(dates))
+
+
+def refresh_derived_tables_sync(session, dates: Iterable[date]):
+    dates = list(dates)
+    if dates:
+        session.execute(build_aggregate_refresh(dates))
+        session.execute(build_trading_dates_refresh(dates))
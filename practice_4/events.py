@@ -0,0 +1,40 @@
+import json
+from datetime import date
+from typing import Iterable, Optional
+
+import redis
+import redis.asyncio as aioredis
+
+# Канал, на который подписан practice_6.cache_warmer
+INGEST_CHANNEL = 'ingest:complete'
+
+
+def ingest_event(trade_dates: Iterable[date]) -> str:
+    return json.dumps({'trade_dates': sorted(d.isoformat() for d in trade_dates)})
+
+
+async def publish_ingest_complete(redis_url: Optional[str], trade_dates: Iterable[date]):
+    """Сообщение API о новых датах торгов; без Redis или без новых данных ничего не отправляется"""
+    trade_dates = set(trade_dates)
+    if not redis_url or not trade_dates:
+        return
+    client = aioredis.from_url(redis_url)
+    try:
+        await client.publish(INGEST_CHANNEL, ingest_event(trade_dates))
+    except redis.RedisError as e:
+        print(f"Не удалось отправить событие о загрузке: {str(e)}")
+    finally:
+        await client.aclose()
+
+
+def publish_ingest_complete_sync(redis_url: Optional[str], trade_dates: Iterable[date]):
+    trade_dates = set(trade_dates)
+    if not redis_url or not trade_dates:
+        return
+    client = redis.Redis.from_url(redis_url)
+    try:
+        client.publish(INGEST_CHANNEL, ingest_event(trade_dates))
+    except redis.RedisError as e:
+        print(f"Не удалось отправить событие о загрузке: {str(e)}")
+    finally:
+        client.close()
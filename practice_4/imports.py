@@ -1,13 +1,22 @@
 import os
+import sys
 from dotenv import load_dotenv
 import asyncio
+import hashlib
+import io
+import multiprocessing
+import signal
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
 import aiohttp
 import asyncpg
-from sqlalchemy import create_engine, select
+from sqlalchemy import create_engine, exists, func, select
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.orm import sessionmaker
 import time
-from datetime import date, datetime
+from datetime import date, datetime, timedelta
 import os
 import re
 import pandas as pd
@@ -21,6 +30,7 @@ from selenium.webdriver.support import expected_conditions as EC
 from sqlalchemy import Column, Integer, String, Numeric, Date, DateTime, UniqueConstraint
 from sqlalchemy.ext.declarative import declarative_base
 import requests
+from requests.adapters import HTTPAdapter
 import psycopg2
 import xlrd
 import time
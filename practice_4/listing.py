@@ -0,0 +1,44 @@
+import re
+from datetime import datetime
+from typing import List
+from urllib.parse import urljoin
+
+from bs4 import BeautifulSoup
+
+BULLETIN_TITLE = re.compile(r'Бюллетень по итогам торгов в Секции «Нефтепродукты»')
+LISTING_BACKENDS = ('http', 'selenium')
+HTTP_HEADERS = {'User-Agent': 'Mozilla/5.0'}
+
+
+def listing_url(base_url: str, section_url: str, page_num: int) -> str:
+    return f"{base_url}{section_url}?page=page-{page_num}"
+
+
+def extract_bulletin_links(html: str, base_url: str) -> List[dict]:
+    """Ссылки на бюллетени со страницы результатов торгов - общая часть для всех способов загрузки"""
+    soup = BeautifulSoup(html, 'html.parser')
+
+    # Ищем все ссылки на бюллетени (xls файлы)
+    bulletins = []
+    for item in soup.find_all(string=BULLETIN_TITLE):
+        if not item.strip():
+            continue
+
+        # Находим родительский элемент со ссылкой
+        parent = item.find_parent()
+        link = parent.get("href") if parent else None
+        if not link:
+            continue
+
+        date_match = re.search(r'(\d{8})', link)
+        if not date_match:
+            continue
+
+        trade_date = datetime.strptime(date_match.group(1), '%Y%m%d').date()
+        bulletins.append({
+            'url': urljoin(base_url, link),
+            'date': trade_date,
+            'filename': f"oil_products_{trade_date.strftime('%Y%m%d')}.xls"
+        })
+
+    return bulletins
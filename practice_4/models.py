@@ -0,0 +1,60 @@
+from sqlalchemy import Column, Integer, String, Numeric, Date, DateTime, UniqueConstraint, Index, func
+from sqlalchemy.orm import declarative_base
+
+from config import TRADING_RESULTS_PARTITION
+
+# Инициализация SQLAlchemy
+Base = declarative_base()
+
+
+class TradingResult(Base):
+    __tablename__ = 'trading_results'
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    exchange_product_id = Column(String(20), nullable=False)
+    exchange_product_name = Column(String(255), nullable=False)
+    oil_id = Column(String(10), nullable=False)
+    delivery_basis_id = Column(String(10), nullable=False)
+    delivery_basis_name = Column(String(255), nullable=False)
+    delivery_type_id = Column(String(10), nullable=False)
+    volume = Column(Numeric(20, 2))
+    total = Column(Numeric(20, 2))
+    count = Column(Integer, nullable=False)
+    # У секционированной таблицы первичный ключ обязан содержать ключ секций - trade_date
+    trade_date = Column(Date, nullable=False, primary_key=bool(TRADING_RESULTS_PARTITION))
+    created_at = Column(DateTime, server_default=func.now())
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
+
+    __table_args__ = (
+        UniqueConstraint('exchange_product_id', 'trade_date', name='unique_trade_record'),
+        # Индексы под запросы API (practice_6), на живой таблице - practice_6/create_indexes.py
+        Index('ix_trading_results_trade_date', trade_date.desc()),
+        Index(
+            'ix_trading_results_product_trade_date',
+            oil_id, delivery_basis_id, delivery_type_id, trade_date.desc()
+        ),
+        # Секции по месяцам или годам создаются при загрузке (partitions.py)
+        {'postgresql_partition_by': 'RANGE (trade_date)'} if TRADING_RESULTS_PARTITION else {},
+    )
+
+
+class TradingDailyAggregate(Base):
+    """Итоги торгов за день по oil_id / delivery_basis_id / delivery_type_id для графиков динамики"""
+    __tablename__ = 'trading_daily_aggregates'
+
+    trade_date = Column(Date, primary_key=True)
+    oil_id = Column(String(10), primary_key=True)
+    delivery_basis_id = Column(String(10), primary_key=True)
+    delivery_type_id = Column(String(10), primary_key=True)
+    volume = Column(Numeric(20, 2))
+    total = Column(Numeric(20, 2))
+    count = Column(Integer, nullable=False)
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
+
+
+class TradingDate(Base):
+    """Даты, за которые есть итоги торгов: /last-trading-dates/ читает их без DISTINCT по trading_results"""
+    __tablename__ = 'trading_dates'
+
+    trade_date = Column(Date, primary_key=True)
+    created_at = Column(DateTime, server_default=func.now())
@@ -0,0 +1,66 @@
+import sys
+import time
+
+from sqlalchemy import create_engine, text
+
+from config import DB_HOST, DB_NAME, DB_PASS, DB_PORT, DB_USER, TRADING_RESULTS_PARTITION
+from models import Base
+from partitions import PartitionManager
+
+# Старая таблица переименовывается вместе с ограничениями, индексами и последовательностью,
+# чтобы create_all создал секционированную таблицу с прежними именами
+RENAME_SQL = [
+    "ALTER TABLE trading_results RENAME TO trading_results_old",
+    "ALTER TABLE trading_results_old RENAME CONSTRAINT trading_results_pkey TO trading_results_old_pkey",
+    "ALTER TABLE trading_results_old RENAME CONSTRAINT unique_trade_record TO unique_trade_record_old",
+    "ALTER INDEX IF EXISTS ix_trading_results_trade_date RENAME TO ix_trading_results_old_trade_date",
+    "ALTER INDEX IF EXISTS ix_trading_results_product_trade_date "
+    "RENAME TO ix_trading_results_old_product_trade_date",
+    "ALTER SEQUENCE IF EXISTS trading_results_id_seq RENAME TO trading_results_old_id_seq",
+]
+COLUMNS = (
+    'id, exchange_product_id, exchange_product_name, oil_id, delivery_basis_id, delivery_basis_name, '
+    'delivery_type_id, volume, total, count, trade_date, created_at, updated_at'
+)
+
+
+def main(db_name: str):
+    """Перенос trading_results в секционированную по trade_date таблицу одной транзакцией"""
+    if not TRADING_RESULTS_PARTITION:
+        sys.exit("Задайте TRADING_RESULTS_PARTITION=month или year")
+
+    engine = create_engine(f"postgresql://{DB_USER}:{DB_PASS}@{DB_HOST}:{DB_PORT}/{db_name}")
+    partitions = PartitionManager(TRADING_RESULTS_PARTITION)
+    start = time.perf_counter()
+    with engine.begin() as conn:
+        partitions.load(conn)
+        if partitions.enabled:
+            print("trading_results уже секционирована")
+            return
+
+        conn.execute(text("LOCK TABLE trading_results IN ACCESS EXCLUSIVE MODE"))
+        for sql in RENAME_SQL:
+            conn.execute(text(sql))
+        Base.metadata.create_all(conn)
+
+        partitions.load(conn)
+        dates = conn.execute(text("SELECT DISTINCT trade_date FROM trading_results_old")).scalars()
+        names = partitions.create(conn, partitions.missing(dates))
+        rows = conn.execute(text(
+            f"INSERT INTO trading_results ({COLUMNS}) SELECT {COLUMNS} FROM trading_results_old"
+        )).rowcount
+        conn.execute(text(
+            "SELECT setval(pg_get_serial_sequence('trading_results', 'id'), "
+            "coalesce((SELECT max(id) FROM trading_results), 0) + 1, false)"
+        ))
+        conn.execute(text("DROP TABLE trading_results_old"))
+        conn.execute(text("ANALYZE trading_results"))
+    partitions.created(names)
+    print(f"Перенесено {rows} строк в {len(names)} секций "
+          f"за {time.perf_counter() - start:.2f} сек")
+    engine.dispose()
+
+
+if __name__ == "__main__":
+    # TRADING_RESULTS_PARTITION=month python partition_table.py [имя БД, по умолчанию DB_NAME]
+    main(sys.argv[1] if len(sys.argv) > 1 else DB_NAME)
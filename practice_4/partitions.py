@@ -0,0 +1,111 @@
+from datetime import date
+from typing import Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import text
+
+# Секционирование trading_results по trade_date: по месяцу или по году
+PARTITION_PERIODS = ('month', 'year')
+PARENT_TABLE = 'trading_results'
+
+IS_PARTITIONED_SQL = text(
+    "SELECT relkind = 'p' FROM pg_class WHERE oid = to_regclass(:table)"
+)
+PARTITIONS_SQL = text(
+    "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+    "WHERE i.inhparent = to_regclass(:table)"
+)
+# Несколько загрузчиков могут одновременно дойти до нового месяца
+PARTITION_LOCK_SQL = text("SELECT pg_advisory_xact_lock(hashtext(:name))")
+
+
+def partition_bounds(trade_date: date, period: str) -> Tuple[date, date]:
+    """Границы секции [from, to), в которую попадает дата"""
+    if period == 'month':
+        start = trade_date.replace(day=1)
+        end = date(start.year + start.month // 12, start.month % 12 + 1, 1)
+    elif period == 'year':
+        start = date(trade_date.year, 1, 1)
+        end = date(trade_date.year + 1, 1, 1)
+    else:
+        raise ValueError(f"Неизвестный период секционирования: {period}")
+    return start, end
+
+
+def partition_name(trade_date: date, period: str, table: str = PARENT_TABLE) -> str:
+    start, _ = partition_bounds(trade_date, period)
+    if period == 'month':
+        return f"{table}_{start.year}_{start.month:02d}"
+    return f"{table}_{start.year}"
+
+
+def create_partition_sql(trade_date: date, period: str, table: str = PARENT_TABLE) -> str:
+    start, end = partition_bounds(trade_date, period)
+    return (
+        f"CREATE TABLE IF NOT EXISTS {partition_name(trade_date, period, table)} "
+        f"PARTITION OF {table} FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+    )
+
+
+class PartitionManager:
+    """
+    Создание секций trading_results перед записью дат, для которых секции еще нет.
+
+    Секции создаются в отдельной короткой транзакции: CREATE TABLE ... PARTITION OF
+    берет эксклюзивную блокировку родительской таблицы и не должен держать ее всю загрузку.
+    Известные секции запоминаются, так что обычно запрос в БД не нужен.
+    """
+
+    def __init__(self, period: Optional[str], table: str = PARENT_TABLE):
+        if period and period not in PARTITION_PERIODS:
+            raise ValueError(f"Неизвестный период секционирования: {period}")
+        self.period = period
+        self.table = table
+        self.enabled = False
+        self.known: Set[str] = set()
+
+    def load(self, connection):
+        """Проверка, секционирована ли таблица в БД, и список ее секций (синхронное соединение)"""
+        self.enabled = bool(connection.execute(IS_PARTITIONED_SQL, {'table': self.table}).scalar())
+        if not self.enabled:
+            return
+        # Таблица уже секционирована, а период не задан - по умолчанию помесячно
+        self.period = self.period or 'month'
+        self.known = set(connection.execute(PARTITIONS_SQL, {'table': self.table}).scalars())
+
+    def missing(self, dates: Iterable[date]) -> List[date]:
+        """По одной дате на каждую секцию, которой еще нет"""
+        if not self.enabled:
+            return []
+        missing = {}
+        for trade_date in dates:
+            name = partition_name(trade_date, self.period, self.table)
+            if name not in self.known:
+                missing.setdefault(name, trade_date)
+        return sorted(missing.values())
+
+    def create(self, connection, dates: List[date]) -> List[str]:
+        """Создание секций в текущей транзакции; known пополняет вызывающий после коммита"""
+        connection.execute(PARTITION_LOCK_SQL, {'name': f"{self.table}_partitions"})
+        names = []
+        for trade_date in dates:
+            connection.execute(text(create_partition_sql(trade_date, self.period, self.table)))
+            names.append(partition_name(trade_date, self.period, self.table))
+        return names
+
+    def created(self, names: List[str]):
+        self.known.update(names)
+        print(f"Созданы секции {self.table}: {names}")
+
+    async def ensure(self, engine, dates: Iterable[date]):
+        missing = self.missing(dates)
+        if missing:
+            async with engine.begin() as conn:
+                names = await conn.run_sync(self.create, missing)
+            self.created(names)
+
+    def ensure_sync(self, engine, dates: Iterable[date]):
+        missing = self.missing(dates)
+        if missing:
+            with engine.begin() as conn:
+                names = self.create(conn, missing)
+            self.created(names)
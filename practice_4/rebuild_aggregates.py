@@ -0,0 +1,29 @@
+import sys
+import time
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from config import DB_HOST, DB_NAME, DB_PASS, DB_PORT, DB_USER
+from db_writer import build_aggregate_refresh, build_trading_dates_refresh
+from models import Base
+
+
+def main(db_name: str):
+    """Полный пересчет trading_daily_aggregates и trading_dates по уже загруженным данным"""
+    engine = create_engine(f"postgresql://{DB_USER}:{DB_PASS}@{DB_HOST}:{DB_PORT}/{db_name}")
+    Base.metadata.create_all(engine)
+
+    start = time.perf_counter()
+    with sessionmaker(engine)() as session:
+        rows = session.execute(build_aggregate_refresh()).rowcount
+        dates = session.execute(build_trading_dates_refresh()).rowcount
+        session.commit()
+    print(f"Пересчитано {rows} строк агрегатов, добавлено {dates} дат торгов "
+          f"за {time.perf_counter() - start:.2f} сек")
+    engine.dispose()
+
+
+if __name__ == "__main__":
+    # python rebuild_aggregates.py [имя БД, по умолчанию DB_NAME]
+    main(sys.argv[1] if len(sys.argv) > 1 else DB_NAME)
@@ -1,48 +1,62 @@
 from config import *
+from bulletin_reader import parse_trade_summary
+from models import Base, TradingResult
+from listing import HTTP_HEADERS, LISTING_BACKENDS, extract_bulletin_links, listing_url
+from bulletin_cache import BulletinCache
+from events import publish_ingest_complete_sync
+from partitions import PartitionManager
+from db_writer import (
+    COPY_BATCH_ROWS, copy_dataframes_sync, empty_stats, frame_dates,
+    refresh_derived_tables_sync, upsert_dataframe_sync
+)
 
 # Конфигурация
 BASE_URL = BASE_URL
 DB_URL = f"postgresql://{DB_USER}:{DB_PASS}@{DB_HOST}:{DB_PORT}/{DB_NAME2}"
-DOWNLOAD_DIR = "bulletins"
 START_DATE = date(2025, 1, 1)
 
-# Инициализация SQLAlchemy
-Base = declarative_base()
-
-
-class TradingResult(Base):
-    __tablename__ = 'trading_results'
-
-    id = Column(Integer, primary_key=True)
-    exchange_product_id = Column(String(20), nullable=False)
-    exchange_product_name = Column(String(255), nullable=False)
-    oil_id = Column(String(10), nullable=False)
-    delivery_basis_id = Column(String(10), nullable=False)
-    delivery_basis_name = Column(String(255), nullable=False)
-    delivery_type_id = Column(String(10), nullable=False)
-    volume = Column(Numeric(20, 2))
-    total = Column(Numeric(20, 2))
-    count = Column(Integer, nullable=False)
-    trade_date = Column(Date, nullable=False)
-    created_at = Column(DateTime, server_default='now()')
-    updated_at = Column(DateTime, server_default='now()', onupdate='now()')
-
-    __table_args__ = (
-        UniqueConstraint('exchange_product_id', 'trade_date', name='unique_trade_record'),
-    )
-
 
 class BulletinParser:
-    def __init__(self):
+    def __init__(self, on_conflict: str = 'nothing', backfill: bool = False,
+                 links_backend: str = LINKS_BACKEND, incremental: bool = INCREMENTAL,
+                 use_cache: bool = CACHE_ENABLED):
         self.base_url = "https://spimex.com"
         self.trade_section_url = "/markets/oil_products/trades/results/"
         self.start_date = date(2025, 1, 1)
         self.driver = None
         self.engine = None
         self.Session = None
-
-        # Настройка драйвера и БД
-        self.setup_driver()
+        self.partitions = PartitionManager(TRADING_RESULTS_PARTITION)
+        self.on_conflict = on_conflict  # 'nothing' или 'update' для существующих записей
+        self.ingest_stats = empty_stats()
+        self.ingested_dates = set()  # даты, по которым что-то добавлено или обновлено
+        # Бэкфилл: бюллетени копятся в памяти и уходят в БД через COPY пачками
+        self.backfill = backfill
+        self._copy_buffer: List[pd.DataFrame] = []
+        self._copy_buffer_rows = 0
+        self._copy_buffer_hashes: List[tuple] = []
+        # Кэш скачанных файлов: условные запросы и пропуск уже разобранных бюллетеней
+        self.cache = BulletinCache(
+            CACHE_DIR, CACHE_MAX_MB * 1024 * 1024, CACHE_MAX_AGE_DAYS,
+            target=f"{DB_HOST}:{DB_PORT}/{DB_NAME2}", parsed_max_age_days=CACHE_PARSED_MAX_AGE_DAYS
+        ) if use_cache else None
+        if links_backend not in LISTING_BACKENDS:
+            raise ValueError(f"Неизвестный способ поиска бюллетеней: {links_backend}")
+        self.links_backend = links_backend
+        self._driver_lock = threading.Lock()
+        self.incremental = incremental
+        # Одна сессия с пулом keep-alive соединений и для списка, и для файлов
+        self.http_session = requests.Session()
+        self.http_session.headers.update(HTTP_HEADERS)
+        adapter = HTTPAdapter(pool_connections=HTTP_POOL_SIZE, pool_maxsize=HTTP_POOL_SIZE)
+        self.http_session.mount('https://', adapter)
+        self.http_session.mount('http://', adapter)
+        # Файлы в кэш пишет фоновый поток, пока основной разбирает бюллетень
+        self.cache_writer = ThreadPoolExecutor(max_workers=1) if self.cache else None
+
+        # Настройка драйвера и БД; браузер нужен только Selenium-способу
+        if self.links_backend == 'selenium':
+            self.setup_driver()
         self.setup_database()
 
     def setup_driver(self):
@@ -59,46 +73,75 @@ class BulletinParser:
 
         # Создаем таблицы, если они не существуют
         Base.metadata.create_all(self.engine)
+        with self.engine.connect() as conn:
+            self.partitions.load(conn)
 
-    def get_bulletin_links(self, page_num: int) -> List[dict]:
-        try:
-            url = f"{self.base_url}{self.trade_section_url}?page=page-{page_num}"
-            print(f"Переход на страницу {page_num}: {url}")
-
-            self.driver.get(url)
-            WebDriverWait(self.driver, 20).until(
-                EC.presence_of_element_located((By.CSS_SELECTOR, "a[href*='trades/results']"))
-            )
+        if self.incremental:
+            self.apply_incremental_start(self.get_latest_trade_date())
 
-            # Даем время для загрузки контента
-            time.sleep(2)
+    def get_latest_trade_date(self) -> Optional[date]:
+        session = self.Session()
+        try:
+            return session.execute(select(func.max(TradingResult.trade_date))).scalar()
+        finally:
+            session.close()
 
-            soup = BeautifulSoup(self.driver.page_source, 'html.parser')
+    def has_trade_date(self, trade_date: date) -> bool:
+        """Есть ли записи за дату: после очистки или восстановления таблицы отметки кэша устаревают"""
+        session = self.Session()
+        try:
+            return session.execute(select(exists().where(TradingResult.trade_date == trade_date))).scalar()
+        finally:
+            session.close()
 
-            # Ищем все ссылки на бюллетени (xls файлы)
-            bulletins = []
-            for item in soup.find_all(string=re.compile(r'Бюллетень по итогам торгов в Секции «Нефтепродукты»')):
-                if not item.strip():
-                    continue
+    def apply_incremental_start(self, latest_date: Optional[date]):
+        """Поиск бюллетеней остановится на последней дате, уже загруженной в БД"""
+        if latest_date is None:
+            print("В БД еще нет данных, загружаем все бюллетени")
+            return
+        self.start_date = max(self.start_date, latest_date + timedelta(days=1))
+        print(f"Последняя дата в БД: {latest_date}, загружаем бюллетени с {self.start_date}")
 
-                # Находим родительский элемент со ссылкой
-                parent = item.find_parent()
-                link = parent.get("href") if parent else None
+    def get_bulletin_links(self, page_num: int) -> List[dict]:
+        url = listing_url(self.base_url, self.trade_section_url, page_num)
+        if self.links_backend == 'http':
+            try:
+                print(f"Загрузка страницы {page_num}: {url}")
+                response = self.http_session.get(url, timeout=30)
+                response.raise_for_status()
+
+                bulletins = extract_bulletin_links(response.text, self.base_url)
+                # Пустая первая страница - значит список строится скриптом, нужен браузер
+                if bulletins or page_num > 1:
+                    return bulletins
+                print("Бюллетени не найдены в HTML, переключаемся на Selenium")
+                self.links_backend = 'selenium'
+
+            except Exception as e:
+                print(f"Ошибка при загрузке страницы {page_num}, пробуем Selenium: {str(e)}")
+
+        return self.get_bulletin_links_selenium(page_num)
+
+    def get_bulletin_links_selenium(self, page_num: int) -> List[dict]:
+        try:
+            url = listing_url(self.base_url, self.trade_section_url, page_num)
 
-                date_match = re.search(r'(\d{8})', link)
-                if not date_match:
-                    continue
+            # Драйвер один, страницы через него открываем по очереди
+            with self._driver_lock:
+                if self.driver is None:
+                    self.setup_driver()
 
-                trade_date = datetime.strptime(date_match.group(1), '%Y%m%d').date()
+                print(f"Переход на страницу {page_num}: {url}")
+                self.driver.get(url)
+                WebDriverWait(self.driver, 20).until(
+                    EC.presence_of_element_located((By.CSS_SELECTOR, "a[href*='trades/results']"))
+                )
 
-                if link:
-                    bulletins.append({
-                        'url': urljoin(BASE_URL, link),
-                        'date': datetime.strptime(trade_date.strftime('%d%m%Y'), '%d%m%Y').date(),
-                        'filename': f"oil_products_{trade_date}.xls"
-                    })
+                # Даем время для загрузки контента
+                time.sleep(2)
+                html = self.driver.page_source
 
-            return bulletins
+            return extract_bulletin_links(html, self.base_url)
 
         except Exception as e:
             print(f"Ошибка при получении списка бюллетеней: {str(e)}")
@@ -107,201 +150,142 @@ class BulletinParser:
     def get_all_bulletin_links(self) -> List[dict]:
         all_bulletins = []
         current_page = 1
-        last_date = date.today()
-
-        while last_date >= self.start_date:
-            page_bulletins = self.get_bulletin_links(current_page)
-            if not page_bulletins:
-                break
-
-            all_bulletins.extend(page_bulletins)
-            last_date = page_bulletins[-1]['date']
+        finished = False
+
+        with ThreadPoolExecutor(max_workers=LISTING_CONCURRENCY) as pool:
+            while not finished:
+                # По HTTP страницы списка загружаются пачками параллельно, браузер - по одной.
+                # Первая страница всегда отдельно: по ней решается, нужен ли откат на Selenium
+                parallel = self.links_backend == 'http' and current_page > 1
+                window = LISTING_CONCURRENCY if parallel else 1
+                pages = list(range(current_page, current_page + window))
+                results = list(pool.map(self.get_bulletin_links, pages))
+
+                for page_num, page_bulletins in zip(pages, results):
+                    if not page_bulletins:
+                        finished = True
+                        break
 
-            print(f"Страница {current_page}, последняя дата: {last_date}")
+                    all_bulletins.extend(page_bulletins)
+                    last_date = page_bulletins[-1]['date']
+                    print(f"Страница {page_num}, последняя дата: {last_date}")
 
-            # Проверяем, не вышли ли мы за пределы 2025 года
-            if last_date < self.start_date:
-                break
+                    # Дальше только даты раньше начальной (или уже загруженные в инкрементальном режиме)
+                    if last_date < self.start_date:
+                        finished = True
+                        break
 
-            current_page += 1
+                current_page += window
 
         # Фильтруем только бюллетени начиная с 2025 года
         filtered_bulletins = [b for b in all_bulletins if b['date'] >= self.start_date]
         print(f"Найдено {len(filtered_bulletins)} бюллетеней с {self.start_date}")
         return filtered_bulletins
 
-    def download_bulletin(self, bulletin_info: dict) -> Optional[str]:
+    def download_bulletin(self, bulletin_info: dict) -> Optional[bytes]:
+        url = bulletin_info['url']
         try:
-            # Используем requests для скачивания файла
-
-            session = requests.Session()
-            session.headers.update({'User-Agent': 'Mozilla/5.0'})
-
-            response = session.get(bulletin_info['url'], stream=True)
-            response.raise_for_status()
-
-            # Сохраняем файл
-            filename = f"oil_products_{bulletin_info['date'].strftime('%Y%m%d')}.xls"
-            with open(filename, 'wb') as f:
-                for chunk in response.iter_content(1024):
-                    f.write(chunk)
-
-            return filename
+            headers = self.cache.conditional_headers(url) if self.cache else {}
+            with self.http_session.get(url, headers=headers, stream=True, timeout=60) as response:
+                # Файл не изменился с прошлой загрузки - берем его из кэша
+                if response.status_code == 304 and self.cache:
+                    bulletin_info['sha256'] = self.cache.url_hash(url)
+                    return self.cache.hit(url)
+
+                response.raise_for_status()
+
+                # Читаем файл в память крупными блоками, попутно считая хэш содержимого
+                buffer = io.BytesIO()
+                digest = hashlib.sha256()
+                for chunk in response.iter_content(DOWNLOAD_CHUNK_SIZE):
+                    buffer.write(chunk)
+                    digest.update(chunk)
+
+                data = buffer.getvalue()
+                bulletin_info['sha256'] = digest.hexdigest()
+                if self.cache_writer:
+                    self.cache_writer.submit(
+                        self.cache.store, url, data, bulletin_info['sha256'],
+                        response.headers.get('ETag'), response.headers.get('Last-Modified')
+                    )
+                return data
 
         except Exception as e:
             print(f"Ошибка при скачивании бюллетеня за {bulletin_info['date']}: {str(e)}")
             return None
 
-    def parse_bulletin(self, filepath: str, trade_date: date) -> Optional[pd.DataFrame]:
+    def parse_bulletin(self, data: bytes, trade_date: date) -> Optional[pd.DataFrame]:
         try:
-            # Читаем Excel файл
-            xls = pd.ExcelFile(filepath)
-
-            # Проверяем наличие листа TRADE_SUMMARY
-            if 'TRADE_SUMMARY' not in xls.sheet_names:
-                print(f"Лист TRADE_SUMMARY не найден в файле {filepath}")
-                return None
-
-            # Читаем весь лист для поиска даты и данных
-            df_raw = pd.read_excel(filepath, sheet_name='TRADE_SUMMARY', header=None)
-
-            # Ищем дату торгов
-            trade_date = None
-            for i, row in df_raw.iterrows():
-                if "Дата торгов:" in str(row.values):
-                    date_match = re.search(r'\d{2}\.\d{2}\.\d{4}', str(row.values))
-                    if date_match:
-                        trade_date = datetime.strptime(date_match.group(), '%d.%m.%Y').date()
-                    break
-
-            if not trade_date:
-                print(f"Не удалось определить дату торгов в файле {filepath}")
-                return None
-
-            start_row = None
-            metric_ton_found = False
-            for i, row in df_raw.iterrows():
-                row_str = str(row.values)
-
-                if "Единица измерения: Метрическая тонна" in row_str:
-                    metric_ton_found = True
-                    continue
-
-                if metric_ton_found and "Цена (за единицу измерения), руб." in row_str:
-                    start_row = i
-                    break
-
-            if start_row is None:
-                print(f"Не найдена таблица с метрическими тоннами в файле {filepath}")
-                return None
-
-            # Читаем таблицу с данными
-            df = pd.read_excel(
-                filepath,
-                sheet_name='TRADE_SUMMARY',
-                header=start_row,
-                skipfooter=2  # Пропускаем итоговые строки
-            )
-            # Очищаем заголовки от лишних пробелов и символов
-            df.columns = [str(col).strip().replace('\n', ' ') for col in df.columns]
-
-            # Сопоставляем столбцы с нужными нам полями
-            column_mapping = {
-                'Код Инструмента': 'exchange_product_id',
-                'Наименование Инструмента': 'exchange_product_name',
-                'Базис поставки': 'delivery_basis_name',
-                'Объем Договоров в единицах измерения': 'volume',
-                'Объем Договоров, руб.': 'total',
-                'Обьем Договоров, руб.': 'total',
-                'Количество Договоров, шт.': 'count'
-            }
-
-            # Переименовываем столбцы по шаблону
-            renamed_columns = {}
-            for col in df.columns:
-                for pattern, new_name in column_mapping.items():
-                    if pattern in col:
-                        renamed_columns[col] = new_name
-                        break
-
-            # Проверяем, что нашли все нужные столбцы
-            if len(renamed_columns) + 1 < len(column_mapping):
-                missing = set(column_mapping.values()) - set(renamed_columns.values())
-                print(f"В файле {filepath} отсутствуют столбцы: {missing}")
-                return None
-
-            df = df.rename(columns=renamed_columns)
-
-            # Преобразуем числовые колонки и заменяем прочерки на NaN
-            numeric_cols = ['volume', 'total', 'count']
-            for col in numeric_cols:
-                if col in df.columns:
-                    # Заменяем прочерки и пустые строки на NaN
-                    df[col] = df[col].replace(['-', ''], pd.NA)
-                    df[col] = pd.to_numeric(df[col], errors='coerce')
-
-            # Фильтруем строки с count > 0 (не пустые и не нулевые)
-            if 'count' not in df.columns:
-                print(f"В файле {filepath} отсутствует столбец count")
-                return None
-
-            df = df[df['count'].notna() & (df['count'] > 0)].copy()
-
-            # Добавляем дополнительные поля
-            a = df.iloc[:, 1]
-            df['oil_id'] = a.str[:4]
-            df['delivery_basis_id'] = a.str[4:7]
-            df['delivery_type_id'] = a.str[-1]
-            df['trade_date'] = trade_date
-
-            # Выбираем только нужные колонки
-            result_cols = [
-                'exchange_product_id', 'exchange_product_name', 'oil_id',
-                'delivery_basis_id', 'delivery_basis_name', 'delivery_type_id',
-                'volume', 'total', 'count', 'trade_date'
-            ]
-
-            # Проверяем наличие всех колонок
-            available_cols = [col for col in result_cols if col in df.columns]
-            if len(available_cols) != len(result_cols):
-                missing = set(result_cols) - set(df.columns)
-                print(f"В данных отсутствуют колонки: {missing}")
-                return None
-
-            df = df[df['delivery_basis_name'].notna()]
-
-            return df[result_cols]
+            # Лист читается из памяти один раз, таблица вырезается из него там же
+            return parse_trade_summary(data)
 
         except Exception as e:
-            print(f"Ошибка при парсинге файла {filepath}: {str(e)}")
+            print(f"Ошибка при парсинге бюллетеня за {trade_date}: {str(e)}")
             return None
 
-    def save_to_db(self, df: pd.DataFrame):
+    def save_to_db(self, df: pd.DataFrame, sha256: Optional[str] = None):
         if df is None or df.empty:
             return
 
+        if self.backfill:
+            self._copy_buffer.append(df)
+            self._copy_buffer_rows += len(df)
+            self._copy_buffer_hashes.append((sha256, len(df)))
+            if self._copy_buffer_rows >= COPY_BATCH_ROWS:
+                self.flush_copy_buffer()
+            return
+
         session = self.Session()
         try:
-            records = df.to_dict('records')
-            for record in records:
-                # Проверяем существование записи
-                exists = session.query(TradingResult).filter(
-                    TradingResult.exchange_product_id == record['exchange_product_id'],
-                    TradingResult.trade_date == record['trade_date']
-                ).first()
+            self.partitions.ensure_sync(self.engine, frame_dates([df]))
+            # Один INSERT ... ON CONFLICT на пачку вместо SELECT на каждую запись
+            stats = upsert_dataframe_sync(session, df, self.on_conflict)
+            refresh_derived_tables_sync(session, frame_dates([df]))
+            session.commit()
+            self.add_ingest_stats(stats, frame_dates([df]))
+            if self.cache:
+                self.cache.mark_parsed(sha256, len(df))
+            print(f"За {df['trade_date'].iloc[0]}: добавлено {stats['inserted']}, "
+                  f"обновлено {stats['updated']}, пропущено {stats['skipped']} записей")
 
-                if not exists:
-                    session.add(TradingResult(**record))
+        except Exception as e:
+            session.rollback()
+            print(f"Ошибка при сохранении в базу данных: {str(e)}")
+        finally:
+            session.close()
+
+    def flush_copy_buffer(self):
+        """Запись накопленных бюллетеней через COPY и одно слияние в trading_results"""
+        if not self._copy_buffer:
+            return
 
+        frames, self._copy_buffer, self._copy_buffer_rows = self._copy_buffer, [], 0
+        hashes, self._copy_buffer_hashes = self._copy_buffer_hashes, []
+        session = self.Session()
+        try:
+            self.partitions.ensure_sync(self.engine, frame_dates(frames))
+            stats = copy_dataframes_sync(session, frames, self.on_conflict)
+            refresh_derived_tables_sync(session, frame_dates(frames))
             session.commit()
-            print(f"Добавлено {len(records)} записей за {records[0]['trade_date']}")
+            self.add_ingest_stats(stats, frame_dates(frames))
+            if self.cache:
+                for sha256, rows in hashes:
+                    self.cache.mark_parsed(sha256, rows)
+            print(f"COPY {len(frames)} бюллетеней: добавлено {stats['inserted']}, "
+                  f"обновлено {stats['updated']}, пропущено {stats['skipped']} записей")
 
         except Exception as e:
             session.rollback()
-            print(f"Ошибка при сохранении в базу данных: {str(e)}")
+            print(f"Ошибка при копировании в базу данных: {str(e)}")
         finally:
             session.close()
 
+    def add_ingest_stats(self, stats: Dict[str, int], dates: List[date]):
+        for key, value in stats.items():
+            self.ingest_stats[key] += value
+        if stats['inserted'] or stats['updated']:
+            self.ingested_dates.update(dates)
+
     def process_all_bulletins(self):
         current_page = 1
         processed_count = 0
@@ -323,29 +307,47 @@ class BulletinParser:
                     stop_processing = True
                     break
 
-                filepath = self.download_bulletin(bulletin)
-                if not filepath:
+                data = self.download_bulletin(bulletin)
+                if not data:
                     continue
 
-                df = self.parse_bulletin(filepath, bulletin['date'])
+                # Файл с таким содержимым уже разобран и записан в эту БД, и записи за дату на месте - пропускаем
+                if self.cache and self.cache.is_parsed(bulletin.get('sha256')) and self.has_trade_date(bulletin['date']):
+                    print(f"Бюллетень за {bulletin['date']} не изменился, пропускаем")
+                    continue
+
+                df = self.parse_bulletin(data, bulletin['date'])
                 if df is not None and not df.empty:
-                    self.save_to_db(df)
+                    self.save_to_db(df, bulletin.get('sha256'))
                     processed_count += len(df)
 
-                # Удаляем временный файл
-                if os.path.exists(filepath):
-                    os.remove(filepath)
-
                 time.sleep(1)
 
             current_page += 1
 
+            # Все новые бюллетени уже обработаны, повторный проход по списку не нужен
+            if self.incremental:
+                break
+
             if bulletins[-1]['date'] <= date(2025, 1, 9):
                 print("Достигнута последняя таблица (15.01.2025) - завершение обработки")
                 break
 
-        self.driver.quit()
+        # Дописываем остаток пачки бэкфилла
+        self.flush_copy_buffer()
+        publish_ingest_complete_sync(REDIS_URL, self.ingested_dates)
+
+        if self.cache:
+            # Дожидаемся записи файлов в кэш перед вытеснением
+            self.cache_writer.shutdown(wait=True)
+            self.cache.evict()
+
+        if self.driver:
+            self.driver.quit()
+        self.http_session.close()
         print(f"Обработка завершена. Всего обработано {processed_count} записей")
+        print(f"Добавлено {self.ingest_stats['inserted']}, обновлено {self.ingest_stats['updated']}, "
+              f"пропущено {self.ingest_stats['skipped']} записей")
 
     def run(self):
         self.process_all_bulletins()
@@ -354,7 +356,10 @@ class BulletinParser:
 
 if __name__ == "__main__":
     current_time = time.time()
-    parser = BulletinParser()
+    parser = BulletinParser(
+        backfill='--backfill' in sys.argv,
+        incremental=INCREMENTAL or '--incremental' in sys.argv
+    )
     parser.run()
     current_time = time.time() - current_time
     print(current_time)
@@ -1,39 +1,27 @@
 from config import *
+from bulletin_reader import columns_to_dataframe, parse_trade_summary_columns
+from models import Base, TradingResult
+from listing import HTTP_HEADERS, LISTING_BACKENDS, extract_bulletin_links, listing_url
+from bulletin_cache import BulletinCache
+from events import publish_ingest_complete
+from partitions import PartitionManager
+from db_writer import (
+    COPY_BATCH_ROWS, copy_dataframes, empty_stats, frame_dates,
+    refresh_derived_tables, upsert_dataframe
+)
 
 # Конфигурация
 BASE_URL = BASE_URL
 DB_URL = f"postgresql+asyncpg://{DB_USER}:{DB_PASS}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
-DOWNLOAD_DIR = "bulletins"
 START_DATE = date(2025, 1, 1)
 
-# Инициализация SQLAlchemy
-Base = declarative_base()
-
-
-class TradingResult(Base):
-    __tablename__ = 'trading_results'
-
-    id = Column(Integer, primary_key=True)
-    exchange_product_id = Column(String(20), nullable=False)
-    exchange_product_name = Column(String(255), nullable=False)
-    oil_id = Column(String(10), nullable=False)
-    delivery_basis_id = Column(String(10), nullable=False)
-    delivery_basis_name = Column(String(255), nullable=False)
-    delivery_type_id = Column(String(10), nullable=False)
-    volume = Column(Numeric(20, 2))
-    total = Column(Numeric(20, 2))
-    count = Column(Integer, nullable=False)
-    trade_date = Column(Date, nullable=False)
-    created_at = Column(DateTime, server_default='now()')
-    updated_at = Column(DateTime, server_default='now()', onupdate='now()')
-
-    __table_args__ = (
-        UniqueConstraint('exchange_product_id', 'trade_date', name='unique_trade_record'),
-    )
-
 
 class AsyncBulletinParser:
-    def __init__(self):
+    def __init__(self, on_conflict: str = 'nothing', backfill: bool = False,
+                 download_workers: int = DOWNLOAD_WORKERS, parse_workers: int = PARSE_WORKERS,
+                 save_workers: int = SAVE_WORKERS, queue_size: int = QUEUE_SIZE,
+                 links_backend: str = LINKS_BACKEND, incremental: bool = INCREMENTAL,
+                 use_cache: bool = CACHE_ENABLED):
         self.base_url = "https://spimex.com"
         self.trade_section_url = "/markets/oil_products/trades/results/"
         self.start_date = date(2025, 1, 1)
@@ -41,12 +29,39 @@ class AsyncBulletinParser:
         self._start_time: Optional[float] = None
         self.engine = None
         self.async_session = None
+        self.partitions = PartitionManager(TRADING_RESULTS_PARTITION)
         self.driver = None
         self._shutdown = False
-
-    async def setup(self):
-        """Инициализация ресурсов"""
-        # Настройка драйвера
+        if links_backend not in LISTING_BACKENDS:
+            raise ValueError(f"Неизвестный способ поиска бюллетеней: {links_backend}")
+        self.links_backend = links_backend
+        self._driver_lock = threading.Lock()
+        self.incremental = incremental
+        self.on_conflict = on_conflict  # 'nothing' или 'update' для существующих записей
+        self.ingest_stats = empty_stats()
+        self.ingested_dates = set()  # даты, по которым что-то добавлено или обновлено
+        # Бэкфилл: бюллетени копятся в памяти и уходят в БД через COPY пачками
+        self.backfill = backfill
+        self._copy_buffer: List[pd.DataFrame] = []
+        self._copy_buffer_rows = 0
+        self._copy_buffer_hashes: List[tuple] = []
+        # Кэш скачанных файлов: условные запросы и пропуск уже разобранных бюллетеней
+        self.cache = BulletinCache(
+            CACHE_DIR, CACHE_MAX_MB * 1024 * 1024, CACHE_MAX_AGE_DAYS,
+            target=f"{DB_HOST}:{DB_PORT}/{DB_NAME}", parsed_max_age_days=CACHE_PARSED_MAX_AGE_DAYS
+        ) if use_cache else None
+        # Разбор Excel идет в пуле процессов, чтобы не блокировать цикл событий
+        self.executor: Optional[ProcessPoolExecutor] = None
+        # Конвейер: число обработчиков на каждом этапе и ограничение очередей между ними
+        self.stage_workers = {'download': download_workers, 'parse': parse_workers, 'save': save_workers}
+        self.queue_size = queue_size
+        self.queues: Dict[str, asyncio.Queue] = {}
+        self.queue_peaks = {'download': 0, 'parse': 0, 'save': 0}
+        self.stage_timings = {'download': 0.0, 'parse': 0.0, 'save': 0.0}
+        self.stage_counts = {'download': 0, 'parse': 0, 'save': 0}
+
+    def setup_driver(self):
+        """Запуск браузера - только для Selenium-способа поиска бюллетеней"""
         options = webdriver.ChromeOptions()
         options.add_argument('--headless')
         options.add_argument('--no-sandbox')
@@ -54,6 +69,17 @@ class AsyncBulletinParser:
         self.driver = webdriver.Chrome(options=options)
         self.driver.implicitly_wait(10)
 
+    async def setup(self):
+        """Инициализация ресурсов"""
+        # Браузер нужен только Selenium-способу, для HTTP он запустится лишь при откате
+        if self.links_backend == 'selenium':
+            await asyncio.to_thread(self.setup_driver)
+
+        # spawn: дочерние процессы не наследуют цикл событий и драйвер браузера
+        self.executor = ProcessPoolExecutor(
+            max_workers=self.stage_workers['parse'], mp_context=multiprocessing.get_context('spawn')
+        )
+
         # Настройка БД
         self.engine = create_async_engine(DB_URL)
         self.async_session = sessionmaker(
@@ -61,54 +87,88 @@ class AsyncBulletinParser:
         )
         async with self.engine.begin() as conn:
             await conn.run_sync(Base.metadata.create_all)
+            await conn.run_sync(self.partitions.load)
+
+        if self.incremental:
+            self.apply_incremental_start(await self.get_latest_trade_date())
+
+    async def get_latest_trade_date(self) -> Optional[date]:
+        async with self.async_session() as session:
+            result = await session.execute(select(func.max(TradingResult.trade_date)))
+            return result.scalar()
+
+    async def has_trade_date(self, trade_date: date) -> bool:
+        """Есть ли записи за дату: после очистки или восстановления таблицы отметки кэша устаревают"""
+        async with self.async_session() as session:
+            return await session.scalar(select(exists().where(TradingResult.trade_date == trade_date)))
+
+    def apply_incremental_start(self, latest_date: Optional[date]):
+        """Поиск бюллетеней остановится на последней дате, уже загруженной в БД"""
+        if latest_date is None:
+            print("В БД еще нет данных, загружаем все бюллетени")
+            return
+        self.start_date = max(self.start_date, latest_date + timedelta(days=1))
+        print(f"Последняя дата в БД: {latest_date}, загружаем бюллетени с {self.start_date}")
+
+    def request_shutdown(self):
+        """Мягкая остановка: этапы перестают брать новую работу и дочищают очереди"""
+        if not self._shutdown:
+            print("Получен сигнал остановки, завершаем обработку")
+        self._shutdown = True
 
     async def shutdown(self):
         """Корректное закрытие ресурсов"""
         self._shutdown = True
         if self.driver:
             self.driver.quit()
+            self.driver = None
+        if self.executor:
+            self.executor.shutdown(cancel_futures=True)
+            self.executor = None
         if self.engine:
             await self.engine.dispose()
 
-    async def get_bulletin_links(self, page_num: int) -> List[dict]:
-        try:
-            url = f"{self.base_url}{self.trade_section_url}?page=page-{page_num}"
-            print(f"Переход на страницу {page_num}: {url}")
-
-            self.driver.get(url)
-            WebDriverWait(self.driver, 20).until(
-                EC.presence_of_element_located((By.CSS_SELECTOR, "a[href*='trades/results']"))
-            )
-
-            # Даем время для загрузки контента
-            await asyncio.sleep(2)
+    async def get_bulletin_links(self, session: aiohttp.ClientSession, page_num: int) -> List[dict]:
+        url = listing_url(self.base_url, self.trade_section_url, page_num)
+        if self.links_backend == 'http':
+            try:
+                print(f"Загрузка страницы {page_num}: {url}")
+                async with session.get(url) as response:
+                    response.raise_for_status()
+                    html = await response.text()
+
+                bulletins = extract_bulletin_links(html, self.base_url)
+                # Пустая первая страница - значит список строится скриптом, нужен браузер
+                if bulletins or page_num > 1:
+                    return bulletins
+                print("Бюллетени не найдены в HTML, переключаемся на Selenium")
+                self.links_backend = 'selenium'
 
-            soup = BeautifulSoup(self.driver.page_source, 'html.parser')
+            except Exception as e:
+                print(f"Ошибка при загрузке страницы {page_num}, пробуем Selenium: {str(e)}")
 
-            # Ищем все ссылки на бюллетени (xls файлы)
-            bulletins = []
-            for item in soup.find_all(string=re.compile(r'Бюллетень по итогам торгов в Секции «Нефтепродукты»')):
-                if not item.strip():
-                    continue
+        return await asyncio.to_thread(self.get_bulletin_links_selenium, page_num)
 
-                # Находим родительский элемент со ссылкой
-                parent = item.find_parent()
-                link = parent.get("href") if parent else None
+    def get_bulletin_links_selenium(self, page_num: int) -> List[dict]:
+        try:
+            url = listing_url(self.base_url, self.trade_section_url, page_num)
 
-                date_match = re.search(r'(\d{8})', link)
-                if not date_match:
-                    continue
+            # Драйвер один, страницы через него открываем по очереди
+            with self._driver_lock:
+                if self.driver is None:
+                    self.setup_driver()
 
-                trade_date = datetime.strptime(date_match.group(1), '%Y%m%d').date()
+                print(f"Переход на страницу {page_num}: {url}")
+                self.driver.get(url)
+                WebDriverWait(self.driver, 20).until(
+                    EC.presence_of_element_located((By.CSS_SELECTOR, "a[href*='trades/results']"))
+                )
 
-                if link:
-                    bulletins.append({
-                        'url': urljoin(BASE_URL, link),
-                        'date': trade_date,
-                        'filename': f"oil_products_{trade_date.strftime('%Y%m%d')}.xls"
-                    })
+                # Даем время для загрузки контента
+                time.sleep(2)
+                html = self.driver.page_source
 
-            return bulletins
+            return extract_bulletin_links(html, self.base_url)
 
         except Exception as e:
             print(f"Ошибка при получении списка бюллетеней: {str(e)}")
@@ -117,220 +177,244 @@ class AsyncBulletinParser:
     async def get_all_bulletin_links(self) -> List[dict]:
         all_bulletins = []
         current_page = 1
-        last_date = date.today()
-
-        while last_date >= self.start_date:
-            page_bulletins = await self.get_bulletin_links(current_page)
-            if not page_bulletins:
-                break
-
-            all_bulletins.extend(page_bulletins)
-            last_date = page_bulletins[-1]['date']
+        finished = False
+
+        async with aiohttp.ClientSession(headers=HTTP_HEADERS) as session:
+            while not finished:
+                # По HTTP страницы списка загружаются пачками параллельно, браузер - по одной.
+                # Первая страница всегда отдельно: по ней решается, нужен ли откат на Selenium
+                parallel = self.links_backend == 'http' and current_page > 1
+                window = LISTING_CONCURRENCY if parallel else 1
+                pages = list(range(current_page, current_page + window))
+                results = await asyncio.gather(*(self.get_bulletin_links(session, page) for page in pages))
+
+                for page_num, page_bulletins in zip(pages, results):
+                    if not page_bulletins:
+                        finished = True
+                        break
 
-            print(f"Страница {current_page}, последняя дата: {last_date}")
+                    all_bulletins.extend(page_bulletins)
+                    last_date = page_bulletins[-1]['date']
+                    print(f"Страница {page_num}, последняя дата: {last_date}")
 
-            # Проверяем, не вышли ли мы за пределы 2025 года
-            if last_date < self.start_date:
-                break
+                    # Дальше только даты раньше начальной (или уже загруженные в инкрементальном режиме)
+                    if last_date < self.start_date:
+                        finished = True
+                        break
 
-            current_page += 1
+                current_page += window
 
         # Фильтруем только бюллетени начиная с 2025 года
         filtered_bulletins = [b for b in all_bulletins if b['date'] >= self.start_date]
         print(f"Найдено {len(filtered_bulletins)} бюллетеней с {self.start_date}")
         return filtered_bulletins
 
-    async def download_bulletin(self, session: aiohttp.ClientSession, bulletin_info: dict) -> Optional[str]:
+    async def download_bulletin(self, session: aiohttp.ClientSession, bulletin_info: dict) -> Optional[bytes]:
+        url = bulletin_info['url']
         try:
-            async with session.get(bulletin_info['url']) as response:
-                response.raise_for_status()
-
-                # Создаем директорию для загрузки, если ее нет
-                os.makedirs(DOWNLOAD_DIR, exist_ok=True)
+            headers = self.cache.conditional_headers(url) if self.cache else {}
+            async with session.get(url, headers=headers) as response:
+                # Файл не изменился с прошлой загрузки - берем его из кэша
+                if response.status == 304 and self.cache:
+                    bulletin_info['sha256'] = self.cache.url_hash(url)
+                    return await asyncio.to_thread(self.cache.hit, url)
 
-                # Сохраняем файл
-                filepath = os.path.join(DOWNLOAD_DIR, bulletin_info['filename'])
-                with open(filepath, 'wb') as f:
-                    while True:
-                        chunk = await response.content.read(1024)
-                        if not chunk:
-                            break
-                        f.write(chunk)
+                response.raise_for_status()
 
-                return filepath
+                # Читаем файл в память крупными блоками, попутно считая хэш содержимого
+                buffer = io.BytesIO()
+                digest = hashlib.sha256()
+                async for chunk in response.content.iter_chunked(DOWNLOAD_CHUNK_SIZE):
+                    buffer.write(chunk)
+                    digest.update(chunk)
+
+                data = buffer.getvalue()
+                bulletin_info['sha256'] = digest.hexdigest()
+                if self.cache:
+                    # Запись на диск - в отдельном потоке, цикл событий не ждет файловую систему
+                    await asyncio.to_thread(
+                        self.cache.store, url, data, bulletin_info['sha256'],
+                        response.headers.get('ETag'), response.headers.get('Last-Modified')
+                    )
+                return data
 
         except Exception as e:
             print(f"Ошибка при скачивании бюллетеня за {bulletin_info['date']}: {str(e)}")
             return None
 
-    async def parse_bulletin(self, filepath: str, trade_date: date) -> Optional[pd.DataFrame]:
+    async def parse_bulletin(self, data: bytes, trade_date: date) -> Optional[pd.DataFrame]:
+        loop = asyncio.get_running_loop()
         try:
-            # Читаем Excel файл
-            xls = pd.ExcelFile(filepath)
-
-            # Проверяем наличие листа TRADE_SUMMARY
-            if 'TRADE_SUMMARY' not in xls.sheet_names:
-                print(f"Лист TRADE_SUMMARY не найден в файле {filepath}")
-                return None
-
-            # Читаем весь лист для поиска даты и данных
-            df_raw = pd.read_excel(filepath, sheet_name='TRADE_SUMMARY', header=None)
-
-            # Ищем дату торгов
-            found_trade_date = None
-            for i, row in df_raw.iterrows():
-                if "Дата торгов:" in str(row.values):
-                    date_match = re.search(r'\d{2}\.\d{2}\.\d{4}', str(row.values))
-                    if date_match:
-                        found_trade_date = datetime.strptime(date_match.group(), '%d.%m.%Y').date()
-                    break
-
-            if not found_trade_date:
-                print(f"Не удалось определить дату торгов в файле {filepath}")
-                return None
-
-            start_row = None
-            metric_ton_found = False
-            for i, row in df_raw.iterrows():
-                row_str = str(row.values)
-
-                if "Единица измерения: Метрическая тонна" in row_str:
-                    metric_ton_found = True
-                    continue
-
-                if metric_ton_found and "Цена (за единицу измерения), руб." in row_str:
-                    start_row = i
-                    break
-
-            if start_row is None:
-                print(f"Не найдена таблица с метрическими тоннами в файле {filepath}")
-                return None
-
-            # Читаем таблицу с данными
-            df = pd.read_excel(
-                filepath,
-                sheet_name='TRADE_SUMMARY',
-                header=start_row,
-                skipfooter=2  # Пропускаем итоговые строки
+            # Содержимое файла уходит в процесс разбора целиком, лист читается один раз
+            columns = await loop.run_in_executor(
+                self.executor, parse_trade_summary_columns, data, trade_date
             )
-            # Очищаем заголовки от лишних пробелов и символов
-            df.columns = [str(col).strip().replace('\n', ' ') for col in df.columns]
-
-            # Сопоставляем столбцы с нужными нам полями
-            column_mapping = {
-                'Код Инструмента': 'exchange_product_id',
-                'Наименование Инструмента': 'exchange_product_name',
-                'Базис поставки': 'delivery_basis_name',
-                'Объем Договоров в единицах измерения': 'volume',
-                'Объем Договоров, руб.': 'total',
-                'Обьем Договоров, руб.': 'total',
-                'Количество Договоров, шт.': 'count'
-            }
-
-            # Переименовываем столбцы по шаблону
-            renamed_columns = {}
-            for col in df.columns:
-                for pattern, new_name in column_mapping.items():
-                    if pattern in col:
-                        renamed_columns[col] = new_name
-                        break
-
-            # Проверяем, что нашли все нужные столбцы
-            if len(renamed_columns) + 1 < len(column_mapping):
-                missing = set(column_mapping.values()) - set(renamed_columns.values())
-                print(f"В файле {filepath} отсутствуют столбцы: {missing}")
-                return None
-
-            df = df.rename(columns=renamed_columns)
-
-            # Преобразуем числовые колонки и заменяем прочерки на NaN
-            numeric_cols = ['volume', 'total', 'count']
-            for col in numeric_cols:
-                if col in df.columns:
-                    # Заменяем прочерки и пустые строки на NaN
-                    df[col] = df[col].replace(['-', ''], pd.NA)
-                    df[col] = pd.to_numeric(df[col], errors='coerce')
-
-            # Фильтруем строки с count > 0 (не пустые и не нулевые)
-            if 'count' not in df.columns:
-                print(f"В файле {filepath} отсутствует столбец count")
-                return None
-
-            df = df[df['count'].notna() & (df['count'] > 0)].copy()
-
-            # Добавляем дополнительные поля
-            a = df.iloc[:, 1]
-            df['oil_id'] = a.str[:4]
-            df['delivery_basis_id'] = a.str[4:7]
-            df['delivery_type_id'] = a.str[-1]
-            df['trade_date'] = trade_date
-
-            # Выбираем только нужные колонки
-            result_cols = [
-                'exchange_product_id', 'exchange_product_name', 'oil_id',
-                'delivery_basis_id', 'delivery_basis_name', 'delivery_type_id',
-                'volume', 'total', 'count', 'trade_date'
-            ]
-
-            # Проверяем наличие всех колонок
-            available_cols = [col for col in result_cols if col in df.columns]
-            if len(available_cols) != len(result_cols):
-                missing = set(result_cols) - set(df.columns)
-                print(f"В данных отсутствуют колонки: {missing}")
-                return None
-
-            df = df[df['delivery_basis_name'].notna()]
-
-            return df[result_cols]
 
         except Exception as e:
-            print(f"Ошибка при парсинге файла {filepath}: {str(e)}")
+            print(f"Ошибка при парсинге бюллетеня за {trade_date}: {str(e)}")
             return None
 
-    async def save_to_db(self, df: pd.DataFrame):
+        return columns_to_dataframe(columns) if columns is not None else None
+
+    async def save_to_db(self, df: pd.DataFrame, sha256: Optional[str] = None):
         if df is None or df.empty:
             return
 
+        if self.backfill:
+            self._copy_buffer.append(df)
+            self._copy_buffer_rows += len(df)
+            self._copy_buffer_hashes.append((sha256, len(df)))
+            if self._copy_buffer_rows >= COPY_BATCH_ROWS:
+                await self.flush_copy_buffer()
+            return
+
         async with self.async_session() as session:
             try:
-                records = df.to_dict('records')
-                for record in records:
-                    # Проверяем существование записи
-                    exists = await session.execute(
-                        select(TradingResult).where(
-                            TradingResult.exchange_product_id == record['exchange_product_id'],
-                            TradingResult.trade_date == record['trade_date']
-                        )
-                    )
-                    exists = exists.scalar_one_or_none()
+                await self.partitions.ensure(self.engine, frame_dates([df]))
+                # Один INSERT ... ON CONFLICT на пачку вместо SELECT на каждую запись
+                stats = await upsert_dataframe(session, df, self.on_conflict)
+                await refresh_derived_tables(session, frame_dates([df]))
+                await session.commit()
+                self.add_ingest_stats(stats, frame_dates([df]))
+                self.mark_parsed(sha256, len(df))
+                print(f"За {df['trade_date'].iloc[0]}: добавлено {stats['inserted']}, "
+                      f"обновлено {stats['updated']}, пропущено {stats['skipped']} записей")
+
+            except Exception as e:
+                await session.rollback()
+                print(f"Ошибка при сохранении в базу данных: {str(e)}")
 
-                    if not exists:
-                        session.add(TradingResult(**record))
+    async def flush_copy_buffer(self):
+        """Запись накопленных бюллетеней через COPY и одно слияние в trading_results"""
+        if not self._copy_buffer:
+            return
 
+        frames, self._copy_buffer, self._copy_buffer_rows = self._copy_buffer, [], 0
+        hashes, self._copy_buffer_hashes = self._copy_buffer_hashes, []
+        async with self.async_session() as session:
+            try:
+                await self.partitions.ensure(self.engine, frame_dates(frames))
+                stats = await copy_dataframes(session, frames, self.on_conflict)
+                await refresh_derived_tables(session, frame_dates(frames))
                 await session.commit()
-                print(f"Добавлено {len(records)} записей за {records[0]['trade_date']}")
+                self.add_ingest_stats(stats, frame_dates(frames))
+                for sha256, rows in hashes:
+                    self.mark_parsed(sha256, rows)
+                print(f"COPY {len(frames)} бюллетеней: добавлено {stats['inserted']}, "
+                      f"обновлено {stats['updated']}, пропущено {stats['skipped']} записей")
 
             except Exception as e:
                 await session.rollback()
-                print(f"Ошибка при сохранении в базу данных: {str(e)}")
+                print(f"Ошибка при копировании в базу данных: {str(e)}")
+
+    def mark_parsed(self, sha256: Optional[str], rows: int):
+        if self.cache:
+            self.cache.mark_parsed(sha256, rows)
+
+    def add_ingest_stats(self, stats: Dict[str, int], dates: List[date]):
+        for key, value in stats.items():
+            self.ingest_stats[key] += value
+        if stats['inserted'] or stats['updated']:
+            self.ingested_dates.update(dates)
+
+    @contextmanager
+    def timed(self, stage: str):
+        """Учет времени этапа обработки"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stage_timings[stage] += time.perf_counter() - start
+            self.stage_counts[stage] += 1
 
-    async def process_bulletin(self, session: aiohttp.ClientSession, bulletin: dict):
-        """Обработка одного бюллетеня"""
-        if self._shutdown:
+    async def download_stage(self, session: aiohttp.ClientSession, bulletin: dict):
+        data = await self.download_bulletin(session, bulletin)
+        if not data:
             return None
 
-        filepath = await self.download_bulletin(session, bulletin)
-        if not filepath:
+        # Файл с таким содержимым уже разобран и записан в эту БД, и записи за дату на месте - пропускаем
+        if self.cache and self.cache.is_parsed(bulletin.get('sha256')) and await self.has_trade_date(bulletin['date']):
+            print(f"Бюллетень за {bulletin['date']} не изменился, пропускаем")
             return None
+        return bulletin, data
+
+    async def parse_stage(self, item: tuple):
+        bulletin, data = item
+        df = await self.parse_bulletin(data, bulletin['date'])
+        return (bulletin, df) if df is not None and not df.empty else None
+
+    async def save_stage(self, item: tuple):
+        bulletin, df = item
+        await self.save_to_db(df, bulletin.get('sha256'))
+
+    async def run_stage(self, stage: str, handler, next_stage: Optional[str] = None):
+        """Обработчики одного этапа: берут работу из своей очереди и передают результат дальше"""
+        inbox = self.queues[stage]
+        outbox = self.queues.get(next_stage)
+
+        async def worker():
+            while True:
+                item = await inbox.get()
+                try:
+                    if item is None:
+                        return
+                    # При остановке только вычитываем очередь, чтобы не заблокировать предыдущий этап
+                    if self._shutdown:
+                        continue
+                    with self.timed(stage):
+                        result = await handler(item)
+                    if result is not None and outbox is not None:
+                        await outbox.put(result)
+                        self.queue_peaks[next_stage] = max(self.queue_peaks[next_stage], outbox.qsize())
+                except Exception as e:
+                    print(f"Ошибка на этапе {stage}: {str(e)}")
+                finally:
+                    inbox.task_done()
+
+        await asyncio.gather(*(worker() for _ in range(self.stage_workers[stage])))
+
+        # Этап завершен - по одному маркеру конца на каждый обработчик следующего этапа
+        if outbox is not None:
+            for _ in range(self.stage_workers[next_stage]):
+                await outbox.put(None)
+
+    async def feed(self, bulletins: List[dict]):
+        queue = self.queues['download']
+        for bulletin in bulletins:
+            if self._shutdown:
+                break
+            await queue.put(bulletin)
+            self.queue_peaks['download'] = max(self.queue_peaks['download'], queue.qsize())
+        for _ in range(self.stage_workers['download']):
+            await queue.put(None)
+
+    def pipeline_stats(self) -> Dict[str, dict]:
+        """Глубина очередей и пропускная способность этапов - для поиска узкого места"""
+        elapsed = time.time() - self._start_time if self._start_time else 0
+        stats = {}
+        for stage in self.stage_counts:
+            queue = self.queues.get(stage)
+            busy = self.stage_timings[stage]
+            stats[stage] = {
+                'workers': self.stage_workers[stage],
+                'queue_depth': queue.qsize() if queue else 0,
+                'queue_peak': self.queue_peaks[stage],
+                'processed': self.stage_counts[stage],
+                'per_second': self.stage_counts[stage] / elapsed if elapsed else 0,
+                'busy_seconds': busy,
+            }
+        return stats
 
-        try:
-            df = await self.parse_bulletin(filepath, bulletin['date'])
-            if df is not None and not df.empty:
-                await self.save_to_db(df)
-            return True
-        finally:
-            if os.path.exists(filepath):
-                os.remove(filepath)
+    def print_pipeline_stats(self):
+        for stage, stats in self.pipeline_stats().items():
+            print(f"Этап {stage}: обработчиков {stats['workers']}, очередь {stats['queue_depth']} "
+                  f"(пик {stats['queue_peak']}), обработано {stats['processed']} "
+                  f"({stats['per_second']:.2f}/сек, занято {stats['busy_seconds']:.2f} сек)")
+
+    async def report_pipeline(self):
+        while True:
+            await asyncio.sleep(PIPELINE_REPORT_INTERVAL)
+            self.print_pipeline_stats()
 
     async def process_all_bulletins(self):
         """Основная логика обработки"""
@@ -341,25 +425,42 @@ class AsyncBulletinParser:
             if not bulletins:
                 return
 
-            connector = aiohttp.TCPConnector(limit=5)
+            self.queues = {stage: asyncio.Queue(maxsize=self.queue_size) for stage in self.stage_counts}
+            connector = aiohttp.TCPConnector(limit=self.stage_workers['download'])
             async with aiohttp.ClientSession(connector=connector) as session:
-                tasks = []
-                for bulletin in bulletins:
-                    if self._shutdown:
-                        break
-                    # Создаем задачу для каждого бюллетеня
-                    task = asyncio.create_task(self.process_bulletin(session, bulletin))
-                    tasks.append(task)
-                    await asyncio.sleep(0.5)  # Задержка между запросами
+                reporter = asyncio.create_task(self.report_pipeline())
+                try:
+                    # Скачивание -> разбор -> запись, связанные ограниченными очередями
+                    await asyncio.gather(
+                        self.feed(bulletins),
+                        self.run_stage('download', lambda bulletin: self.download_stage(session, bulletin), 'parse'),
+                        self.run_stage('parse', self.parse_stage, 'save'),
+                        self.run_stage('save', self.save_stage),
+                    )
+                finally:
+                    reporter.cancel()
+
+            # Дописываем остаток пачки бэкфилла
+            await self.flush_copy_buffer()
+            await publish_ingest_complete(REDIS_URL, self.ingested_dates)
 
-                # Ожидаем завершения всех задач
-                await asyncio.gather(*tasks, return_exceptions=True)
+            if self.cache:
+                self.cache.evict()
 
         finally:
             self.total_execution_time = time.time() - self._start_time
             print(f"Общее время выполнения: {self.total_execution_time:.2f} сек")
+            self.print_ingest_stats()
+            self.print_pipeline_stats()
             await self.shutdown()
 
+    def print_ingest_stats(self):
+        stats = self.ingest_stats
+        written = stats['inserted'] + stats['updated']
+        rate = written / self.total_execution_time if self.total_execution_time else 0
+        print(f"Добавлено {stats['inserted']}, обновлено {stats['updated']}, "
+              f"пропущено {stats['skipped']} записей ({rate:.1f} записей/сек)")
+
     async def run(self):
         """Точка входа"""
         try:
@@ -372,7 +473,13 @@ class AsyncBulletinParser:
 
 
 async def main():
-    parser = AsyncBulletinParser()
+    parser = AsyncBulletinParser(
+        backfill='--backfill' in sys.argv,
+        incremental=INCREMENTAL or '--incremental' in sys.argv
+    )
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, parser.request_shutdown)
     await parser.run()
     print(f"Итоговое время выполнения: {parser.total_execution_time:.2f} сек")
     raise exec(KeyboardInterrupt)
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Модули practice_4 импортируются по имени файла, как при запуске парсеров из каталога practice_4
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,33 @@
+import json
+import time
+from bulletin_cache import BulletinCache
+
+
+def make_cache(tmp_path, target, parsed_max_age_days=180):
+    return BulletinCache(str(tmp_path), 1024 * 1024, 30, target=target, parsed_max_age_days=parsed_max_age_days)
+
+
+class TestParsedMarkers:
+    def test_markers_are_per_database(self, tmp_path):
+        make_cache(tmp_path, "localhost:5432/spimex").mark_parsed("abc", 10)
+
+        assert make_cache(tmp_path, "localhost:5432/spimex").is_parsed("abc")
+        assert not make_cache(tmp_path, "localhost:5432/spimex2").is_parsed("abc")
+
+    def test_legacy_markers_without_database_are_dropped(self, tmp_path):
+        with open(tmp_path / "index.json", "w", encoding="utf-8") as f:
+            json.dump({"urls": {}, "files": {}, "parsed": {"abc": {"rows": 10, "parsed_at": time.time()}}}, f)
+
+        assert not make_cache(tmp_path, "localhost:5432/spimex").is_parsed("abc")
+
+    def test_evict_removes_old_markers(self, tmp_path):
+        cache = make_cache(tmp_path, "localhost:5432/spimex", parsed_max_age_days=1)
+        cache.mark_parsed("old", 1)
+        cache.mark_parsed("new", 1)
+        cache.index["parsed"]["localhost:5432/spimex"]["old"]["parsed_at"] -= 2 * 24 * 3600
+
+        cache.evict()
+
+        reloaded = make_cache(tmp_path, "localhost:5432/spimex")
+        assert not reloaded.is_parsed("old")
+        assert reloaded.is_parsed("new")
@@ -0,0 +1,62 @@
+import io
+from datetime import date
+import pandas as pd
+from bulletin_reader import (
+    HEADER_MARKER, METRIC_TON_MARKER, TRADE_DATE_MARKER, find_header_row, find_trade_date,
+    load_sheet, sheet_text, slice_table
+)
+
+
+def make_sheet() -> pd.DataFrame:
+    """Лист как в бюллетене: шапка, таблица в кубометрах, таблица в тоннах и две итоговые строки"""
+    return pd.DataFrame([
+        ["Бюллетень", None, None],
+        [f"{TRADE_DATE_MARKER} 15.01.2025", None, None],
+        ["Единица измерения: Кубический метр", None, None],
+        [None, HEADER_MARKER, None],
+        [METRIC_TON_MARKER, None, None],
+        ["Код\nИнструмента", HEADER_MARKER, None],
+        ["A100ABS025A", 100, 2],
+        ["A592NVY005F", 50, 1],
+        ["Итого:", 150, 3],
+        ["Итого по секции:", 150, 3],
+    ])
+
+
+class TestAnchors:
+    def test_find_trade_date(self):
+        assert find_trade_date(sheet_text(make_sheet())) == date(2025, 1, 15)
+
+    def test_find_trade_date_missing(self):
+        assert find_trade_date(sheet_text(make_sheet().iloc[2:])) is None
+
+    def test_find_header_row_after_metric_tons(self):
+        assert find_header_row(sheet_text(make_sheet())) == 5
+
+    def test_find_header_row_without_metric_tons(self):
+        sheet = make_sheet().drop(index=4).reset_index(drop=True)
+        assert find_header_row(sheet_text(sheet)) is None
+
+
+class TestSliceTable:
+    def test_slice_table_drops_header_and_footer(self):
+        df = slice_table(make_sheet(), 5)
+
+        assert list(df.columns) == ["Код Инструмента", HEADER_MARKER, "Unnamed: 2"]
+        assert df["Код Инструмента"].tolist() == ["A100ABS025A", "A592NVY005F"]
+
+
+class TestLoadSheet:
+    def test_load_xlsx(self):
+        buffer = io.BytesIO()
+        make_sheet().to_excel(buffer, sheet_name="TRADE_SUMMARY", header=False, index=False)
+
+        df = load_sheet(buffer.getvalue())
+
+        assert find_header_row(sheet_text(df)) == 5
+
+    def test_load_without_trade_summary(self):
+        buffer = io.BytesIO()
+        make_sheet().to_excel(buffer, sheet_name="Other", header=False, index=False)
+
+        assert load_sheet(buffer.getvalue()) is None
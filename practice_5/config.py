@@ -10,3 +10,8 @@ DB_USER = os.getenv('DB_USER')
 DB_PASS = os.getenv('DB_PASS')
 BASE_URL = os.getenv('BASE_URL')
 REDIS_URL = os.getenv('REDIS_URL')
+
+# Пул соединений с Redis: общий на приложение, создается при старте
+REDIS_POOL_SIZE = int(os.getenv('REDIS_POOL_SIZE', 50))
+REDIS_SOCKET_TIMEOUT = float(os.getenv('REDIS_SOCKET_TIMEOUT', 0.5))
+REDIS_CONNECT_TIMEOUT = float(os.getenv('REDIS_CONNECT_TIMEOUT', 1))
@@ -8,7 +8,7 @@ from typing import List, Optional
 from pydantic import BaseModel, field_serializer
 from models import *
 from database import *
-from redis_file import async_cache_response
+from redis_file import async_cache_response, close_redis, init_redis
 
 
 # FastAPI app
@@ -39,6 +39,13 @@ class TradingResultResponse(BaseModel):
 async def startup():
     async with async_engine.begin() as conn:
         pass
+    # Один пул соединений с Redis на все запросы
+    init_redis()
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    await close_redis()
 
 
 @app.get("/")
@@ -1,10 +1,43 @@
+import asyncio
 from functools import wraps
 import json
 from datetime import datetime, timedelta, date
-import redis
-from config import REDIS_URL
+from typing import Optional
+import redis.asyncio as redis
+from redis.exceptions import RedisError
+from config import REDIS_URL, REDIS_POOL_SIZE, REDIS_SOCKET_TIMEOUT, REDIS_CONNECT_TIMEOUT
 
-redis_client = redis.Redis.from_url(REDIS_URL)
+# Клиент создается в lifespan приложения, вне его - при первом обращении
+redis_client: Optional[redis.Redis] = None
+_client_loop: Optional[asyncio.AbstractEventLoop] = None
+
+
+def init_redis() -> redis.Redis:
+    """Общий пул соединений: запросы не открывают новое соединение к Redis"""
+    global redis_client, _client_loop
+    pool = redis.ConnectionPool.from_url(
+        REDIS_URL,
+        max_connections=REDIS_POOL_SIZE,
+        socket_timeout=REDIS_SOCKET_TIMEOUT,
+        socket_connect_timeout=REDIS_CONNECT_TIMEOUT
+    )
+    redis_client = redis.Redis(connection_pool=pool)
+    _client_loop = asyncio.get_running_loop()
+    return redis_client
+
+
+async def close_redis():
+    global redis_client, _client_loop
+    if redis_client is not None:
+        await redis_client.aclose(close_connection_pool=True)
+        redis_client, _client_loop = None, None
+
+
+def get_redis() -> redis.Redis:
+    # Соединения пула привязаны к циклу событий, в котором созданы
+    if redis_client is None or _client_loop is not asyncio.get_running_loop():
+        return init_redis()
+    return redis_client
 
 
 class DateTimeEncoder(json.JSONEncoder):
@@ -14,38 +47,51 @@ class DateTimeEncoder(json.JSONEncoder):
         return super().default(obj)
 
 
+async def cache_get(cache_key: str):
+    # Недоступный Redis не должен ронять запрос - идем в БД
+    try:
+        return await get_redis().get(cache_key)
+    except RedisError as e:
+        print(f"Ошибка чтения кэша {cache_key}: {str(e)}")
+        return None
+
+
+async def cache_set(cache_key: str, value: str, expire_seconds: Optional[int] = None):
+    try:
+        if expire_seconds is None:
+            await get_redis().set(cache_key, value)
+        else:
+            await get_redis().setex(cache_key, expire_seconds, value)
+    except RedisError as e:
+        print(f"Ошибка записи кэша {cache_key}: {str(e)}")
+
+
 def async_cache_response(expire_at_14_11=True):
     def decorator(func):
         @wraps(func)
         async def wrapper(*args, **kwargs):
             cache_key = f"{func.__name__}:{str(args)}:{str(kwargs)}"
             now = datetime.now()
+            expire_seconds = None
             if expire_at_14_11:
                 today_14_11 = datetime(now.year, now.month, now.day, 14, 11)
-                if now > today_14_11:
+                if now < today_14_11:
+                    expire_seconds = (today_14_11 - now).total_seconds()
+                else:
                     tomorrow_14_11 = today_14_11 + timedelta(days=1)
                     expire_seconds = (tomorrow_14_11 - now).total_seconds()
-                else:
-                    expire_seconds = (today_14_11 - now).total_seconds()
-                cached_data = redis_client.get(cache_key)
-                if cached_data:
-                    return json.loads(cached_data)
-                result = await func(*args, **kwargs)
-                redis_client.setex(
-                    cache_key,
-                    int(expire_seconds),
-                    json.dumps(result, cls=DateTimeEncoder)
-                )
-                return result
-            else:
-                cached_data = redis_client.get(cache_key)
-                if cached_data:
-                    return json.loads(cached_data)
-                result = await func(*args, **kwargs)
-                redis_client.set(
-                    cache_key,
-                    json.dumps(result, cls=DateTimeEncoder)
-                )
-                return result
+
+            cached_data = await cache_get(cache_key)
+            if cached_data:
+                return json.loads(cached_data)
+            result = await func(*args, **kwargs)
+            await cache_set(
+                cache_key,
+                json.dumps(result, cls=DateTimeEncoder),
+                int(expire_seconds) if expire_seconds is not None else None
+            )
+            return result
+
         return wrapper
+
     return decorator
@@ -0,0 +1,57 @@
+import argparse
+import json
+import random
+import time
+from datetime import date, timedelta
+from typing import List
+from pydantic import TypeAdapter
+from practice_6.main import TradingResultResponse
+from practice_6.models import TradingResult
+from practice_6.queries import rows_to_json
+
+response_adapter = TypeAdapter(List[TradingResultResponse])
+
+
+def make_rows(count: int) -> List[tuple]:
+    start = date(2023, 1, 1)
+    return [
+        (start + timedelta(days=i % 500), f"A{i % 900:03d}", "F", f"B{i % 50:02d}",
+         round(random.uniform(1, 1000), 2), round(random.uniform(1e4, 1e7), 2), random.randint(1, 50))
+        for i in range(count)
+    ]
+
+
+def legacy_response(rows: List[tuple]) -> bytes:
+    """Прежний путь: ORM-объекты, to_dict, проверка моделью ответа и json.dumps, как в FastAPI"""
+    trading_results = [
+        TradingResult(trade_date=r[0], oil_id=r[1], delivery_type_id=r[2], delivery_basis_id=r[3],
+                      volume=r[4], total=r[5], count=r[6])
+        for r in rows
+    ]
+    content = response_adapter.validate_python([tr.to_dict() for tr in trading_results])
+    return json.dumps(
+        response_adapter.dump_python(content, mode='json'), ensure_ascii=False, separators=(',', ':')
+    ).encode('utf-8')
+
+
+def run(name: str, serialize, rows: List[tuple], rounds: int) -> bytes:
+    body = b''
+    start = time.perf_counter()
+    for _ in range(rounds):
+        body = serialize(rows)
+    elapsed = (time.perf_counter() - start) / rounds * 1000
+    print(f"{name:>8}: {elapsed:.1f} мс на ответ из {len(rows)} строк, {len(body)} байт")
+    return body
+
+
+if __name__ == "__main__":
+    # python -m practice_6.benchmark_serialization -n 10000
+    parser = argparse.ArgumentParser(description="Сериализация ответов /dynamics/ и /trading-results/")
+    parser.add_argument("-n", "--rows", type=int, default=10000)
+    parser.add_argument("-r", "--rounds", type=int, default=20)
+    args = parser.parse_args()
+
+    rows = make_rows(args.rows)
+    legacy = run("прежний", legacy_response, rows, args.rounds)
+    fast = run("новый", rows_to_json, rows, args.rounds)
+    print("Ответы совпадают" if json.loads(legacy) == json.loads(fast) else "Ответы различаются!")
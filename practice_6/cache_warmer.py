@@ -0,0 +1,143 @@
+import asyncio
+import inspect
+import json
+from datetime import date
+from typing import Dict, Iterable, List, Optional
+from fastapi import params
+from pydantic import TypeAdapter
+from redis.exceptions import RedisError
+from practice_6.config import CACHE_WARM_TOP_KEYS
+from practice_6.export_parquet import export
+from practice_6.parquet_store import analytics
+from practice_6.redis_file import (
+    INVALIDATION_CHANNEL, acquire_lock, cache_expire_seconds, cache_key_for, cache_set,
+    cached_endpoints, get_redis, local_cache, cache_prefix, popular_params, release_lock
+)
+from practice_6.trading_dates import trading_dates
+
+# Тот же канал публикуют парсеры practice_4 по окончании загрузки (practice_4/events.py);
+# пакеты не импортируют друг друга, совпадение значений проверяет test_cache_warmer
+INGEST_CHANNEL = 'ingest:complete'
+WARM_LOCK_KEY = 'cache:warm'  # в Redis - lock:cache:warm
+WARM_LOCK_MS = 5 * 60 * 1000
+
+
+def decode_params(func, canonical: str) -> dict:
+    """Параметры из канонического JSON обратно в типы из сигнатуры: даты, перечисления и т.п."""
+    signature = inspect.signature(func)
+    kwargs = {}
+    for name, value in json.loads(canonical).items():
+        annotation = signature.parameters[name].annotation
+        if annotation is inspect.Parameter.empty or value is None:
+            kwargs[name] = value
+        else:
+            kwargs[name] = TypeAdapter(annotation).validate_python(value)
+    return kwargs
+
+
+def affected_by(kwargs: dict, trade_dates: Optional[List[date]]) -> bool:
+    """Запросы за период, в который не попала ни одна новая дата, прогревать незачем"""
+    if not trade_dates or 'start_date' not in kwargs or 'end_date' not in kwargs:
+        return True
+    return any(kwargs['start_date'] <= trade_date <= kwargs['end_date'] for trade_date in trade_dates)
+
+
+async def call_with_dependencies(func, kwargs: dict):
+    """Вызов эндпоинта вне запроса: зависимости-генераторы (get_db) открываются и закрываются вручную"""
+    generators = []
+    try:
+        for name, parameter in inspect.signature(func).parameters.items():
+            if isinstance(parameter.default, params.Depends):
+                generator = parameter.default.dependency()
+                generators.append(generator)
+                kwargs[name] = await generator.__anext__()
+        return await func(**kwargs)
+    finally:
+        for generator in generators:
+            await generator.aclose()
+
+
+async def warm_cache(trade_dates: Optional[Iterable[date]] = None,
+                     top_keys: int = CACHE_WARM_TOP_KEYS) -> Dict[str, int]:
+    """
+    Пересчет самых частых ключей каждой кэшируемой функции.
+
+    Новое значение записывается поверх старого, так что до замены запросы получают прежний ответ.
+    """
+    trade_dates = sorted(trade_dates) if trade_dates else None
+    warmed = {}
+    for func_name, (func, expire_at_14_11, serialize) in cached_endpoints.items():
+        warmed[func_name] = 0
+        for canonical in await popular_params(func_name, top_keys):
+            try:
+                kwargs = decode_params(func, canonical)
+                if not affected_by(kwargs, trade_dates):
+                    continue
+                result = await call_with_dependencies(func, kwargs)
+            except Exception as e:
+                print(f"Ошибка прогрева {func_name} {canonical}: {str(e)}")
+                continue
+
+            expire_seconds = cache_expire_seconds(expire_at_14_11)
+            await cache_set(
+                cache_key_for(func_name, canonical),
+                serialize(result),
+                int(expire_seconds) if expire_seconds is not None else None
+            )
+            warmed[func_name] += 1
+
+        # Локальные копии во всех процессах устарели - они перечитают значения из Redis
+        local_cache.invalidate(cache_prefix(func_name))
+        await get_redis().publish(INVALIDATION_CHANNEL, func_name)
+    return warmed
+
+
+async def handle_ingest_event(data: bytes):
+    event = json.loads(data)
+    trade_dates = [date.fromisoformat(value) for value in event.get('trade_dates', [])]
+    trading_dates.add(trade_dates)
+
+    # Событие получают все процессы API, прогревает только один; без Redis прогревать некуда
+    token = await acquire_lock(WARM_LOCK_KEY, WARM_LOCK_MS)
+    if not token:
+        return
+    try:
+        if analytics is not None:
+            # /dynamics/ с DYNAMICS_BACKEND=duckdb читает Parquet: без новой выгрузки прогрев закэшировал бы старые суммы
+            try:
+                await export(since=min(trade_dates) if trade_dates else None)
+            except Exception as e:
+                print(f"Ошибка выгрузки в Parquet, кэш не прогрет: {str(e)}")
+                return
+        warmed = await warm_cache(trade_dates)
+        print(f"Кэш прогрет после загрузки за {[d.isoformat() for d in trade_dates]}: {warmed}")
+    finally:
+        # Прогрев мог пережить WARM_LOCK_MS - тогда блокировка уже чужая и остается на месте
+        await release_lock(WARM_LOCK_KEY, token)
+
+
+async def listen_ingest_events():
+    """Подписка на события парсеров о завершении загрузки"""
+    while True:
+        try:
+            pubsub = get_redis().pubsub(ignore_subscribe_messages=True)
+            await pubsub.subscribe(INGEST_CHANNEL)
+            try:
+                while True:
+                    message = await pubsub.get_message(timeout=1.0)
+                    if message:
+                        try:
+                            await handle_ingest_event(message['data'])
+                        except (RedisError, ValueError) as e:
+                            print(f"Ошибка прогрева кэша: {str(e)}")
+            finally:
+                await pubsub.aclose()
+        except RedisError as e:
+            print(f"Ошибка подписки на события загрузки: {str(e)}")
+            await asyncio.sleep(1)
+
+
+if __name__ == "__main__":
+    # Ручной прогрев: python -m practice_6.cache_warmer
+    import practice_6.main  # noqa: F401 - регистрирует кэшируемые эндпоинты
+    print(asyncio.run(warm_cache()))
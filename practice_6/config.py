@@ -10,3 +10,63 @@ DB_USER = os.getenv('DB_USER')
 DB_PASS = os.getenv('DB_PASS')
 BASE_URL = os.getenv('BASE_URL')
 REDIS_URL = os.getenv('REDIS_URL')
+
+# Пул соединений с Redis: общий на приложение, создается в lifespan
+REDIS_POOL_SIZE = int(os.getenv('REDIS_POOL_SIZE', 50))
+REDIS_SOCKET_TIMEOUT = float(os.getenv('REDIS_SOCKET_TIMEOUT', 0.5))
+REDIS_CONNECT_TIMEOUT = float(os.getenv('REDIS_CONNECT_TIMEOUT', 1))
+
+# Локальный уровень кэша в памяти каждого процесса перед Redis
+LOCAL_CACHE_ENABLED = os.getenv('LOCAL_CACHE_ENABLED', '1').lower() in ('1', 'true', 'yes')
+LOCAL_CACHE_MAX_ENTRIES = int(os.getenv('LOCAL_CACHE_MAX_ENTRIES', 1000))
+LOCAL_CACHE_MAX_MB = int(os.getenv('LOCAL_CACHE_MAX_MB', 64))
+
+# Single-flight: при промахе значение считает один запрос, остальные ждут
+SINGLE_FLIGHT_LOCK_MS = int(os.getenv('SINGLE_FLIGHT_LOCK_MS', 10000))
+SINGLE_FLIGHT_POLL_MS = int(os.getenv('SINGLE_FLIGHT_POLL_MS', 50))
+
+# Прогрев кэша после загрузки бюллетеней: сколько самых частых ключей каждой функции пересчитывать
+CACHE_WARM_TOP_KEYS = int(os.getenv('CACHE_WARM_TOP_KEYS', 20))
+POPULAR_KEYS_KEEP = int(os.getenv('POPULAR_KEYS_KEEP', 1000))
+ACCESS_FLUSH_SECONDS = float(os.getenv('ACCESS_FLUSH_SECONDS', 10))
+
+# Сжатие значений в Redis: ответы от этого размера хранятся в gzip, 0 - без сжатия
+CACHE_COMPRESS_MIN_BYTES = int(os.getenv('CACHE_COMPRESS_MIN_BYTES', 16 * 1024))
+CACHE_COMPRESS_LEVEL = int(os.getenv('CACHE_COMPRESS_LEVEL', 1))
+
+# /dynamics/: наибольший размер страницы и число строк, которые потоковая выдача берет из курсора за раз
+DYNAMICS_PAGE_MAX = int(os.getenv('DYNAMICS_PAGE_MAX', 1000))
+DYNAMICS_STREAM_BATCH = int(os.getenv('DYNAMICS_STREAM_BATCH', 1000))
+
+# /last-trading-dates/: сколько последних дат держать в памяти процесса и как часто перечитывать их из БД
+TRADING_DATES_KEEP = int(os.getenv('TRADING_DATES_KEEP', 70))
+TRADING_DATES_MAX_AGE = float(os.getenv('TRADING_DATES_MAX_AGE', 600))
+
+# Пул соединений с PostgreSQL
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', 20))
+DB_MAX_OVERFLOW = int(os.getenv('DB_MAX_OVERFLOW', 10))
+DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', 10))
+DB_POOL_RECYCLE = int(os.getenv('DB_POOL_RECYCLE', 1800))
+DB_POOL_PRE_PING = os.getenv('DB_POOL_PRE_PING', '1').lower() in ('1', 'true', 'yes')
+# Сколько соединений открыть при старте, чтобы первые запросы не ждали подключения
+DB_POOL_PREWARM = int(os.getenv('DB_POOL_PREWARM', 5))
+# Размер кэша подготовленных запросов asyncpg на соединение. Кэш включен и без этой настройки
+# (у адаптера SQLAlchemy по умолчанию 100, а разных запросов у API меньше) - это лишь возможность
+# поменять размер или выключить кэш значением 0, например за pgbouncer в режиме transaction
+DB_STATEMENT_CACHE_SIZE = int(os.getenv('DB_STATEMENT_CACHE_SIZE', 100))
+
+# Реплики для чтения: "host:port" через запятую, пользователь, пароль и БД те же, что у основного сервера
+DB_REPLICA_HOSTS = [host.strip() for host in os.getenv('DB_REPLICA_HOSTS', '').split(',') if host.strip()]
+# Отставание реплики, с которым она еще обслуживает чтение, и более строгий предел для свежих данных
+DB_REPLICA_MAX_LAG = float(os.getenv('DB_REPLICA_MAX_LAG', 30))
+DB_FRESH_MAX_LAG = float(os.getenv('DB_FRESH_MAX_LAG', 1))
+DB_REPLICA_CHECK_SECONDS = float(os.getenv('DB_REPLICA_CHECK_SECONDS', 5))
+
+# Секционирование trading_results по trade_date (схему создают парсеры practice_4): '' - без секций, 'month', 'year'
+TRADING_RESULTS_PARTITION = os.getenv('TRADING_RESULTS_PARTITION', '').lower()
+
+# Аналитика: копия trading_results в Parquet (export_parquet.py) и агрегаты /dynamics/ из нее через DuckDB.
+# DYNAMICS_BACKEND=duckdb требует pip install duckdb pyarrow
+PARQUET_DIR = os.getenv('PARQUET_DIR', 'parquet')
+DYNAMICS_BACKEND = os.getenv('DYNAMICS_BACKEND', 'postgres').lower()
+DUCKDB_THREADS = int(os.getenv('DUCKDB_THREADS', os.cpu_count() or 1))
@@ -0,0 +1,103 @@
+import asyncio
+from typing import Optional
+from sqlalchemy import text
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+from sqlalchemy.schema import CreateIndex
+from practice_6.database import DATABASE_URL
+from practice_6.models import TradingResult
+
+
+INVALID_INDEX_SQL = text("""
+    SELECT 1 FROM pg_index i
+    JOIN pg_class c ON c.oid = i.indexrelid
+    WHERE c.relname = :name AND NOT i.indisvalid
+""")
+IS_PARTITIONED_SQL = text("SELECT relkind = 'p' FROM pg_class WHERE oid = to_regclass(:table)")
+PARTITIONS_SQL = text("""
+    SELECT c.relname FROM pg_inherits i
+    JOIN pg_class c ON c.oid = i.inhrelid
+    WHERE i.inhparent = to_regclass(:table)
+    ORDER BY c.relname
+""")
+# Секции, индекс которых уже присоединен к индексу родителя
+ATTACHED_SQL = text("""
+    SELECT t.relname FROM pg_inherits i
+    JOIN pg_index x ON x.indexrelid = i.inhrelid
+    JOIN pg_class t ON t.oid = x.indrelid
+    WHERE i.inhparent = to_regclass(:index)
+""")
+
+
+def create_index_sql(index, table: Optional[str] = None, name: Optional[str] = None,
+                     concurrently: bool = True) -> str:
+    """
+    CREATE INDEX CONCURRENTLY IF NOT EXISTS - таблица не блокируется на запись.
+
+    table и name - для того же индекса на секции; без concurrently - CREATE INDEX ... ON ONLY
+    на секционированной таблице: CONCURRENTLY для нее Postgres не поддерживает.
+    """
+    sql = str(CreateIndex(index, if_not_exists=True).compile(dialect=postgresql.dialect()))
+    parent = index.table.name
+    if table or name:
+        sql = sql.replace(f" {index.name} ON {parent} ", f" {name or index.name} ON {table or parent} ", 1)
+    if not concurrently:
+        return sql.replace(f" ON {parent} ", f" ON ONLY {parent} ", 1)
+    return sql.replace("CREATE INDEX", "CREATE INDEX CONCURRENTLY", 1)
+
+
+async def build_index(conn, index, table: Optional[str] = None, name: Optional[str] = None):
+    name = name or index.name
+    # Прерванное построение оставляет невалидный индекс, IF NOT EXISTS его не пересоздаст
+    invalid = (await conn.execute(INVALID_INDEX_SQL, {"name": name})).first()
+    if invalid:
+        print(f"Индекс {name} невалиден, пересоздаем")
+        await conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {name}"))
+
+    await conn.execute(text(create_index_sql(index, table, name)))
+
+
+async def build_partitioned_index(conn, index, partitions):
+    """
+    Индекс секционированной таблицы: пустой индекс на родителе (ON ONLY), на каждой секции -
+    CONCURRENTLY, затем ATTACH PARTITION. Родительский индекс становится валидным,
+    когда присоединены индексы всех секций; новые секции получают индекс автоматически.
+    """
+    await conn.execute(text(create_index_sql(index, concurrently=False)))
+    attached = set((await conn.execute(ATTACHED_SQL, {"index": index.name})).scalars())
+    parent = index.table.name
+    for partition in partitions:
+        if partition in attached:
+            continue
+        name = index.name.replace(parent, partition, 1)
+        await build_index(conn, index, partition, name)
+        await conn.execute(text(f"ALTER INDEX {index.name} ATTACH PARTITION {name}"))
+
+
+async def create_indexes(engine: Optional[AsyncEngine] = None):
+    """Миграция: индексы модели TradingResult на уже заполненной таблице"""
+    # CONCURRENTLY нельзя выполнять внутри транзакции
+    own_engine = engine is None
+    if own_engine:
+        engine = create_async_engine(DATABASE_URL, isolation_level="AUTOCOMMIT")
+    table = TradingResult.__tablename__
+    try:
+        async with engine.connect() as conn:
+            partitioned = (await conn.execute(IS_PARTITIONED_SQL, {"table": table})).scalar()
+            partitions = (await conn.execute(PARTITIONS_SQL, {"table": table})).scalars().all()
+            for index in sorted(TradingResult.__table__.indexes, key=lambda ix: ix.name):
+                if partitioned:
+                    await build_partitioned_index(conn, index, partitions)
+                else:
+                    await build_index(conn, index)
+                print(f"Индекс {index.name} готов")
+
+            await conn.execute(text(f"ANALYZE {table}"))
+    finally:
+        if own_engine:
+            await engine.dispose()
+
+
+if __name__ == "__main__":
+    # python -m practice_6.create_indexes
+    asyncio.run(create_indexes())
@@ -1,18 +1,188 @@
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+import asyncio
+import time
+from collections import Counter
+from typing import Dict, List, Optional
+from fastapi import Request
+from sqlalchemy import exc, text
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncEngine, AsyncSession
 from sqlalchemy.orm import sessionmaker
-from practice_6.config import DB_NAME, DB_HOST, DB_PASS, DB_USER
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from practice_6.config import (
+    DB_NAME, DB_HOST, DB_PORT, DB_PASS, DB_USER,
+    DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_TIMEOUT, DB_POOL_RECYCLE, DB_POOL_PRE_PING, DB_STATEMENT_CACHE_SIZE,
+    DB_REPLICA_HOSTS, DB_REPLICA_MAX_LAG, DB_FRESH_MAX_LAG, DB_REPLICA_CHECK_SECONDS
+)
+
+
+def database_url(host: str) -> str:
+    return f"postgresql+asyncpg://{DB_USER}:{DB_PASS}@{host}/{DB_NAME}"
+
+
+DATABASE_URL = database_url(f"{DB_HOST}:{DB_PORT or 5432}")
+
+class TimedQueuePool(AsyncAdaptedQueuePool):
+    """
+    Пул, который учитывает время получения соединения: ожидание в очереди, подключение, pre-ping.
+
+    Счетчики у каждого пула свои (основной сервер, каждая реплика) и переживают dispose().
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.stats = Counter()
+
+    def recreate(self):
+        pool = super().recreate()
+        pool.stats = self.stats
+        return pool
 
+    def connect(self):
+        start = time.perf_counter()
+        try:
+            return super().connect()
+        except exc.TimeoutError:
+            self.stats['timeouts'] += 1
+            raise
+        finally:
+            wait_ms = (time.perf_counter() - start) * 1000
+            self.stats['checkouts'] += 1
+            self.stats['wait_ms_total'] += wait_ms
+            self.stats['wait_ms_max'] = max(self.stats['wait_ms_max'], wait_ms)
 
-DATABASE_URL = f"postgresql+asyncpg://{DB_USER}:{DB_PASS}@{DB_HOST}/{DB_NAME}"
 
-async_engine = create_async_engine(DATABASE_URL)
+def make_engine(url: str) -> AsyncEngine:
+    return create_async_engine(
+        url,
+        poolclass=TimedQueuePool,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_recycle=DB_POOL_RECYCLE,
+        pool_pre_ping=DB_POOL_PRE_PING,
+        connect_args={"prepared_statement_cache_size": DB_STATEMENT_CACHE_SIZE}
+    )
+
+
+# Основной сервер: в него же пишут парсеры
+async_engine = make_engine(DATABASE_URL)
 AsyncSessionLocal = sessionmaker(
     bind=async_engine,
     class_=AsyncSession,
     expire_on_commit=False
 )
 
+# Отставание реплики в секундах; на основном сервере (не в recovery) - 0
+REPLICA_LAG_SQL = """
+SELECT CASE
+    WHEN NOT pg_is_in_recovery() THEN 0
+    WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+    ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+END
+"""
+
+
+class ReplicaRouter:
+    """
+    Выбор реплики для чтения по кругу среди доступных.
+
+    Доступность и отставание обновляет check(); реплика, которая не ответила
+    или отстала больше допустимого, пропускается.
+    """
+
+    def __init__(self, engines: Dict[str, AsyncEngine]):
+        self.engines = engines
+        self.healthy = {host: False for host in engines}
+        self.lag: Dict[str, Optional[float]] = {host: None for host in engines}
+        self._hosts = list(engines)
+        self._next = 0
+
+    async def replica_lag(self, host: str) -> float:
+        async with self.engines[host].connect() as conn:
+            return float(await conn.scalar(text(REPLICA_LAG_SQL)))
+
+    async def check_one(self, host: str):
+        try:
+            # Ограничение на все сразу: зависшее подключение asyncpg иначе ждет до 60 секунд
+            lag = await asyncio.wait_for(self.replica_lag(host), DB_REPLICA_CHECK_SECONDS)
+            self.healthy[host], self.lag[host] = True, lag
+        except Exception as e:
+            if self.healthy[host]:
+                print(f"Реплика {host} недоступна: {str(e)}")
+            self.healthy[host], self.lag[host] = False, None
+
+    async def check(self):
+        await asyncio.gather(*(self.check_one(host) for host in self._hosts))
 
-async def get_db():
-    async with AsyncSessionLocal() as session:
+    async def monitor(self):
+        while True:
+            await self.check()
+            await asyncio.sleep(DB_REPLICA_CHECK_SECONDS)
+
+    def choose(self, max_lag: float) -> Optional[AsyncEngine]:
+        for _ in range(len(self._hosts)):
+            host = self._hosts[self._next % len(self._hosts)]
+            self._next += 1
+            if self.healthy[host] and self.lag[host] is not None and self.lag[host] <= max_lag:
+                return self.engines[host]
+        return None
+
+    def stats(self) -> List[dict]:
+        return [
+            {'host': host, 'healthy': self.healthy[host], 'lag_seconds': self.lag[host]}
+            for host in self._hosts
+        ]
+
+
+replicas = ReplicaRouter({host: make_engine(database_url(host)) for host in DB_REPLICA_HOSTS})
+
+
+def read_session(request: Optional[Request] = None, max_lag: float = DB_REPLICA_MAX_LAG) -> AsyncSession:
+    """Сессия на реплике для GET-запросов; без подходящей реплики и для остальных методов - основной сервер"""
+    engine = None
+    if request is None or request.method in ('GET', 'HEAD'):
+        engine = replicas.choose(max_lag)
+    return AsyncSessionLocal(bind=engine or async_engine)
+
+
+async def get_db(request: Request = None):
+    async with read_session(request) as session:
+        yield session
+
+
+async def get_fresh_db(request: Request = None):
+    """Для эндпоинтов, которым важна свежесть: реплика с отставанием не больше DB_FRESH_MAX_LAG"""
+    async with read_session(request, DB_FRESH_MAX_LAG) as session:
         yield session
+
+
+async def prewarm_pool(engine, connections: int):
+    """Одновременное открытие connections соединений: после возврата они остаются в пуле"""
+    async def checkout():
+        async with engine.connect():
+            pass
+
+    await asyncio.gather(*(checkout() for _ in range(min(connections, DB_POOL_SIZE))))
+
+
+def engine_pool_stats(engine: AsyncEngine) -> dict:
+    pool = engine.pool
+    stats = pool.stats
+    checkouts = stats['checkouts']
+    return {
+        'host': f"{engine.url.host}:{engine.url.port or 5432}",
+        'size': pool.size(),
+        'checked_out': pool.checkedout(),
+        'overflow': pool.overflow(),
+        'checkouts': checkouts,
+        'timeouts': stats['timeouts'],
+        'wait_ms_avg': round(stats['wait_ms_total'] / checkouts, 3) if checkouts else 0.0,
+        'wait_ms_max': round(stats['wait_ms_max'], 3)
+    }
+
+
+def get_pool_stats() -> List[dict]:
+    """По пулу на сервер: первым основной, затем реплики - видно, какой из них упирается в лимит"""
+    return [
+        {'role': 'primary', **engine_pool_stats(async_engine)},
+        *({'role': 'replica', **engine_pool_stats(engine)} for engine in replicas.engines.values())
+    ]
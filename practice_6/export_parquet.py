@@ -0,0 +1,47 @@
+import argparse
+import asyncio
+import time
+from datetime import date
+from typing import Dict, Optional
+from practice_6.config import PARQUET_DIR
+from practice_6.database import async_engine, read_session, replicas
+from practice_6.parquet_store import month_start, next_month, write_month
+from practice_6.queries import export_rows_query, trading_months_query
+
+
+async def export(directory: str = PARQUET_DIR, since: Optional[date] = None) -> Dict[str, int]:
+    """
+    Выгрузка trading_results в Parquet по месяцам; файл месяца перезаписывается целиком.
+
+    since - выгрузить заново только месяцы начиная с этой даты, например после загрузки новых бюллетеней.
+    """
+    await replicas.check()
+    exported = {}
+    async with read_session() as session:
+        months = (await session.execute(trading_months_query(month_start(since) if since else None))).scalars().all()
+        for month in months:
+            start = time.perf_counter()
+            rows = (await session.execute(export_rows_query(month, next_month(month)))).all()
+            await asyncio.to_thread(write_month, directory, month, rows)
+            exported[f"{month:%Y-%m}"] = len(rows)
+            print(f"{month:%Y-%m}: {len(rows)} строк за {time.perf_counter() - start:.2f} сек")
+    return exported
+
+
+async def main(directory: str, since: Optional[date]):
+    try:
+        exported = await export(directory, since)
+        print(f"Выгружено {sum(exported.values())} строк за {len(exported)} месяцев в {directory}")
+    finally:
+        await async_engine.dispose()
+        for engine in replicas.engines.values():
+            await engine.dispose()
+
+
+if __name__ == "__main__":
+    # python -m practice_6.export_parquet [--since 2025-01-01] [--dir parquet]
+    parser = argparse.ArgumentParser(description="Выгрузка trading_results в Parquet для аналитики")
+    parser.add_argument("--dir", default=PARQUET_DIR)
+    parser.add_argument("--since", type=date.fromisoformat, default=None)
+    args = parser.parse_args()
+    asyncio.run(main(args.dir, args.since))
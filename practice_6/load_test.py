@@ -0,0 +1,63 @@
+import argparse
+import asyncio
+import statistics
+import time
+from typing import List
+import httpx
+
+
+DEFAULT_PATHS = [
+    "/last-trading-dates/?limit=5",
+    "/trading-results/?limit=10",
+    "/dynamics/?start_date=2025-01-01&end_date=2025-01-31",
+]
+
+
+def percentile(values: List[float], p: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(p / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+async def run(base_url: str, paths: List[str], requests: int, concurrency: int):
+    """Нагрузка из concurrency одновременных клиентов, задержки в миллисекундах"""
+    latencies: List[float] = []
+    errors = 0
+    counter = iter(range(requests))
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=30) as client:
+        # Первый проход заполняет кэш, в замер он не входит
+        for path in paths:
+            await client.get(path)
+
+        async def worker():
+            nonlocal errors
+            for i in counter:
+                start = time.perf_counter()
+                try:
+                    response = await client.get(paths[i % len(paths)])
+                    if response.status_code != 200:
+                        errors += 1
+                except httpx.HTTPError:
+                    errors += 1
+                latencies.append((time.perf_counter() - start) * 1000)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+
+    print(f"{requests} запросов, {concurrency} одновременно, {requests / elapsed:.0f} запросов/сек, ошибок {errors}")
+    print(f"p50 {percentile(latencies, 50):.1f} мс, p95 {percentile(latencies, 95):.1f} мс, "
+          f"p99 {percentile(latencies, 99):.1f} мс, среднее {statistics.mean(latencies):.1f} мс")
+
+
+if __name__ == "__main__":
+    # Сравнение до/после: запустить против сервера на старой и новой версии кода
+    # python -m practice_6.load_test --url http://localhost:8000 -n 5000 -c 100
+    parser = argparse.ArgumentParser(description="Нагрузочный тест API с кэшем")
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("-n", "--requests", type=int, default=2000)
+    parser.add_argument("-c", "--concurrency", type=int, default=50)
+    parser.add_argument("paths", nargs="*", default=DEFAULT_PATHS)
+    args = parser.parse_args()
+    asyncio.run(run(args.url, args.paths, args.requests, args.concurrency))
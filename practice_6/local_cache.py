@@ -0,0 +1,58 @@
+import time
+from collections import OrderedDict
+from typing import Optional
+
+
+class LocalCache:
+    """
+    LRU-кэш готовых ответов в памяти процесса.
+
+    Ограничен числом записей и суммарным размером в байтах, у каждой записи свой срок жизни.
+    Используется из цикла событий, поэтому без блокировок.
+    """
+
+    def __init__(self, max_entries: int, max_bytes: int):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str) -> Optional[bytes]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, data = entry
+        if expires_at is not None and expires_at <= time.time():
+            self._remove(key)
+            return None
+        self._entries.move_to_end(key)
+        return data
+
+    def set(self, key: str, data: bytes, expire_seconds: Optional[float] = None):
+        # Запись больше всего бюджета не кэшируем, чтобы не вытеснить ради нее все остальное
+        if len(data) > self.max_bytes:
+            return
+        expires_at = time.time() + expire_seconds if expire_seconds is not None else None
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = (expires_at, data)
+        self.size += len(data)
+        while len(self._entries) > self.max_entries or self.size > self.max_bytes:
+            self._remove(next(iter(self._entries)))
+
+    def invalidate(self, prefix: str = '') -> int:
+        """Удаление записей, ключ которых начинается с prefix; пустой prefix - все записи"""
+        keys = [key for key in self._entries if key.startswith(prefix)]
+        for key in keys:
+            self._remove(key)
+        return len(keys)
+
+    def clear(self):
+        self.invalidate()
+
+    def _remove(self, key: str):
+        _, data = self._entries.pop(key)
+        self.size -= len(data)
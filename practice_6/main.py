@@ -1,19 +1,52 @@
 from contextlib import asynccontextmanager
 from fastapi import FastAPI, Depends, HTTPException, Query, Request
+from fastapi.responses import Response, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
-from sqlalchemy.future import select
-from sqlalchemy import and_
 from datetime import date
 from typing import List, Optional
 from pydantic import BaseModel, field_serializer, ConfigDict
+from practice_6.config import DB_POOL_PREWARM, DYNAMICS_PAGE_MAX, DYNAMICS_STREAM_BATCH, TRADING_DATES_KEEP
 from practice_6.models import *
 from practice_6.database import *
-from practice_6.redis_file import async_cache_response
+from practice_6.queries import (
+    Granularity, decode_cursor, dynamics_aggregates_query, dynamics_page_query, dynamics_query, encode_cursor,
+    ndjson_error, rows_to_json, rows_to_ndjson, trading_results_query
+)
+from practice_6.redis_file import (
+    async_cache_response, close_redis, get_cache_stats, init_redis, start_background_task, start_cache_tasks
+)
+from practice_6.cache_warmer import listen_ingest_events
+from practice_6.trading_dates import trading_dates
+from practice_6.parquet_store import analytics
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Соединения с БД открываются заранее, а не на первых запросах
+    await prewarm_pool(async_engine, DB_POOL_PREWARM)
+    await replicas.check()
+    for host, engine in replicas.engines.items():
+        if replicas.healthy[host]:
+            await prewarm_pool(engine, DB_POOL_PREWARM)
+    # Один пул соединений с Redis на все запросы
+    init_redis()
+    start_cache_tasks()
+    # После загрузки новых итогов парсер присылает событие - популярные ключи пересчитываются заранее
+    start_background_task(listen_ingest_events())
+    if replicas.engines:
+        start_background_task(replicas.monitor())
+    # DuckDB поднимается при старте: без пакета процесс падает сразу, а не на первом запросе
+    if analytics is not None:
+        analytics.connect()
+    yield
+    await close_redis()
+    if analytics is not None:
+        analytics.close()
 
 
 # FastAPI app
-app = FastAPI(title="Результаты торгов Spimex")
+app = FastAPI(title="Результаты торгов Spimex", lifespan=lifespan)
 
 app.mount("/static", StaticFiles(directory="static"), name="static")
 templates = Jinja2Templates(directory="templates")
@@ -35,13 +68,6 @@ class TradingResultResponse(BaseModel):
     model_config = ConfigDict(from_attributes=True)
 
 
-@asynccontextmanager
-async def lifespan(app: app):
-    async with async_engine.begin() as conn:
-        pass
-    yield
-
-
 @app.get("/")
 async def read_root(request: Request):
     return templates.TemplateResponse(request, "index.html")
@@ -49,10 +75,9 @@ async def read_root(request: Request):
 
 # API Endpoints
 @app.get("/last-trading-dates/", response_model=List[str])
-@async_cache_response()
 async def get_last_trading_dates(
-        limit: int = Query(5, description="Количество предыдущих дат торгов", gt=0, le=70),
-        db: AsyncSession = Depends(get_db)
+        limit: int = Query(5, description="Количество предыдущих дат торгов", gt=0, le=TRADING_DATES_KEEP),
+        db: AsyncSession = Depends(get_fresh_db)
 ):
     """
     Возвращает количество предыдущих дат торгов.
@@ -60,20 +85,22 @@ async def get_last_trading_dates(
     Parameters:
     - limit: Количество дат торгов (default: 5, max: 70)
     """
-    stmt = select(TradingResult.trade_date).distinct().order_by(TradingResult.trade_date.desc()).limit(limit)
-    result = await db.execute(stmt)
-    dates = result.scalars().all()
-    return [date.isoformat() for date in dates]
+    # Даты хранятся в памяти процесса; БД читается при первом запросе и раз в TRADING_DATES_MAX_AGE
+    await trading_dates.refresh(db)
+    return [date.isoformat() for date in trading_dates.latest(limit)]
 
 
 @app.get("/dynamics/", response_model=List[TradingResultResponse])
-@async_cache_response()
 async def get_dynamics(
         start_date: date = Query(..., description="Начальная дата"),
         end_date: date = Query(..., description="Конечная дата"),
         oil_id: Optional[str] = Query(None, description="Фильтрация по oil ID"),
         delivery_type_id: Optional[str] = Query(None, description="Фильтрация по delivery type ID"),
         delivery_basis_id: Optional[str] = Query(None, description="Фильтрация по delivery basis ID"),
+        granularity: Optional[Granularity] = Query(None, description="Итоги за день, неделю или месяц"),
+        limit: Optional[int] = Query(None, description="Размер страницы", gt=0, le=DYNAMICS_PAGE_MAX),
+        cursor: Optional[str] = Query(None, description="Курсор следующей страницы из заголовка X-Next-Cursor"),
+        stream: bool = Query(False, description="Построчная выдача в формате NDJSON"),
         db: AsyncSession = Depends(get_db)
 ):
     """
@@ -85,30 +112,131 @@ async def get_dynamics(
     - oil_id: Фильтрация по oil ID (optional)
     - delivery_type_id: Фильтрация по delivery type ID (optional)
     - delivery_basis_id: Фильтрация по delivery basis ID (optional)
+    - granularity: day, week или month - суммы из таблицы агрегатов вместо отдельных торгов (optional)
+    - limit, cursor: постраничная выдача, курсор следующей страницы - в заголовке X-Next-Cursor (optional)
+    - stream: NDJSON по мере чтения из БД, без сборки всего ответа в памяти (optional)
     """
     if start_date > end_date:
         raise HTTPException(status_code=400, detail="Дата начала должна быть раньше даты конца")
 
-    filters = [
-        TradingResult.trade_date >= start_date,
-        TradingResult.trade_date <= end_date
-    ]
+    paged = limit is not None or cursor is not None
+    if granularity and (paged or stream):
+        raise HTTPException(status_code=400, detail="Постраничная и потоковая выдача - только без granularity")
+
+    if stream:
+        return StreamingResponse(
+            stream_dynamics(start_date, end_date, oil_id, delivery_type_id, delivery_basis_id),
+            media_type="application/x-ndjson"
+        )
+
+    if paged:
+        try:
+            after = decode_cursor(cursor) if cursor else None
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        return await get_dynamics_page(
+            db, start_date, end_date, oil_id, delivery_type_id, delivery_basis_id, limit or DYNAMICS_PAGE_MAX, after
+        )
+
+    return await get_dynamics_range(
+        start_date, end_date, oil_id, delivery_type_id, delivery_basis_id, granularity, db=db
+    )
+
+
+@async_cache_response(response_model=List[TradingResultResponse])
+async def get_dynamics_range(
+        start_date: date,
+        end_date: date,
+        oil_id: Optional[str] = None,
+        delivery_type_id: Optional[str] = None,
+        delivery_basis_id: Optional[str] = None,
+        granularity: Optional[Granularity] = None,
+        db: AsyncSession = Depends(get_db)
+):
+    """Весь период одним ответом - этот вариант кэшируется"""
+    if granularity:
+        return await get_dynamics_aggregates(
+            db, granularity, start_date, end_date, oil_id, delivery_type_id, delivery_basis_id
+        )
+
+    result = await db.execute(
+        dynamics_query(start_date, end_date, oil_id, delivery_type_id, delivery_basis_id)
+    )
+    return rows_to_json(result.all())
+
+
+async def get_dynamics_page(
+        db: AsyncSession,
+        start_date: date,
+        end_date: date,
+        oil_id: Optional[str],
+        delivery_type_id: Optional[str],
+        delivery_basis_id: Optional[str],
+        limit: int,
+        after: Optional[tuple]
+) -> Response:
+    """Одна страница по ключу (trade_date, id); курсор продолжения - в заголовке X-Next-Cursor"""
+    result = await db.execute(dynamics_page_query(
+        start_date, end_date, oil_id, delivery_type_id, delivery_basis_id, limit, after
+    ))
+    rows = result.all()
+    headers = {}
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        headers["X-Next-Cursor"] = encode_cursor(last.trade_date, last.id)
+    return Response(content=rows_to_json(rows), media_type="application/json", headers=headers)
 
-    if oil_id:
-        filters.append(TradingResult.oil_id == oil_id)
-    if delivery_type_id:
-        filters.append(TradingResult.delivery_type_id == delivery_type_id)
-    if delivery_basis_id:
-        filters.append(TradingResult.delivery_basis_id == delivery_basis_id)
 
-    stmt = select(TradingResult).where(and_(*filters)).order_by(TradingResult.trade_date.desc())
-    result = await db.execute(stmt)
-    trading_results = result.scalars().all()
-    return [tr.to_dict() for tr in trading_results]
+async def stream_dynamics(
+        start_date: date,
+        end_date: date,
+        oil_id: Optional[str],
+        delivery_type_id: Optional[str],
+        delivery_basis_id: Optional[str]
+):
+    """
+    Строки из серверного курсора пачками по DYNAMICS_STREAM_BATCH.
+
+    Сессия своя: зависимость get_db закрывается до того, как начнется отправка тела ответа.
+    Сбой посреди выдачи завершает ее строкой {"error": ...}, а не молча обрезанным телом.
+    """
+    try:
+        async with read_session() as session:
+            result = await session.stream(
+                dynamics_query(start_date, end_date, oil_id, delivery_type_id, delivery_basis_id)
+                .execution_options(yield_per=DYNAMICS_STREAM_BATCH)
+            )
+            async for rows in result.partitions():
+                yield rows_to_ndjson(rows)
+    except Exception as e:
+        print(f"Ошибка потоковой выдачи /dynamics/: {str(e)}")
+        yield ndjson_error("Выдача прервана из-за ошибки чтения из БД")
+
+
+async def get_dynamics_aggregates(
+        db: AsyncSession,
+        granularity: Granularity,
+        start_date: date,
+        end_date: date,
+        oil_id: Optional[str],
+        delivery_type_id: Optional[str],
+        delivery_basis_id: Optional[str]
+) -> bytes:
+    """Суммы по дням, неделям или месяцам из trading_daily_aggregates или, при DYNAMICS_BACKEND=duckdb, из Parquet"""
+    if analytics is not None:
+        return await analytics.dynamics_aggregates(
+            granularity, start_date, end_date, oil_id, delivery_type_id, delivery_basis_id
+        )
+
+    result = await db.execute(dynamics_aggregates_query(
+        granularity, start_date, end_date, oil_id, delivery_type_id, delivery_basis_id
+    ))
+    return rows_to_json(result.all())
 
 
 @app.get("/trading-results/", response_model=List[TradingResultResponse])
-@async_cache_response()
+@async_cache_response(response_model=List[TradingResultResponse])
 async def get_trading_results(
         oil_id: Optional[str] = Query(None, description="Фильтрация по oil ID"),
         delivery_type_id: Optional[str] = Query(None, description="Фильтрация по delivery type ID"),
@@ -125,20 +253,32 @@ async def get_trading_results(
     - delivery_basis_id: Фильтрация по delivery basis ID (optional)
     - limit: Количество возвращаемых значений (default: 10, max: 100)
     """
-    filters = []
-
-    if oil_id:
-        filters.append(TradingResult.oil_id == oil_id)
-    if delivery_type_id:
-        filters.append(TradingResult.delivery_type_id == delivery_type_id)
-    if delivery_basis_id:
-        filters.append(TradingResult.delivery_basis_id == delivery_basis_id)
-
-    stmt = select(TradingResult)
-    if filters:
-        stmt = stmt.where(and_(*filters))
-    stmt = stmt.order_by(TradingResult.trade_date.desc()).limit(limit)
-
-    result = await db.execute(stmt)
-    trading_results = result.scalars().all()
-    return [tr.to_dict() for tr in trading_results]
+    result = await db.execute(
+        trading_results_query(oil_id, delivery_type_id, delivery_basis_id, limit)
+    )
+    return rows_to_json(result.all())
+
+
+@app.get("/cache-stats/")
+async def get_cache_statistics():
+    """
+    Попадания и промахи кэша по эндпоинтам с момента запуска процесса.
+    """
+    return get_cache_stats()
+
+
+@app.get("/pool-stats/")
+async def get_pool_statistics():
+    """
+    Состояние пулов соединений с БД (основной сервер и реплики) и время ожидания соединения
+    с момента запуска процесса, отдельно по каждому серверу.
+    """
+    return get_pool_stats()
+
+
+@app.get("/replica-stats/")
+async def get_replica_statistics():
+    """
+    Доступность и отставание реплик для чтения по последней проверке.
+    """
+    return replicas.stats()
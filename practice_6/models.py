@@ -1,13 +1,17 @@
-from sqlalchemy import Column, Integer, String, Numeric, Date
+from sqlalchemy import Column, Integer, String, Numeric, Date, Float, Index, cast, func
 from sqlalchemy.orm import declarative_base
+from practice_6.config import TRADING_RESULTS_PARTITION
 
 Base = declarative_base()
 
+# Поля ответов API в порядке TradingResultResponse - общие для торгов и агрегатов
+API_FIELDS = ('trade_date', 'oil_id', 'delivery_type_id', 'delivery_basis_id', 'volume', 'total', 'count')
+
 
 class TradingResult(Base):
     __tablename__ = 'trading_results'
 
-    id = Column(Integer, primary_key=True)
+    id = Column(Integer, primary_key=True, autoincrement=True)
     exchange_product_id = Column(String(20))
     exchange_product_name = Column(String(255))
     oil_id = Column(String(10))
@@ -17,7 +21,33 @@ class TradingResult(Base):
     volume = Column(Numeric(20, 2))
     total = Column(Numeric(20, 2))
     count = Column(Integer)
-    trade_date = Column(Date)
+    # Ключ секционированной таблицы обязан содержать trade_date
+    trade_date = Column(Date, primary_key=bool(TRADING_RESULTS_PARTITION))
+
+    __table_args__ = (
+        # /last-trading-dates/ и сортировка по дате без фильтров
+        Index('ix_trading_results_trade_date', trade_date.desc()),
+        # Фильтры API по продукту с сортировкой по дате
+        Index(
+            'ix_trading_results_product_trade_date',
+            oil_id, delivery_basis_id, delivery_type_id, trade_date.desc()
+        ),
+        # Секции по месяцам или годам: запросы за период читают только затронутые секции
+        {'postgresql_partition_by': 'RANGE (trade_date)'} if TRADING_RESULTS_PARTITION else {},
+    )
+
+    @classmethod
+    def api_projection(cls) -> list:
+        """Колонки ответа API вместо целой сущности; numeric приводится к float8 в БД"""
+        return [
+            cls.trade_date,
+            cls.oil_id,
+            cls.delivery_type_id,
+            cls.delivery_basis_id,
+            cast(cls.volume, Float).label('volume'),
+            cast(cls.total, Float).label('total'),
+            cls.count
+        ]
 
     def to_dict(self):
         return {
@@ -29,3 +59,36 @@ class TradingResult(Base):
             "total": float(self.total) if self.total else None,
             "count": self.count
         }
+
+
+class TradingDailyAggregate(Base):
+    """Дневные итоги торгов, которые пересчитывают парсеры при загрузке бюллетеней"""
+    __tablename__ = 'trading_daily_aggregates'
+
+    trade_date = Column(Date, primary_key=True)
+    oil_id = Column(String(10), primary_key=True)
+    delivery_basis_id = Column(String(10), primary_key=True)
+    delivery_type_id = Column(String(10), primary_key=True)
+    volume = Column(Numeric(20, 2))
+    total = Column(Numeric(20, 2))
+    count = Column(Integer)
+
+    @classmethod
+    def api_projection(cls, period=None) -> list:
+        """Те же поля ответа API, суммы за период; period - выражение начала периода, по умолчанию день"""
+        return [
+            (cls.trade_date if period is None else period).label('trade_date'),
+            cls.oil_id,
+            cls.delivery_type_id,
+            cls.delivery_basis_id,
+            cast(func.sum(cls.volume), Float).label('volume'),
+            cast(func.sum(cls.total), Float).label('total'),
+            func.sum(cls.count).label('count')
+        ]
+
+
+class TradingDate(Base):
+    """Даты, за которые есть итоги торгов; таблицу ведут парсеры practice_4"""
+    __tablename__ = 'trading_dates'
+
+    trade_date = Column(Date, primary_key=True)
@@ -0,0 +1,161 @@
+import asyncio
+import os
+import threading
+from datetime import date
+from typing import List, Optional, Sequence
+from practice_6.config import DUCKDB_THREADS, DYNAMICS_BACKEND, PARQUET_DIR
+from practice_6.models import API_FIELDS
+from practice_6.queries import Granularity
+
+# Копия trading_results для аналитики: по файлу Parquet на месяц, колонки как в TradingResult.to_dict.
+# pyarrow и duckdb - необязательные зависимости, импортируются только при использовании
+
+
+def month_start(trade_date: date) -> date:
+    return trade_date.replace(day=1)
+
+
+def next_month(month: date) -> date:
+    return date(month.year + month.month // 12, month.month % 12 + 1, 1)
+
+
+def month_path(directory: str, month: date) -> str:
+    return os.path.join(directory, f"trade_month={month:%Y-%m}", "data.parquet")
+
+
+def month_files(directory: str, start_date: date, end_date: date) -> List[str]:
+    """Файлы месяцев, пересекающихся с периодом: остальные DuckDB даже не открывает"""
+    files = []
+    month = month_start(start_date)
+    while month <= end_date:
+        path = month_path(directory, month)
+        if os.path.exists(path):
+            files.append(path)
+        month = next_month(month)
+    return files
+
+
+def parquet_schema():
+    """Колонки в порядке API_FIELDS"""
+    import pyarrow as pa
+    types = {
+        'trade_date': pa.date32(),
+        'oil_id': pa.string(),
+        'delivery_type_id': pa.string(),
+        'delivery_basis_id': pa.string(),
+        'volume': pa.float64(),
+        'total': pa.float64(),
+        'count': pa.int32(),
+    }
+    return pa.schema([(name, types[name]) for name in API_FIELDS])
+
+
+def write_month(directory: str, month: date, rows: Sequence[tuple]) -> str:
+    """
+    Строки api_projection() за месяц в один файл Parquet.
+
+    Сортировка по продукту и дате делает min/max групп строк полезными для фильтров,
+    запись через временный файл - чтобы запросы не увидели файл наполовину.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = parquet_schema()
+    rows = sorted(rows, key=lambda row: (row[1] or '', row[3] or '', row[2] or '', row[0]))
+    table = pa.Table.from_arrays(
+        [pa.array([row[i] for row in rows], type=field.type) for i, field in enumerate(schema)], schema=schema
+    )
+    path = month_path(directory, month)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    pq.write_table(table, path + '.tmp', compression='zstd')
+    os.replace(path + '.tmp', path)
+    return path
+
+
+def aggregates_sql(granularity: Granularity, files: int, oil_id: Optional[str],
+                   delivery_type_id: Optional[str], delivery_basis_id: Optional[str]) -> str:
+    """Те же суммы, что dynamics_aggregates_query в Postgres: период - дата его начала"""
+    if granularity == Granularity.day:
+        period = "trade_date"
+    else:
+        period = f"CAST(date_trunc('{granularity.value}', trade_date) AS DATE)"
+
+    filters = ["trade_date BETWEEN ? AND ?"]
+    for column, value in (('oil_id', oil_id), ('delivery_type_id', delivery_type_id),
+                          ('delivery_basis_id', delivery_basis_id)):
+        if value:
+            filters.append(f"{column} = ?")
+
+    # Значения с двумя знаками после запятой: округление суммы убирает ошибку float
+    grouped = (
+        f"SELECT {period} AS trade_date, oil_id, delivery_type_id, delivery_basis_id, "
+        f"round(sum(volume), 2) AS volume, round(sum(total), 2) AS total, CAST(sum(count) AS INTEGER) AS count "
+        f"FROM read_parquet([{', '.join('?' * files)}]) "
+        f"WHERE {' AND '.join(filters)} "
+        f"GROUP BY ALL"
+    )
+    # JSON собирается в DuckDB: без кортежа Python на каждую строку. Байты те же, что у rows_to_json,
+    # пока значения меньше 1e16: дальше DuckDB пишет 10000000000000000.0, а pydantic - 1e16.
+    # Порядок строк - как в dynamics_aggregates_query
+    fields = ', '.join(f"'{name}', {name}" for name in API_FIELDS)
+    return (
+        f"SELECT '[' || coalesce(string_agg(CAST(json_object({fields}) AS VARCHAR), ',' "
+        f"ORDER BY trade_date DESC, oil_id, delivery_type_id, delivery_basis_id), '') || ']' "
+        f"FROM ({grouped})"
+    )
+
+
+class ParquetAnalytics:
+    """
+    Агрегаты /dynamics/ из файлов Parquet через встроенный DuckDB.
+
+    Запросы идут в пуле потоков, каждый через свой cursor() общей базы в памяти:
+    метаданные файлов и настройки у них общие.
+    """
+
+    def __init__(self, directory: str = PARQUET_DIR, threads: int = DUCKDB_THREADS):
+        self.directory = directory
+        self.threads = threads
+        self._connection = None
+        self._lock = threading.Lock()
+
+    def connect(self):
+        with self._lock:
+            if self._connection is not None:
+                return self._connection
+            try:
+                import duckdb
+            except ImportError as e:
+                raise RuntimeError("DYNAMICS_BACKEND=duckdb требует пакеты duckdb и pyarrow") from e
+            connection = duckdb.connect()
+            connection.execute(f"SET threads = {int(self.threads)}")
+            connection.execute("SET enable_object_cache = true")
+            self._connection = connection
+            return connection
+
+    def aggregates_json(self, granularity: Granularity, start_date: date, end_date: date,
+                        oil_id: Optional[str] = None, delivery_type_id: Optional[str] = None,
+                        delivery_basis_id: Optional[str] = None) -> bytes:
+        """Готовый JSON-ответ со списком сумм, как у rows_to_json"""
+        files = month_files(self.directory, start_date, end_date)
+        if not files:
+            return b'[]'
+        params = [*files, start_date, end_date, *(v for v in (oil_id, delivery_type_id, delivery_basis_id) if v)]
+        sql = aggregates_sql(granularity, len(files), oil_id, delivery_type_id, delivery_basis_id)
+        cursor = self.connect().cursor()
+        try:
+            return cursor.execute(sql, params).fetchone()[0].encode()
+        finally:
+            cursor.close()
+
+    async def dynamics_aggregates(self, *args, **kwargs) -> bytes:
+        return await asyncio.to_thread(self.aggregates_json, *args, **kwargs)
+
+    def close(self):
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+
+# Без DYNAMICS_BACKEND=duckdb агрегаты читаются из trading_daily_aggregates в Postgres
+analytics = ParquetAnalytics() if DYNAMICS_BACKEND == 'duckdb' else None
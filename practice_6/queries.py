@@ -0,0 +1,155 @@
+import base64
+import json
+from datetime import date
+from enum import Enum
+from typing import Iterable, Optional, Tuple
+from pydantic_core import to_json
+from sqlalchemy import Date, and_, cast, func, select, tuple_
+from practice_6.models import API_FIELDS, TradingDailyAggregate, TradingDate, TradingResult
+
+
+class Granularity(str, Enum):
+    day = "day"
+    week = "week"
+    month = "month"
+
+
+def rows_to_json(rows: Iterable[tuple]) -> bytes:
+    """Строки api_projection() сразу в JSON через pydantic-core, без ORM-объектов и модели на каждую строку"""
+    return to_json([dict(zip(API_FIELDS, row)) for row in rows])
+
+
+def rows_to_ndjson(rows: Iterable[tuple]) -> bytes:
+    """Те же строки в NDJSON: по объекту на строку, клиент разбирает их по мере получения"""
+    return b''.join(to_json(dict(zip(API_FIELDS, row))) + b'\n' for row in rows)
+
+
+def ndjson_error(message: str) -> bytes:
+    """Последняя строка NDJSON при сбое: статус 200 уже отправлен, клиент узнает об ошибке по полю error"""
+    return to_json({'error': message}) + b'\n'
+
+
+def encode_cursor(trade_date: date, row_id: int) -> str:
+    """Непрозрачный для клиента курсор: ключ последней отданной строки"""
+    return base64.urlsafe_b64encode(json.dumps([trade_date.isoformat(), row_id]).encode()).decode()
+
+
+def decode_cursor(cursor: str) -> Tuple[date, int]:
+    """Ключ из курсора; ValueError, если курсор поврежден"""
+    try:
+        trade_date, row_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return date.fromisoformat(trade_date), int(row_id)
+    except (TypeError, ValueError, UnicodeDecodeError) as e:
+        raise ValueError(f"Некорректный курсор: {cursor}") from e
+
+
+def product_filters(model, oil_id: Optional[str], delivery_type_id: Optional[str],
+                    delivery_basis_id: Optional[str]) -> list:
+    filters = []
+    if oil_id:
+        filters.append(model.oil_id == oil_id)
+    if delivery_type_id:
+        filters.append(model.delivery_type_id == delivery_type_id)
+    if delivery_basis_id:
+        filters.append(model.delivery_basis_id == delivery_basis_id)
+    return filters
+
+
+def last_trading_dates_query(limit: int):
+    # Обратный проход по первичному ключу маленькой таблицы, без DISTINCT по всем торгам
+    return select(TradingDate.trade_date).order_by(TradingDate.trade_date.desc()).limit(limit)
+
+
+def distinct_trading_dates_query(limit: int):
+    return select(TradingResult.trade_date).distinct().order_by(TradingResult.trade_date.desc()).limit(limit)
+
+
+def dynamics_filters(start_date: date, end_date: date, oil_id: Optional[str] = None,
+                     delivery_type_id: Optional[str] = None, delivery_basis_id: Optional[str] = None) -> list:
+    return [
+        TradingResult.trade_date >= start_date,
+        TradingResult.trade_date <= end_date,
+        *product_filters(TradingResult, oil_id, delivery_type_id, delivery_basis_id)
+    ]
+
+
+def dynamics_query(start_date: date, end_date: date, oil_id: Optional[str] = None,
+                   delivery_type_id: Optional[str] = None, delivery_basis_id: Optional[str] = None):
+    filters = dynamics_filters(start_date, end_date, oil_id, delivery_type_id, delivery_basis_id)
+    return select(*TradingResult.api_projection()).where(and_(*filters)).order_by(TradingResult.trade_date.desc())
+
+
+def dynamics_page_query(start_date: date, end_date: date, oil_id: Optional[str] = None,
+                        delivery_type_id: Optional[str] = None, delivery_basis_id: Optional[str] = None,
+                        limit: int = 100, after: Optional[Tuple[date, int]] = None):
+    """
+    Страница по ключу (trade_date, id) в порядке убывания, без OFFSET.
+
+    Выбирается limit + 1 строка - лишняя показывает, что есть следующая страница.
+    id идет последней колонкой после api_projection().
+    """
+    filters = dynamics_filters(start_date, end_date, oil_id, delivery_type_id, delivery_basis_id)
+    if after:
+        # Отдельное условие по дате позволяет планировщику ограничить диапазон индекса
+        filters.append(TradingResult.trade_date <= after[0])
+        filters.append(tuple_(TradingResult.trade_date, TradingResult.id) < tuple_(*after))
+    return (
+        select(*TradingResult.api_projection(), TradingResult.id)
+        .where(and_(*filters))
+        .order_by(TradingResult.trade_date.desc(), TradingResult.id.desc())
+        .limit(limit + 1)
+    )
+
+
+def dynamics_aggregates_query(granularity: Granularity, start_date: date, end_date: date,
+                              oil_id: Optional[str] = None, delivery_type_id: Optional[str] = None,
+                              delivery_basis_id: Optional[str] = None):
+    """Суммы по дням, неделям или месяцам из trading_daily_aggregates"""
+    agg = TradingDailyAggregate
+    filters = [
+        agg.trade_date >= start_date,
+        agg.trade_date <= end_date,
+        *product_filters(agg, oil_id, delivery_type_id, delivery_basis_id)
+    ]
+
+    # Период обозначается датой его начала: понедельник недели или первое число месяца
+    if granularity == Granularity.day:
+        period = None
+    else:
+        period = cast(func.date_trunc(granularity.value, agg.trade_date), Date)
+    columns = agg.api_projection(period)
+    keys = columns[:4]
+
+    return (
+        select(*columns)
+        .where(and_(*filters))
+        .group_by(*keys)
+        # Порядок строк с одной датой тот же, что у DuckDB в parquet_store.aggregates_sql
+        .order_by(keys[0].desc(), *keys[1:])
+    )
+
+
+def trading_results_query(oil_id: Optional[str] = None, delivery_type_id: Optional[str] = None,
+                          delivery_basis_id: Optional[str] = None, limit: int = 10):
+    filters = product_filters(TradingResult, oil_id, delivery_type_id, delivery_basis_id)
+    stmt = select(*TradingResult.api_projection())
+    if filters:
+        stmt = stmt.where(and_(*filters))
+    return stmt.order_by(TradingResult.trade_date.desc()).limit(limit)
+
+
+def trading_months_query(since: Optional[date] = None):
+    """Первые числа месяцев, за которые есть торги - для выгрузки в Parquet"""
+    month = cast(func.date_trunc('month', TradingDate.trade_date), Date).label('month')
+    stmt = select(month).distinct()
+    if since:
+        stmt = stmt.where(TradingDate.trade_date >= since)
+    return stmt.order_by(month)
+
+
+def export_rows_query(start_date: date, end_date: date):
+    """Строки за полуинтервал [start_date, end_date) в колонках ответа API"""
+    return select(*TradingResult.api_projection()).where(
+        TradingResult.trade_date >= start_date,
+        TradingResult.trade_date < end_date
+    )
@@ -1,10 +1,73 @@
+import asyncio
+from collections import Counter
 from functools import wraps
+import gzip
+import hashlib
+import inspect
 import json
+import secrets
+import time
 from datetime import datetime, timedelta, date
-import redis
-from practice_6.config import REDIS_URL
+from typing import Dict, List, Optional
+from fastapi import params
+from fastapi.responses import Response
+from pydantic import TypeAdapter
+from pydantic.fields import FieldInfo
+import redis.asyncio as redis
+from redis.exceptions import RedisError
+from practice_6.config import (
+    REDIS_URL, REDIS_POOL_SIZE, REDIS_SOCKET_TIMEOUT, REDIS_CONNECT_TIMEOUT,
+    LOCAL_CACHE_ENABLED, LOCAL_CACHE_MAX_ENTRIES, LOCAL_CACHE_MAX_MB,
+    SINGLE_FLIGHT_LOCK_MS, SINGLE_FLIGHT_POLL_MS, ACCESS_FLUSH_SECONDS, POPULAR_KEYS_KEEP,
+    CACHE_COMPRESS_MIN_BYTES, CACHE_COMPRESS_LEVEL
+)
+from practice_6.local_cache import LocalCache
 
-redis_client = redis.Redis.from_url(REDIS_URL)
+# Клиент создается в lifespan приложения, вне его - при первом обращении
+redis_client: Optional[redis.Redis] = None
+_client_loop: Optional[asyncio.AbstractEventLoop] = None
+
+# Локальный уровень: готовые ответы в памяти процесса, сбрасывается сообщениями из Redis
+local_cache = LocalCache(LOCAL_CACHE_MAX_ENTRIES, LOCAL_CACHE_MAX_MB * 1024 * 1024)
+INVALIDATION_CHANNEL = 'cache:invalidate'
+
+# Частота обращений к ключам: копится в памяти и периодически переносится в Redis
+POPULAR_KEYS_PREFIX = 'cache:popular'
+_access_counts: Counter = Counter()
+
+# Кэшируемые функции по имени - для прогрева кэша: (функция, срок до 14:11, сериализатор)
+cached_endpoints: Dict[str, tuple] = {}
+
+_background_tasks: List[asyncio.Task] = []
+
+
+def init_redis() -> redis.Redis:
+    """Общий пул соединений: запросы не открывают новое соединение к Redis"""
+    global redis_client, _client_loop
+    pool = redis.ConnectionPool.from_url(
+        REDIS_URL,
+        max_connections=REDIS_POOL_SIZE,
+        socket_timeout=REDIS_SOCKET_TIMEOUT,
+        socket_connect_timeout=REDIS_CONNECT_TIMEOUT
+    )
+    redis_client = redis.Redis(connection_pool=pool)
+    _client_loop = asyncio.get_running_loop()
+    return redis_client
+
+
+async def close_redis():
+    global redis_client, _client_loop
+    await stop_background_tasks()
+    if redis_client is not None:
+        await redis_client.aclose(close_connection_pool=True)
+        redis_client, _client_loop = None, None
+
+
+def get_redis() -> redis.Redis:
+    # Соединения пула привязаны к циклу событий, в котором созданы
+    if redis_client is None or _client_loop is not asyncio.get_running_loop():
+        return init_redis()
+    return redis_client
 
 
 class DateTimeEncoder(json.JSONEncoder):
@@ -14,39 +77,384 @@ class DateTimeEncoder(json.JSONEncoder):
         return super().default(obj)
 
 
-def async_cache_response(expire_at_14_11=True):
+# Меняется при изменении формата ответов - старые записи кэша перестают читаться
+CACHE_SCHEMA_VERSION = 2
+
+# Сжатые значения отличаются от JSON по сигнатуре gzip в начале
+GZIP_MAGIC = b'\x1f\x8b'
+
+# Попадания и промахи кэша по функциям, в пределах процесса
+cache_stats: Dict[str, Counter] = {}
+
+
+def cache_params(func, args: tuple, kwargs: dict) -> str:
+    """
+    Параметры вызова в каноническом JSON - из них строится ключ кэша.
+
+    Аргументы привязываются к сигнатуре функции, недостающие заполняются значениями по умолчанию,
+    зависимости (Depends: сессия БД и т.п.) отбрасываются.
+    """
+    signature = inspect.signature(func)
+    bound = signature.bind_partial(*args, **kwargs)
+    bound.apply_defaults()
+
+    key_params = {}
+    for name, value in bound.arguments.items():
+        parameter = signature.parameters[name]
+        if isinstance(parameter.default, params.Depends):
+            continue
+        # При прямом вызове по умолчанию подставляется Query(...) - берем его значение
+        if isinstance(value, FieldInfo):
+            value = value.default
+        if parameter.kind == inspect.Parameter.VAR_KEYWORD:
+            key_params.update(value)
+        else:
+            key_params[name] = value
+
+    return json.dumps(key_params, cls=DateTimeEncoder, sort_keys=True, separators=(',', ':'))
+
+
+def cache_key_for(func_name: str, canonical: str) -> str:
+    digest = hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+    return f"cache:v{CACHE_SCHEMA_VERSION}:{func_name}:{digest}"
+
+
+def build_cache_key(func, args: tuple, kwargs: dict) -> str:
+    """Ключ кэша по значениям параметров, а не по их repr"""
+    return cache_key_for(func.__name__, cache_params(func, args, kwargs))
+
+
+def cache_prefix(func_name: str = '') -> str:
+    return f"cache:v{CACHE_SCHEMA_VERSION}:{func_name + ':' if func_name else ''}"
+
+
+async def clear_cache(func_name: str = '') -> int:
+    """Удаление записей кэша одной функции или всех сразу - в Redis и в памяти всех процессов"""
+    local_cache.invalidate(cache_prefix(func_name))
+    deleted = 0
+    client = get_redis()
+    async for key in client.scan_iter(match=f"{cache_prefix(func_name)}*", count=500):
+        deleted += await client.unlink(key)
+    await client.publish(INVALIDATION_CHANNEL, func_name)
+    return deleted
+
+
+async def listen_invalidations():
+    """Сброс локального уровня по сообщениям clear_cache из других процессов"""
+    while True:
+        try:
+            pubsub = get_redis().pubsub(ignore_subscribe_messages=True)
+            await pubsub.subscribe(INVALIDATION_CHANNEL)
+            try:
+                while True:
+                    message = await pubsub.get_message(timeout=1.0)
+                    if message:
+                        local_cache.invalidate(cache_prefix(message['data'].decode()))
+            finally:
+                await pubsub.aclose()
+        except RedisError as e:
+            # Пока подписки нет, сообщения теряются - локальным записям верить нельзя
+            print(f"Ошибка подписки на сброс кэша: {str(e)}")
+            local_cache.clear()
+            await asyncio.sleep(1)
+
+
+def record_access(func_name: str, canonical: str):
+    _access_counts[(func_name, canonical)] += 1
+
+
+async def flush_access_counts():
+    """Перенос счетчиков обращений в Redis: одна отсортированная пачка на функцию"""
+    if not _access_counts:
+        return
+    counts = dict(_access_counts)
+    _access_counts.clear()
+    try:
+        pipe = get_redis().pipeline(transaction=False)
+        for (func_name, canonical), count in counts.items():
+            pipe.zincrby(f"{POPULAR_KEYS_PREFIX}:{func_name}", count, canonical)
+        # Храним только самые частые наборы параметров
+        for func_name in {func_name for func_name, _ in counts}:
+            pipe.zremrangebyrank(f"{POPULAR_KEYS_PREFIX}:{func_name}", 0, -POPULAR_KEYS_KEEP - 1)
+        await pipe.execute()
+    except RedisError as e:
+        print(f"Ошибка записи статистики обращений: {str(e)}")
+
+
+async def flush_access_counts_periodically():
+    try:
+        while True:
+            await asyncio.sleep(ACCESS_FLUSH_SECONDS)
+            await flush_access_counts()
+    finally:
+        await flush_access_counts()
+
+
+async def popular_params(func_name: str, limit: int) -> List[str]:
+    """Наборы параметров функции, к которым обращаются чаще всего"""
+    members = await get_redis().zrevrange(f"{POPULAR_KEYS_PREFIX}:{func_name}", 0, limit - 1)
+    return [member.decode() for member in members]
+
+
+def start_background_task(coro):
+    _background_tasks.append(asyncio.create_task(coro))
+
+
+def start_cache_tasks():
+    if LOCAL_CACHE_ENABLED:
+        start_background_task(listen_invalidations())
+    start_background_task(flush_access_counts_periodically())
+
+
+async def stop_background_tasks():
+    for task in _background_tasks:
+        task.cancel()
+    for task in _background_tasks:
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+    _background_tasks.clear()
+
+
+def count_cache(func_name: str, outcome: str):
+    cache_stats.setdefault(func_name, Counter())[outcome] += 1
+
+
+def get_cache_stats() -> Dict[str, dict]:
+    stats = {}
+    for func_name, counter in cache_stats.items():
+        hits = counter['local_hits'] + counter['hits']
+        total = hits + counter['misses'] + counter['coalesced']
+        stats[func_name] = {
+            'hits': counter['hits'],
+            'local_hits': counter['local_hits'],
+            'misses': counter['misses'],
+            'coalesced': counter['coalesced'],
+            'hit_rate': round(hits / total, 4) if total else 0.0
+        }
+    return stats
+
+
+def response_serializer(response_model=None):
+    """
+    Функция, превращающая результат эндпоинта в тело ответа.
+
+    С моделью ответа тело получается таким же, как у FastAPI: проверка и сериализация через pydantic.
+    Эндпоинт может сам вернуть готовый JSON в байтах - он кэшируется как есть.
+    """
+    if response_model is None:
+        return lambda result: json.dumps(result, cls=DateTimeEncoder).encode('utf-8')
+    adapter = TypeAdapter(response_model)
+
+    def serialize(result) -> bytes:
+        if isinstance(result, bytes):
+            return result
+        return adapter.dump_json(adapter.validate_python(result, from_attributes=True))
+
+    return serialize
+
+
+def pack_value(value: bytes) -> bytes:
+    # Большие ответы храним сжатыми: меньше памяти Redis и трафика
+    if CACHE_COMPRESS_MIN_BYTES and len(value) >= CACHE_COMPRESS_MIN_BYTES:
+        return gzip.compress(value, compresslevel=CACHE_COMPRESS_LEVEL, mtime=0)
+    return value
+
+
+def unpack_value(value: Optional[bytes]) -> Optional[bytes]:
+    if value and value.startswith(GZIP_MAGIC):
+        return gzip.decompress(value)
+    return value
+
+
+async def cache_get(cache_key: str) -> Optional[bytes]:
+    # Недоступный Redis не должен ронять запрос - идем в БД
+    try:
+        return unpack_value(await get_redis().get(cache_key))
+    except RedisError as e:
+        print(f"Ошибка чтения кэша {cache_key}: {str(e)}")
+        return None
+
+
+async def cache_set(cache_key: str, value: bytes, expire_seconds: Optional[int] = None):
+    value = pack_value(value)
+    try:
+        if expire_seconds is None:
+            await get_redis().set(cache_key, value)
+        else:
+            await get_redis().setex(cache_key, expire_seconds, value)
+    except RedisError as e:
+        print(f"Ошибка записи кэша {cache_key}: {str(e)}")
+
+
+# Вычисления, которые уже идут в этом процессе: ключ кэша -> будущий результат
+_inflight: Dict[str, asyncio.Future] = {}
+
+RELEASE_LOCK_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+
+class _LeaderCancelled(Exception):
+    """Запрос, который считал значение, отменен - ожидающие не отменены и считают сами"""
+
+
+async def single_flight(cache_key: str, compute):
+    """Один вычислитель на ключ в процессе, остальные получают его результат или исключение"""
+    while True:
+        future = _inflight.get(cache_key)
+        if future is None:
+            break
+        try:
+            return await asyncio.shield(future)
+        except _LeaderCancelled:
+            # Первый проснувшийся станет новым вычислителем, остальные дождутся его
+            continue
+
+    future = asyncio.get_running_loop().create_future()
+    _inflight[cache_key] = future
+    try:
+        result = await compute()
+        future.set_result(result)
+        return result
+    except asyncio.CancelledError:
+        # future.cancel() отменил бы и всех ожидающих, хотя отменен только этот запрос
+        future.set_exception(_LeaderCancelled())
+        future.exception()
+        raise
+    except Exception as e:
+        future.set_exception(e)
+        # Ожидающих может не быть - помечаем исключение полученным, чтобы asyncio не ругался
+        future.exception()
+        raise
+    finally:
+        _inflight.pop(cache_key, None)
+
+
+async def acquire_lock(cache_key: str, px: int = SINGLE_FLIGHT_LOCK_MS) -> Optional[str]:
+    """
+    Блокировка вычисления ключа между процессами: SET NX PX, по умолчанию на SINGLE_FLIGHT_LOCK_MS.
+
+    Возвращает токен владельца, None - если блокировку держит другой процесс,
+    пустую строку - если Redis недоступен и считать придется без блокировки.
+    """
+    token = secrets.token_hex(8)
+    try:
+        acquired = await get_redis().set(f"lock:{cache_key}", token, nx=True, px=px)
+    except RedisError as e:
+        print(f"Ошибка блокировки {cache_key}: {str(e)}")
+        return ''
+    return token if acquired else None
+
+
+async def release_lock(cache_key: str, token: str):
+    if not token:
+        return
+    try:
+        # Снимаем только свою блокировку: чужая могла появиться после истечения нашей
+        await get_redis().eval(RELEASE_LOCK_SCRIPT, 1, f"lock:{cache_key}", token)
+    except RedisError as e:
+        print(f"Ошибка снятия блокировки {cache_key}: {str(e)}")
+
+
+async def wait_for_cache(cache_key: str) -> Optional[bytes]:
+    """Ожидание значения, которое считает другой процесс, не дольше срока его блокировки"""
+    deadline = time.monotonic() + SINGLE_FLIGHT_LOCK_MS / 1000
+    while time.monotonic() < deadline:
+        await asyncio.sleep(SINGLE_FLIGHT_POLL_MS / 1000)
+        cached_data = await cache_get(cache_key)
+        if cached_data:
+            return cached_data
+        try:
+            # Блокировки нет, а значения тоже нет - владелец завершился ошибкой
+            if not await get_redis().exists(f"lock:{cache_key}"):
+                return None
+        except RedisError:
+            return None
+    return None
+
+
+def cache_expire_seconds(expire_at_14_11: bool) -> Optional[float]:
+    """Секунды до ближайших 14:11 - времени публикации новых итогов торгов"""
+    if not expire_at_14_11:
+        return None
+    now = datetime.now()
+    today_14_11 = datetime(now.year, now.month, now.day, 14, 11)
+    if now < today_14_11:
+        return (today_14_11 - now).total_seconds()
+    tomorrow_14_11 = today_14_11 + timedelta(days=1)
+    return (tomorrow_14_11 - now).total_seconds()
+
+
+def async_cache_response(expire_at_14_11=True, use_local=LOCAL_CACHE_ENABLED, response_model=None):
+    """
+    Кэширование ответа эндпоинта в памяти процесса и в Redis.
+
+    С response_model в кэше лежит готовое тело ответа, и оно отдается как Response:
+    FastAPI не проверяет и не сериализует его повторно на каждом попадании.
+    """
+    serialize = response_serializer(response_model)
+
+    def respond(data: bytes):
+        if response_model is None:
+            return json.loads(data)
+        return Response(content=data, media_type='application/json')
+
     def decorator(func):
+        cached_endpoints[func.__name__] = (func, expire_at_14_11, serialize)
+
         @wraps(func)
         async def wrapper(*args, **kwargs):
-            cache_key = f"{func.__name__}:{str(args)}:{str(kwargs)}"
-            now = datetime.now()
-            if expire_at_14_11:
-                today_14_11 = datetime(now.year, now.month, now.day, 14, 11)
-                if now < today_14_11:
-                    expire_seconds = (today_14_11 - now).total_seconds()
-                else:
-                    tomorrow_14_11 = today_14_11 + timedelta(days=1)
-                    expire_seconds = (tomorrow_14_11 - now).total_seconds()
-                cached_data = redis_client.get(cache_key)
-                if cached_data:
-                    return json.loads(cached_data)
-                result = await func(*args, **kwargs)
-                redis_client.setex(
-                    cache_key,
-                    int(expire_seconds),
-                    json.dumps(result, cls=DateTimeEncoder)
-                )
-                return result
-            else:
-                cached_data = redis_client.get(cache_key)
-                if cached_data:
-                    return json.loads(cached_data)
-                result = await func(*args, **kwargs)
-                redis_client.set(
-                    cache_key,
-                    json.dumps(result, cls=DateTimeEncoder)
-                )
-                return result
+            canonical = cache_params(func, args, kwargs)
+            cache_key = cache_key_for(func.__name__, canonical)
+            record_access(func.__name__, canonical)
+            expire_seconds = cache_expire_seconds(expire_at_14_11)
+
+            # Сначала память процесса, затем Redis; срок жизни в обоих уровнях один - до 14:11
+            cached_data = local_cache.get(cache_key) if use_local else None
+            if cached_data:
+                count_cache(func.__name__, 'local_hits')
+                return respond(cached_data)
+
+            cached_data = await cache_get(cache_key)
+            if cached_data:
+                count_cache(func.__name__, 'hits')
+                if use_local:
+                    local_cache.set(cache_key, cached_data, expire_seconds)
+                return respond(cached_data)
+
+            async def compute() -> bytes:
+                token = await acquire_lock(cache_key)
+                if token is None:
+                    cached_data = await wait_for_cache(cache_key)
+                    if cached_data:
+                        count_cache(func.__name__, 'coalesced')
+                        if use_local:
+                            local_cache.set(cache_key, cached_data, expire_seconds)
+                        return cached_data
+
+                try:
+                    count_cache(func.__name__, 'misses')
+                    data = serialize(await func(*args, **kwargs))
+                    await cache_set(
+                        cache_key,
+                        data,
+                        int(expire_seconds) if expire_seconds is not None else None
+                    )
+                    if use_local:
+                        local_cache.set(cache_key, data, expire_seconds)
+                    return data
+                finally:
+                    await release_lock(cache_key, token)
+
+            # Промах: запросы с тем же ключом не идут в БД параллельно, а ждут первого
+            if cache_key in _inflight:
+                count_cache(func.__name__, 'coalesced')
+            return respond(await single_flight(cache_key, compute))
 
         return wrapper
 
@@ -39,6 +39,48 @@ document.addEventListener('DOMContentLoaded', function() {
         return new Date(dateStr).toLocaleDateString();
     }
 
+    // Ranges longer than this are streamed as NDJSON; shorter ones use the cached full response
+    const STREAM_MIN_DAYS = 92;
+
+    function dynamicsRows(results) {
+        return results.map(result => `
+            <tr>
+                <td>${formatDate(result.trade_date)}</td>
+                <td>${result.oil_id}</td>
+                <td>${result.delivery_type_id}</td>
+                <td>${result.delivery_basis_id}</td>
+                <td>${result.volume?.toFixed(2) || '-'}</td>
+                <td>${result.total?.toFixed(2) || '-'}</td>
+                <td>${result.count}</td>
+            </tr>
+        `).join('');
+    }
+
+    // Read an NDJSON stream, passing each batch of rows to onRows; returns the row count.
+    // A line with an "error" field means the server aborted the stream after sending 200
+    async function readNdjson(response, onRows) {
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+        let total = 0;
+        while (true) {
+            const { done, value } = await reader.read();
+            buffer += decoder.decode(value || new Uint8Array(), { stream: !done });
+            const lines = buffer.split('\n');
+            buffer = done ? '' : lines.pop();
+            const results = lines.filter(line => line.trim()).map(line => JSON.parse(line));
+            const failed = results.find(result => result.error);
+            if (failed) {
+                throw new Error(failed.error);
+            }
+            if (results.length) {
+                onRows(results);
+                total += results.length;
+            }
+            if (done) return total;
+        }
+    }
+
     // Fetch last trading dates
     document.getElementById('fetchDates').addEventListener('click', async function() {
         const button = this;
@@ -84,7 +126,10 @@ document.addEventListener('DOMContentLoaded', function() {
         }
 
         try {
+            const rangeDays = (new Date(endDate) - new Date(startDate)) / 86400000;
+            const stream = rangeDays > STREAM_MIN_DAYS;
             let url = `/dynamics/?start_date=${startDate}&end_date=${endDate}`;
+            if (stream) url += '&stream=true';
             if (oilId) url += `&oil_id=${oilId}`;
             if (deliveryType) url += `&delivery_type_id=${deliveryType}`;
             if (deliveryBasis) url += `&delivery_basis_id=${deliveryBasis}`;
@@ -93,15 +138,9 @@ document.addEventListener('DOMContentLoaded', function() {
             if (!response.ok) {
                 throw new Error(`Ошибка HTTP! Статус: ${response.status}`);
             }
-            const results = await response.json();
-
-            if (results.length === 0) {
-                resultDiv.innerHTML = '<div class="alert alert-info">Не найдено результатов по заданным критериям</div>';
-                return;
-            }
 
             resultDiv.innerHTML = `
-                <h5>Results (${results.length} records):</h5>
+                <h5>Results (<span id="dynamicsCount">0</span> records):</h5>
                 <table class="table table-striped table-hover">
                     <thead>
                         <tr>
@@ -114,21 +153,29 @@ document.addEventListener('DOMContentLoaded', function() {
                             <th>Count</th>
                         </tr>
                     </thead>
-                    <tbody>
-                        ${results.map(result => `
-                            <tr>
-                                <td>${formatDate(result.trade_date)}</td>
-                                <td>${result.oil_id}</td>
-                                <td>${result.delivery_type_id}</td>
-                                <td>${result.delivery_basis_id}</td>
-                                <td>${result.volume?.toFixed(2) || '-'}</td>
-                                <td>${result.total?.toFixed(2) || '-'}</td>
-                                <td>${result.count}</td>
-                            </tr>
-                        `).join('')}
-                    </tbody>
+                    <tbody id="dynamicsRows"></tbody>
                 </table>
             `;
+            const tbody = document.getElementById('dynamicsRows');
+            const counter = document.getElementById('dynamicsCount');
+
+            let total = 0;
+            if (stream) {
+                // NDJSON stream: render each batch of rows as soon as it arrives
+                total = await readNdjson(response, results => {
+                    tbody.insertAdjacentHTML('beforeend', dynamicsRows(results));
+                    counter.textContent = Number(counter.textContent) + results.length;
+                });
+            } else {
+                const results = await response.json();
+                tbody.innerHTML = dynamicsRows(results);
+                counter.textContent = results.length;
+                total = results.length;
+            }
+
+            if (total === 0) {
+                resultDiv.innerHTML = '<div class="alert alert-info">Не найдено результатов по заданным критериям</div>';
+            }
         } catch (error) {
             showError('dynamicsResult', `Ошибка отображения данных: ${error.message}`);
         } finally {
@@ -7,12 +7,18 @@ import json
 
 from practice_6.main import app
 from practice_6.models import TradingResult
-from practice_6.database import get_db
+from practice_6.database import get_db, get_fresh_db
+from practice_6.redis_file import clear_cache
+from practice_6.trading_dates import trading_dates
 
 
 @pytest.fixture
 def client():
-    return TestClient(app)
+    # С lifespan все запросы идут в одном цикле событий вместе с пулом Redis
+    with patch('practice_6.main.async_engine'), TestClient(app) as client:
+        client.portal.call(clear_cache)
+        trading_dates.clear()
+        yield client
 
 
 @pytest.fixture
@@ -34,6 +40,7 @@ def override_get_db(mock_db_session):
         yield mock_db_session
 
     app.dependency_overrides[get_db] = _override_get_db
+    app.dependency_overrides[get_fresh_db] = _override_get_db
     yield
     app.dependency_overrides.clear()
 
@@ -64,6 +71,15 @@ def sample_trading_results():
     ]
 
 
+@pytest.fixture
+def sample_result_rows(sample_trading_results):
+    # Строки выборки TradingResult.api_projection(): numeric уже приведен к float в БД
+    return [
+        (tr.trade_date, tr.oil_id, tr.delivery_type_id, tr.delivery_basis_id, tr.volume, tr.total, tr.count)
+        for tr in sample_trading_results
+    ]
+
+
 @pytest.fixture
 def sample_trading_dates():
     return [date(2023, 1, 1), date(2023, 1, 2)]
\ No newline at end of file
@@ -1,6 +1,11 @@
+import json
+from collections import namedtuple
+from datetime import date
+from unittest.mock import AsyncMock, MagicMock, patch
 import pytest
 from fastapi import status
-from datetime import date
+from practice_6.models import API_FIELDS
+from practice_6.queries import decode_cursor, encode_cursor
 
 
 class TestRootEndpoint:
@@ -35,11 +40,40 @@ class TestLastTradingDatesEndpoint:
         assert response.status_code == expected_status
 
 
+class TestCache:
+    def test_repeated_request_served_from_cache(
+            self, client, mock_db_session, sample_result_rows, override_get_db
+    ):
+        mock_db_session.execute.return_value.all.return_value = [sample_result_rows[0]]
+
+        first = client.get("/trading-results/?limit=1")
+        second = client.get("/trading-results/?limit=1")
+
+        assert first.json() == second.json()
+        assert mock_db_session.execute.call_count == 1
+
+    def test_cache_stats(self, client, override_get_db):
+        response = client.get("/cache-stats/")
+
+        assert response.status_code == status.HTTP_200_OK
+        assert isinstance(response.json(), dict)
+
+
+class TestPoolStats:
+    def test_pool_stats(self, client):
+        response = client.get("/pool-stats/")
+
+        assert response.status_code == status.HTTP_200_OK
+        primary = response.json()[0]
+        assert primary["role"] == "primary"
+        assert {"host", "size", "checked_out", "checkouts", "timeouts", "wait_ms_avg", "wait_ms_max"} <= primary.keys()
+
+
 class TestDynamicsEndpoint:
     def test_get_dynamics_success(
-            self, client, mock_db_session, sample_trading_results, override_get_db
+            self, client, mock_db_session, sample_result_rows, override_get_db
     ):
-        mock_db_session.execute.return_value.scalars.return_value.all.return_value = sample_trading_results
+        mock_db_session.execute.return_value.all.return_value = sample_result_rows
 
         response = client.get(
             "/dynamics/?start_date=2023-01-01&end_date=2023-01-02"
@@ -49,11 +83,9 @@ class TestDynamicsEndpoint:
         assert len(response.json()) == 2
 
     def test_get_dynamics_with_filters(
-            self, client, mock_db_session, sample_trading_results, override_get_db
+            self, client, mock_db_session, sample_result_rows, override_get_db
     ):
-        mock_db_session.execute.return_value.scalars.return_value.all.return_value = [
-            sample_trading_results[0]
-        ]
+        mock_db_session.execute.return_value.all.return_value = [sample_result_rows[0]]
 
         response = client.get(
             "/dynamics/?start_date=2023-01-01&end_date=2023-01-02"
@@ -71,24 +103,152 @@ class TestDynamicsEndpoint:
         assert response.status_code == status.HTTP_400_BAD_REQUEST
         assert "Дата начала должна быть раньше даты конца" in response.text
 
+    def test_get_dynamics_aggregated(self, client, mock_db_session, override_get_db):
+        mock_db_session.execute.return_value.all.return_value = [
+            (date(2023, 1, 2), "OIL1", "DT1", "DB1", 300.5, 15000.25, 30)
+        ]
+
+        response = client.get(
+            "/dynamics/?start_date=2023-01-01&end_date=2023-01-31&granularity=week"
+        )
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.json() == [{
+            "trade_date": "2023-01-02",
+            "oil_id": "OIL1",
+            "delivery_type_id": "DT1",
+            "delivery_basis_id": "DB1",
+            "volume": 300.5,
+            "total": 15000.25,
+            "count": 30
+        }]
+
+    def test_get_dynamics_aggregated_from_parquet(self, client, mock_db_session, override_get_db):
+        analytics = MagicMock()
+        analytics.dynamics_aggregates = AsyncMock(return_value=b'[{"trade_date":"2023-01-01"}]')
+
+        with patch('practice_6.main.analytics', analytics):
+            response = client.get(
+                "/dynamics/?start_date=2023-01-01&end_date=2023-12-31&granularity=month&oil_id=OIL1"
+            )
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.content == b'[{"trade_date":"2023-01-01"}]'
+        args = analytics.dynamics_aggregates.call_args.args
+        assert args[:4] == ("month", date(2023, 1, 1), date(2023, 12, 31), "OIL1")
+        mock_db_session.execute.assert_not_called()
+
+    def test_get_dynamics_page_returns_next_cursor(
+            self, client, mock_db_session, sample_result_rows, override_get_db
+    ):
+        # Страница из одной строки: запрашивается на одну больше, вторая строка - признак продолжения
+        PageRow = namedtuple("PageRow", API_FIELDS + ("id",))
+        mock_db_session.execute.return_value.all.return_value = [
+            PageRow(*row, i) for i, row in enumerate(sample_result_rows, start=1)
+        ]
+
+        response = client.get("/dynamics/?start_date=2023-01-01&end_date=2023-01-02&limit=1")
+
+        assert response.status_code == status.HTTP_200_OK
+        assert len(response.json()) == 1
+        assert decode_cursor(response.headers["X-Next-Cursor"]) == (date(2023, 1, 1), 1)
+
+    def test_get_dynamics_last_page_has_no_cursor(
+            self, client, mock_db_session, sample_result_rows, override_get_db
+    ):
+        mock_db_session.execute.return_value.all.return_value = sample_result_rows
+
+        cursor = encode_cursor(date(2023, 1, 3), 10)
+        response = client.get(f"/dynamics/?start_date=2023-01-01&end_date=2023-01-02&limit=5&cursor={cursor}")
+
+        assert response.status_code == status.HTTP_200_OK
+        assert len(response.json()) == 2
+        assert "X-Next-Cursor" not in response.headers
+
+    def test_get_dynamics_invalid_cursor(self, client, override_get_db):
+        response = client.get("/dynamics/?start_date=2023-01-01&end_date=2023-01-02&cursor=broken")
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    def test_get_dynamics_stream(self, client, sample_result_rows, override_get_db):
+        async def partitions():
+            yield sample_result_rows[:1]
+            yield sample_result_rows[1:]
+
+        session = AsyncMock()
+        session.stream.return_value = MagicMock(partitions=partitions)
+        session_factory = MagicMock()
+        session_factory.return_value.__aenter__.return_value = session
+
+        with patch('practice_6.main.read_session', session_factory):
+            response = client.get("/dynamics/?start_date=2023-01-01&end_date=2023-01-02&stream=true")
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.headers["content-type"] == "application/x-ndjson"
+        lines = [json.loads(line) for line in response.text.splitlines()]
+        assert [line["oil_id"] for line in lines] == ["OIL1", "OIL2"]
+
+    def test_get_dynamics_stream_error_ends_with_error_line(self, client, sample_result_rows, override_get_db):
+        async def partitions():
+            yield sample_result_rows[:1]
+            raise OSError("connection reset")
+
+        session = AsyncMock()
+        session.stream.return_value = MagicMock(partitions=partitions)
+        session_factory = MagicMock()
+        session_factory.return_value.__aenter__.return_value = session
+
+        with patch('practice_6.main.read_session', session_factory):
+            response = client.get("/dynamics/?start_date=2023-01-01&end_date=2023-01-02&stream=true")
+
+        assert response.status_code == status.HTTP_200_OK
+        lines = [json.loads(line) for line in response.text.splitlines()]
+        assert lines[0]["oil_id"] == "OIL1"
+        assert set(lines[-1]) == {"error"}
+
+    def test_get_dynamics_stream_with_granularity(self, client, override_get_db):
+        response = client.get(
+            "/dynamics/?start_date=2023-01-01&end_date=2023-01-31&granularity=week&stream=true"
+        )
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    def test_get_dynamics_invalid_granularity(self, client, override_get_db):
+        response = client.get(
+            "/dynamics/?start_date=2023-01-01&end_date=2023-01-31&granularity=year"
+        )
+
+        assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
 
 class TestTradingResultsEndpoint:
     def test_get_trading_results_success(
-            self, client, mock_db_session, sample_trading_results, override_get_db
+            self, client, mock_db_session, sample_result_rows, override_get_db
     ):
-        mock_db_session.execute.return_value.scalars.return_value.all.return_value = sample_trading_results
+        mock_db_session.execute.return_value.all.return_value = sample_result_rows
 
         response = client.get("/trading-results/?limit=2")
 
         assert response.status_code == status.HTTP_200_OK
         assert len(response.json()) == 2
 
+    def test_get_trading_results_body_matches_schema(
+            self, client, mock_db_session, sample_result_rows, override_get_db
+    ):
+        mock_db_session.execute.return_value.all.return_value = [sample_result_rows[0]]
+
+        response = client.get("/trading-results/?limit=1")
+
+        assert response.headers["content-type"] == "application/json"
+        assert response.content == (
+            b'[{"trade_date":"2023-01-01","oil_id":"OIL1","delivery_type_id":"DT1","delivery_basis_id":"DB1",'
+            b'"volume":100.5,"total":5000.25,"count":10}]'
+        )
+
     def test_get_trading_results_with_filters(
-            self, client, mock_db_session, sample_trading_results, override_get_db
+            self, client, mock_db_session, sample_result_rows, override_get_db
     ):
-        mock_db_session.execute.return_value.scalars.return_value.all.return_value = [
-            sample_trading_results[0]
-        ]
+        mock_db_session.execute.return_value.all.return_value = [sample_result_rows[0]]
 
         response = client.get(
             "/trading-results/?oil_id=OIL1&delivery_type_id=DT1&delivery_basis_id=DB1&limit=1"
@@ -0,0 +1,136 @@
+import importlib.util
+from datetime import date
+from pathlib import Path
+from unittest.mock import AsyncMock, patch
+import json
+import pytest
+from fastapi import Depends, Query
+from practice_6.cache_warmer import (
+    INGEST_CHANNEL, WARM_LOCK_MS, affected_by, decode_params, handle_ingest_event, warm_cache
+)
+from practice_6.redis_file import (
+    INVALIDATION_CHANNEL, RELEASE_LOCK_SCRIPT, cache_key_for, cache_params, local_cache, response_serializer
+)
+
+
+async def fake_db():
+    yield "session"
+
+
+async def dynamics(
+        start_date: date = Query(...),
+        end_date: date = Query(...),
+        oil_id: str = Query(None),
+        db=Depends(fake_db)
+):
+    return [{"oil_id": oil_id, "start_date": start_date, "db": db}]
+
+
+JANUARY = cache_params(dynamics, (), {"start_date": date(2025, 1, 1), "end_date": date(2025, 1, 31)})
+MARCH = cache_params(dynamics, (), {"start_date": date(2025, 3, 1), "end_date": date(2025, 3, 31)})
+
+
+@pytest.fixture
+def mock_redis():
+    local_cache.clear()
+    with patch('practice_6.redis_file.get_redis') as get_redis, \
+            patch('practice_6.cache_warmer.get_redis', get_redis), \
+            patch.dict('practice_6.cache_warmer.cached_endpoints', {'dynamics': (dynamics, False, response_serializer())}, clear=True):
+        get_redis.return_value = AsyncMock()
+        get_redis.return_value.zrevrange.return_value = [JANUARY.encode(), MARCH.encode()]
+        yield get_redis.return_value
+    local_cache.clear()
+
+
+def test_decode_params_restores_types():
+    assert decode_params(dynamics, JANUARY) == {
+        "start_date": date(2025, 1, 1), "end_date": date(2025, 1, 31), "oil_id": None
+    }
+
+
+def test_affected_by_checks_period():
+    kwargs = decode_params(dynamics, JANUARY)
+    assert affected_by(kwargs, [date(2025, 1, 15)])
+    assert not affected_by(kwargs, [date(2025, 2, 3)])
+    assert affected_by({"limit": 5}, [date(2025, 2, 3)])
+
+
+@pytest.mark.asyncio
+async def test_warm_cache_recomputes_only_affected_keys(mock_redis):
+    warmed = await warm_cache([date(2025, 1, 15)])
+
+    assert warmed == {"dynamics": 1}
+    mock_redis.set.assert_called_once()
+    key, value = mock_redis.set.call_args.args
+    assert key == cache_key_for("dynamics", JANUARY)
+    assert json.loads(value) == [{"oil_id": None, "start_date": "2025-01-01", "db": "session"}]
+    mock_redis.publish.assert_called_once_with(INVALIDATION_CHANNEL, "dynamics")
+
+
+@pytest.mark.asyncio
+async def test_ingest_event_warms_once_per_lock(mock_redis):
+    event = json.dumps({"trade_dates": ["2025-03-10"]}).encode()
+
+    mock_redis.set.return_value = None
+    with patch('practice_6.cache_warmer.trading_dates') as trading_dates:
+        await handle_ingest_event(event)
+    # Список дат в памяти пополняет каждый процесс, даже без блокировки
+    trading_dates.add.assert_called_once_with([date(2025, 3, 10)])
+    assert mock_redis.set.call_count == 1  # только попытка взять блокировку
+
+    mock_redis.set.return_value = True
+    await handle_ingest_event(event)
+    assert mock_redis.set.call_count == 3  # блокировка и значение за март
+    # Блокировка снимается по токену, с которым ее взяли
+    token = mock_redis.set.call_args_list[1].args[1]
+    assert mock_redis.set.call_args_list[1].kwargs == {"nx": True, "px": WARM_LOCK_MS}
+    mock_redis.eval.assert_called_once_with(RELEASE_LOCK_SCRIPT, 1, "lock:cache:warm", token)
+    mock_redis.delete.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_ingest_event_exports_parquet_before_warming(mock_redis):
+    event = json.dumps({"trade_dates": ["2025-03-10", "2025-01-20"]}).encode()
+    mock_redis.set.return_value = True
+    calls = []
+
+    async def export(since=None):
+        calls.append(("export", since))
+
+    async def warm(trade_dates):
+        calls.append(("warm", trade_dates))
+        return {}
+
+    with patch('practice_6.cache_warmer.trading_dates'), \
+            patch('practice_6.cache_warmer.analytics', object()), \
+            patch('practice_6.cache_warmer.export', export), \
+            patch('practice_6.cache_warmer.warm_cache', warm):
+        await handle_ingest_event(event)
+
+    assert calls == [("export", date(2025, 1, 20)), ("warm", [date(2025, 3, 10), date(2025, 1, 20)])]
+
+
+@pytest.mark.asyncio
+async def test_failed_export_skips_warming(mock_redis):
+    event = json.dumps({"trade_dates": ["2025-03-10"]}).encode()
+    mock_redis.set.return_value = True
+    warm = AsyncMock()
+
+    with patch('practice_6.cache_warmer.trading_dates'), \
+            patch('practice_6.cache_warmer.analytics', object()), \
+            patch('practice_6.cache_warmer.export', AsyncMock(side_effect=OSError("disk full"))), \
+            patch('practice_6.cache_warmer.warm_cache', warm):
+        await handle_ingest_event(event)
+
+    warm.assert_not_called()
+    mock_redis.eval.assert_called_once()
+
+
+def test_ingest_channel_matches_practice_4_events():
+    # practice_4 - отдельный набор скриптов без пакета, events.py загружается по пути
+    path = Path(__file__).resolve().parents[3] / "practice_4" / "events.py"
+    spec = importlib.util.spec_from_file_location("practice_4_events", path)
+    events = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(events)
+
+    assert events.INGEST_CHANNEL == INGEST_CHANNEL
@@ -0,0 +1,54 @@
+from unittest.mock import patch
+from practice_6.local_cache import LocalCache
+
+
+class TestLocalCache:
+    def test_get_and_set(self):
+        cache = LocalCache(max_entries=10, max_bytes=1024)
+        cache.set("key", b"value")
+
+        assert cache.get("key") == b"value"
+        assert cache.get("missing") is None
+        assert cache.size == 5
+
+    def test_evicts_least_recently_used(self):
+        cache = LocalCache(max_entries=2, max_bytes=1024)
+        cache.set("a", b"1")
+        cache.set("b", b"2")
+        cache.get("a")
+        cache.set("c", b"3")
+
+        assert cache.get("a") == b"1"
+        assert cache.get("b") is None
+        assert cache.get("c") == b"3"
+
+    def test_respects_memory_budget(self):
+        cache = LocalCache(max_entries=10, max_bytes=10)
+        cache.set("a", b"12345")
+        cache.set("b", b"12345")
+        cache.set("c", b"12345")
+        cache.set("huge", b"x" * 11)
+
+        assert len(cache) == 2
+        assert cache.size == 10
+        assert cache.get("a") is None
+        assert cache.get("huge") is None
+
+    def test_entry_expires(self):
+        cache = LocalCache(max_entries=10, max_bytes=1024)
+        with patch('practice_6.local_cache.time.time', return_value=1000.0):
+            cache.set("key", b"value", expire_seconds=60)
+        with patch('practice_6.local_cache.time.time', return_value=1059.0):
+            assert cache.get("key") == b"value"
+        with patch('practice_6.local_cache.time.time', return_value=1060.0):
+            assert cache.get("key") is None
+        assert cache.size == 0
+
+    def test_invalidate_by_prefix(self):
+        cache = LocalCache(max_entries=10, max_bytes=1024)
+        cache.set("cache:v1:first:1", b"1")
+        cache.set("cache:v1:first:2", b"2")
+        cache.set("cache:v1:second:1", b"3")
+
+        assert cache.invalidate("cache:v1:first:") == 2
+        assert cache.get("cache:v1:second:1") == b"3"
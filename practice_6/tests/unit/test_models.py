@@ -1,5 +1,5 @@
 from datetime import date
-from practice_6.models import TradingResult
+from practice_6.models import API_FIELDS, TradingDailyAggregate, TradingResult
 
 
 class TestTradingResultModel:
@@ -49,4 +49,13 @@ class TestTradingResultModel:
 
         result = tr.to_dict()
         assert result["volume"] is None
-        assert result["total"] is None
\ No newline at end of file
+        assert result["total"] is None
+
+    def test_api_projection_matches_response_fields(self):
+        columns = TradingResult.api_projection()
+        assert tuple(column.key for column in columns) == API_FIELDS
+        assert "exchange_product_name" not in {column.key for column in columns}
+
+    def test_aggregate_projection_matches_response_fields(self):
+        columns = TradingDailyAggregate.api_projection()
+        assert tuple(column.key for column in columns) == API_FIELDS
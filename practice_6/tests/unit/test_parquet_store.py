@@ -0,0 +1,68 @@
+import json
+import os
+from datetime import date
+import pytest
+from practice_6.parquet_store import ParquetAnalytics, month_files, month_path, write_month
+from practice_6.queries import Granularity, rows_to_json
+
+pytest.importorskip("duckdb")
+pytest.importorskip("pyarrow")
+
+ROWS_JANUARY = [
+    (date(2025, 1, 9), "A100", "F", "ABS", 10.5, 1000.25, 1),
+    (date(2025, 1, 10), "A100", "F", "ABS", 20.25, 2000.5, 2),
+    (date(2025, 1, 10), "A592", "J", "NVY", 5.0, 500.0, 3),
+]
+ROWS_FEBRUARY = [
+    (date(2025, 2, 3), "A100", "F", "ABS", 0.1, 0.2, 4),
+    (date(2025, 2, 4), "A100", "F", "ABS", 0.2, 0.1, 5),
+]
+
+
+@pytest.fixture
+def analytics(tmp_path):
+    write_month(str(tmp_path), date(2025, 1, 1), ROWS_JANUARY)
+    write_month(str(tmp_path), date(2025, 2, 1), ROWS_FEBRUARY)
+    store = ParquetAnalytics(str(tmp_path), threads=1)
+    yield store
+    store.close()
+
+
+class TestMonthFiles:
+    def test_only_existing_months_in_range(self, tmp_path):
+        write_month(str(tmp_path), date(2025, 1, 1), ROWS_JANUARY)
+        write_month(str(tmp_path), date(2025, 3, 1), [])
+
+        assert month_files(str(tmp_path), date(2025, 1, 15), date(2025, 2, 28)) == [
+            month_path(str(tmp_path), date(2025, 1, 1))
+        ]
+        assert len(month_files(str(tmp_path), date(2024, 12, 1), date(2025, 3, 1))) == 2
+        assert not os.path.exists(month_path(str(tmp_path), date(2025, 1, 1)) + ".tmp")
+
+
+class TestParquetAnalytics:
+    def test_day_totals_match_rows_to_json(self, analytics):
+        body = analytics.aggregates_json(Granularity.day, date(2025, 1, 1), date(2025, 1, 31))
+
+        expected = sorted(ROWS_JANUARY, key=lambda row: (row[0], row[1]), reverse=True)
+        expected = [expected[1], expected[0], expected[2]]  # при равной дате - по oil_id
+        assert body == rows_to_json(expected)
+
+    def test_month_totals_are_rounded(self, analytics):
+        body = analytics.aggregates_json(Granularity.month, date(2025, 1, 1), date(2025, 2, 28), oil_id="A100")
+
+        assert json.loads(body) == [
+            {"trade_date": "2025-02-01", "oil_id": "A100", "delivery_type_id": "F", "delivery_basis_id": "ABS",
+             "volume": 0.3, "total": 0.3, "count": 9},
+            {"trade_date": "2025-01-01", "oil_id": "A100", "delivery_type_id": "F", "delivery_basis_id": "ABS",
+             "volume": 30.75, "total": 3000.75, "count": 3},
+        ]
+
+    def test_week_starts_on_monday(self, analytics):
+        body = analytics.aggregates_json(Granularity.week, date(2025, 1, 1), date(2025, 1, 31), delivery_basis_id="ABS")
+
+        assert [row["trade_date"] for row in json.loads(body)] == ["2025-01-06"]
+
+    @pytest.mark.asyncio
+    async def test_no_files_in_range(self, analytics):
+        assert await analytics.dynamics_aggregates(Granularity.day, date(2020, 1, 1), date(2020, 12, 31)) == b"[]"
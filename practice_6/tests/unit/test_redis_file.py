@@ -1,8 +1,17 @@
 from datetime import datetime, date, timedelta
 from unittest.mock import AsyncMock, MagicMock, patch
+import asyncio
 import json
 import pytest
-from practice_6.redis_file import async_cache_response, DateTimeEncoder, redis_client
+from redis.exceptions import RedisError
+from fastapi import Depends, Query
+from fastapi.responses import Response
+from pydantic import BaseModel
+from practice_6.redis_file import (
+    async_cache_response, DateTimeEncoder, redis_client, build_cache_key, cache_stats, get_cache_stats,
+    clear_cache, local_cache, INVALIDATION_CHANNEL, POPULAR_KEYS_PREFIX, cache_params, flush_access_counts,
+    pack_value, unpack_value, CACHE_SCHEMA_VERSION
+)
 
 
 class TestDateTimeEncoder:
@@ -33,11 +42,60 @@ class TestDateTimeEncoder:
         assert '"none": null' in result
 
 
+async def endpoint(
+        start_date: date = Query(...),
+        oil_id: str = Query(None),
+        limit: int = Query(10),
+        db=Depends(lambda: None)
+):
+    return []
+
+
+class Row(BaseModel):
+    trade_date: date
+    volume: float
+
+
+class TestPackValue:
+    def test_small_value_stored_as_is(self):
+        assert pack_value(b'[]') == b'[]'
+
+    def test_large_value_compressed(self):
+        value = json.dumps([{"oil_id": "A100"}] * 5000).encode()
+        packed = pack_value(value)
+        assert len(packed) < len(value)
+        assert unpack_value(packed) == value
+
+
+class TestBuildCacheKey:
+    def test_key_ignores_dependencies(self):
+        first = build_cache_key(endpoint, (), {"start_date": date(2023, 1, 1), "oil_id": None, "limit": 10, "db": object()})
+        second = build_cache_key(endpoint, (), {"start_date": date(2023, 1, 1), "oil_id": None, "limit": 10, "db": object()})
+        assert first == second
+
+    def test_key_normalizes_order_and_defaults(self):
+        full = build_cache_key(endpoint, (), {"limit": 10, "oil_id": None, "start_date": date(2023, 1, 1)})
+        positional = build_cache_key(endpoint, (date(2023, 1, 1),), {})
+        assert full == positional
+
+    def test_key_depends_on_values(self):
+        first = build_cache_key(endpoint, (), {"start_date": date(2023, 1, 1), "oil_id": "OIL1"})
+        second = build_cache_key(endpoint, (), {"start_date": date(2023, 1, 1), "oil_id": "OIL2"})
+        assert first != second
+
+    def test_key_has_version_prefix(self):
+        key = build_cache_key(endpoint, (date(2023, 1, 1),), {})
+        assert key.startswith(f"cache:v{CACHE_SCHEMA_VERSION}:endpoint:")
+
+
 class TestAsyncCacheResponse:
     @pytest.fixture
     def mock_redis(self):
-        with patch('practice_6.redis_file.redis_client') as mock:
-            yield mock
+        local_cache.clear()
+        with patch('practice_6.redis_file.get_redis') as get_redis:
+            get_redis.return_value = AsyncMock()
+            yield get_redis.return_value
+        local_cache.clear()
 
     @pytest.mark.asyncio
     async def test_cache_miss(self, mock_redis):
@@ -82,3 +140,165 @@ class TestAsyncCacheResponse:
             assert len(args) >= 2
             expected_ttl = 1 * 3600 + 11 * 60  # 1 час 11 минут
             assert args[1] == expected_ttl
+
+    @pytest.mark.asyncio
+    async def test_redis_error_falls_back_to_handler(self, mock_redis):
+        mock_func = AsyncMock()
+        mock_func.__name__ = "mock_func"
+        mock_func.return_value = {"data": "value"}
+        mock_redis.get.side_effect = RedisError("timeout")
+        mock_redis.setex.side_effect = RedisError("timeout")
+
+        decorated_func = async_cache_response()(mock_func)
+        result = await decorated_func("arg1")
+
+        assert result == {"data": "value"}
+        mock_func.assert_called_once_with("arg1")
+
+    @pytest.mark.asyncio
+    async def test_hit_and_miss_counters(self, mock_redis):
+        cache_stats.clear()
+        mock_func = AsyncMock()
+        mock_func.__name__ = "counted_func"
+        mock_func.return_value = {"data": "value"}
+        mock_redis.get.side_effect = [None, json.dumps({"data": "value"}).encode('utf-8')]
+
+        decorated_func = async_cache_response(use_local=False)(mock_func)
+        await decorated_func("arg1")
+        await decorated_func("arg1")
+
+        assert get_cache_stats()["counted_func"] == {
+            "hits": 1, "local_hits": 0, "misses": 1, "coalesced": 0, "hit_rate": 0.5
+        }
+
+    @pytest.mark.asyncio
+    async def test_local_tier_skips_redis(self, mock_redis):
+        mock_func = AsyncMock()
+        mock_func.__name__ = "local_func"
+        mock_func.return_value = {"data": "value"}
+        mock_redis.get.return_value = None
+
+        decorated_func = async_cache_response(use_local=True)(mock_func)
+        first = await decorated_func("arg1")
+        second = await decorated_func("arg1")
+
+        assert first == second == {"data": "value"}
+        mock_func.assert_called_once()
+        mock_redis.get.assert_called_once()
+
+    @pytest.mark.asyncio
+    async def test_clear_cache_invalidates_local_tier(self, mock_redis):
+        async def no_keys(*args, **kwargs):
+            return
+            yield
+
+        mock_func = AsyncMock()
+        mock_func.__name__ = "cleared_func"
+        mock_func.return_value = {"data": "value"}
+        mock_redis.get.return_value = None
+        mock_redis.scan_iter = MagicMock(side_effect=no_keys)
+
+        decorated_func = async_cache_response(use_local=True)(mock_func)
+        await decorated_func("arg1")
+        await clear_cache("cleared_func")
+        await decorated_func("arg1")
+
+        assert mock_func.call_count == 2
+        mock_redis.publish.assert_called_once_with(INVALIDATION_CHANNEL, "cleared_func")
+
+    @pytest.mark.asyncio
+    async def test_concurrent_misses_run_handler_once(self, mock_redis):
+        release = asyncio.Event()
+
+        async def slow_handler(arg):
+            await release.wait()
+            return {"data": arg}
+
+        mock_redis.get.return_value = None
+        decorated_func = async_cache_response(use_local=False)(slow_handler)
+
+        tasks = [asyncio.create_task(decorated_func("arg1")) for _ in range(5)]
+        await asyncio.sleep(0)
+        release.set()
+        results = await asyncio.gather(*tasks)
+
+        assert results == [{"data": "arg1"}] * 5
+        mock_redis.setex.assert_called_once()
+
+    @pytest.mark.asyncio
+    async def test_cancelled_leader_hands_over_to_waiter(self, mock_redis):
+        release = asyncio.Event()
+        calls = []
+
+        async def slow_handler(arg):
+            calls.append(arg)
+            await release.wait()
+            return {"data": arg}
+
+        mock_redis.get.return_value = None
+        decorated_func = async_cache_response(use_local=False)(slow_handler)
+
+        leader = asyncio.create_task(decorated_func("arg1"))
+        await asyncio.sleep(0.01)
+        waiter = asyncio.create_task(decorated_func("arg1"))
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        await asyncio.sleep(0.01)
+        release.set()
+
+        assert await waiter == {"data": "arg1"}
+        assert leader.cancelled()
+        assert len(calls) == 2
+
+    @pytest.mark.asyncio
+    async def test_waits_for_value_from_lock_owner(self, mock_redis):
+        mock_func = AsyncMock()
+        mock_func.__name__ = "locked_func"
+        cached_data = json.dumps({"data": "from other worker"}).encode('utf-8')
+        # Промах, затем значение, которое записал процесс-владелец блокировки
+        mock_redis.get.side_effect = [None, None, cached_data]
+        mock_redis.set.return_value = None
+        mock_redis.exists.return_value = 1
+
+        with patch('practice_6.redis_file.SINGLE_FLIGHT_POLL_MS', 1):
+            decorated_func = async_cache_response(use_local=False)(mock_func)
+            result = await decorated_func("arg1")
+
+        assert result == {"data": "from other worker"}
+        mock_func.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_access_counts_flushed_to_redis(self, mock_redis):
+        mock_func = AsyncMock()
+        mock_func.__name__ = "popular_func"
+        mock_redis.get.return_value = json.dumps({"data": "cached"}).encode('utf-8')
+        pipe = MagicMock(execute=AsyncMock())
+        mock_redis.pipeline = MagicMock(return_value=pipe)
+
+        decorated_func = async_cache_response(use_local=False)(mock_func)
+        for _ in range(3):
+            await decorated_func("arg1")
+        await flush_access_counts()
+
+        pipe.zincrby.assert_any_call(
+            f"{POPULAR_KEYS_PREFIX}:popular_func", 3, cache_params(mock_func, ("arg1",), {})
+        )
+        pipe.execute.assert_awaited_once()
+
+    @pytest.mark.asyncio
+    async def test_response_model_returns_serialized_body(self, mock_redis):
+        async def rows():
+            return [{"trade_date": date(2025, 1, 1), "volume": 10, "extra": "dropped"}]
+
+        mock_redis.get.return_value = None
+        decorated_func = async_cache_response(response_model=list[Row])(rows)
+
+        response = await decorated_func()
+        assert isinstance(response, Response)
+        assert response.body == b'[{"trade_date":"2025-01-01","volume":10.0}]'
+        assert mock_redis.setex.call_args.args[2] == response.body
+
+        # Попадание отдает те же байты без разбора JSON
+        local_cache.clear()
+        mock_redis.get.return_value = response.body
+        assert (await decorated_func()).body == response.body
@@ -0,0 +1,79 @@
+import asyncio
+from datetime import date
+from unittest.mock import AsyncMock, MagicMock, patch
+import pytest
+from sqlalchemy.exc import ProgrammingError
+from practice_6.trading_dates import TradingDates
+
+
+def db_returning(*results):
+    db = AsyncMock()
+    db.execute.side_effect = [MagicMock(**{"scalars.return_value.all.return_value": r}) for r in results]
+    return db
+
+
+class TestTradingDates:
+    @pytest.mark.asyncio
+    async def test_load_and_latest(self):
+        dates = TradingDates(keep=3, max_age=60)
+        assert not dates.fresh
+
+        await dates.load(db_returning([date(2025, 1, 3), date(2025, 1, 2), date(2025, 1, 1)]))
+
+        assert dates.fresh
+        assert dates.latest(2) == [date(2025, 1, 3), date(2025, 1, 2)]
+
+    @pytest.mark.asyncio
+    async def test_load_falls_back_to_trading_results(self):
+        dates = TradingDates(keep=3, max_age=60)
+        db = db_returning([], [date(2025, 1, 2)])
+
+        await dates.load(db)
+
+        assert db.execute.call_count == 2
+        assert dates.latest(5) == [date(2025, 1, 2)]
+
+    @pytest.mark.asyncio
+    async def test_load_falls_back_when_table_missing(self):
+        dates = TradingDates(keep=3, max_age=60)
+        db = db_returning([date(2025, 1, 2)])
+        db.execute.side_effect = [ProgrammingError("SELECT", {}, Exception("no trading_dates")),
+                                  *db.execute.side_effect]
+
+        await dates.load(db)
+
+        db.rollback.assert_awaited_once()
+        assert db.execute.call_count == 2
+        assert dates.latest(5) == [date(2025, 1, 2)]
+
+    @pytest.mark.asyncio
+    async def test_concurrent_refreshes_load_once(self):
+        dates = TradingDates(keep=3, max_age=60)
+        db = db_returning([date(2025, 1, 2)])
+        results = db.execute.side_effect
+
+        async def slow_execute(*args):
+            await asyncio.sleep(0.01)
+            return next(results)
+
+        db.execute.side_effect = slow_execute
+
+        await asyncio.gather(*(dates.refresh(db) for _ in range(10)))
+
+        assert db.execute.call_count == 1
+        assert dates.latest(5) == [date(2025, 1, 2)]
+
+    def test_add_keeps_newest_dates(self):
+        dates = TradingDates(keep=3, max_age=60)
+        dates.add([date(2025, 1, 1), date(2025, 1, 3)])
+        dates.add([date(2025, 1, 2), date(2025, 1, 4), date(2025, 1, 3)])
+
+        assert dates.latest(5) == [date(2025, 1, 4), date(2025, 1, 3), date(2025, 1, 2)]
+
+    @pytest.mark.asyncio
+    async def test_reload_after_max_age(self):
+        dates = TradingDates(keep=3, max_age=60)
+        await dates.load(db_returning([date(2025, 1, 1)]))
+
+        with patch("practice_6.trading_dates.time.monotonic", return_value=dates._loaded_at + 61):
+            assert not dates.fresh
@@ -0,0 +1,65 @@
+import asyncio
+import time
+from datetime import date
+from typing import Iterable, List, Optional
+from sqlalchemy.exc import ProgrammingError
+from practice_6.config import TRADING_DATES_KEEP, TRADING_DATES_MAX_AGE
+from practice_6.queries import distinct_trading_dates_query, last_trading_dates_query
+
+
+class TradingDates:
+    """
+    Последние даты торгов в памяти процесса, по убыванию, не больше keep штук.
+
+    Загружаются из trading_dates при первом запросе, пополняются событиями парсеров
+    и перечитываются не реже раза в max_age секунд - на случай пропущенного события.
+    """
+
+    def __init__(self, keep: int, max_age: float):
+        self.keep = keep
+        self.max_age = max_age
+        self._dates: List[date] = []
+        self._loaded_at: Optional[float] = None
+        # Одна перезагрузка на процесс: остальные запросы ждут ее, а не идут в БД сами
+        self._lock = asyncio.Lock()
+
+    @property
+    def fresh(self) -> bool:
+        return self._loaded_at is not None and time.monotonic() - self._loaded_at < self.max_age
+
+    async def refresh(self, db):
+        """Перечитать даты, если устарели"""
+        if self.fresh:
+            return
+        async with self._lock:
+            # Пока ждали блокировку, даты мог перечитать другой запрос
+            if not self.fresh:
+                await self.load(db)
+
+    async def load(self, db):
+        try:
+            result = await db.execute(last_trading_dates_query(self.keep))
+            dates = result.scalars().all()
+        except ProgrammingError:
+            # Таблицы trading_dates еще нет (до миграции) - транзакция прервана, откатываем ее
+            await db.rollback()
+            dates = []
+        if not dates:
+            # trading_dates еще не заполнена (до rebuild_aggregates.py) - берем даты из самих торгов
+            result = await db.execute(distinct_trading_dates_query(self.keep))
+            dates = result.scalars().all()
+        self._dates = list(dates)
+        self._loaded_at = time.monotonic()
+
+    def add(self, dates: Iterable[date]):
+        self._dates = sorted(set(self._dates).union(dates), reverse=True)[:self.keep]
+
+    def latest(self, limit: int) -> List[date]:
+        return self._dates[:limit]
+
+    def clear(self):
+        self._dates = []
+        self._loaded_at = None
+
+
+trading_dates = TradingDates(TRADING_DATES_KEEP, TRADING_DATES_MAX_AGE)